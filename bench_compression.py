@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+"""
+Compression benchmark on real chat corpora
+
+Compares lz4.frame, plain lz4 blocks and dictionary compression on message
+payloads, reporting the compression ratio and the padded on-air packet size.
+Without --dictionary, a dictionary is trained on 80% of the corpus and
+measured on the remaining 20%.
+
+Usage: python3 bench_compression.py [--dictionary FILE] <corpus>...
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+import lz4.block
+import lz4.frame
+
+from bitchat import MessageType, PacketEncoder
+from compression import (
+    compress_with_dictionary, register_dictionary, load_dictionary_file, SEED_DICTIONARY_ID
+)
+from train_dictionary import load_samples, train_dictionary
+
+SENDER_ID = "7e24c1f633915d33"
+TRAINED_DICTIONARY_ID = 255
+
+def wire_size(encoder: PacketEncoder, payload: bytes) -> int:
+    """Size of the padded MESSAGE packet carrying this payload"""
+    return len(encoder.encode(MessageType.MESSAGE, payload, compress=False))
+
+def measure(name: str, samples: List[bytes], compress: Callable[[bytes], bytes], encoder: PacketEncoder):
+    bytes_in = bytes_out = wire_before = wire_after = smaller = 0
+    start = time.perf_counter()
+    for sample in samples:
+        compressed = compress(sample)
+        if len(compressed) >= len(sample):
+            compressed = sample  # compress_if_beneficial would send it as-is
+        else:
+            smaller += 1
+        bytes_in += len(sample)
+        bytes_out += len(compressed)
+        wire_before += wire_size(encoder, sample)
+        wire_after += wire_size(encoder, compressed)
+    elapsed_us = (time.perf_counter() - start) * 1e6 / len(samples)
+    print(f"{name:<20} {100 * smaller / len(samples):6.0f}% {bytes_in / bytes_out:7.2f} "
+          f"{bytes_out / len(samples):9.1f} {wire_after / len(samples):9.1f} "
+          f"{100 * (1 - wire_after / wire_before):7.1f}% {elapsed_us:8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark payload compression on chat corpora")
+    parser.add_argument("corpus", nargs="+", help="packet trace or text file (one message per line)")
+    parser.add_argument("--dictionary", help="trained dictionary file to measure")
+    args = parser.parse_args()
+
+    samples = load_samples(args.corpus)
+    if not samples:
+        print("No message payloads found in corpus")
+        return
+
+    if args.dictionary:
+        dictionary_id, dictionary = load_dictionary_file(args.dictionary)
+        test = samples
+    else:
+        random.Random(0).shuffle(samples)
+        split = max(1, len(samples) * 4 // 5)
+        dictionary_id, dictionary = TRAINED_DICTIONARY_ID, train_dictionary(samples[:split])
+        test = samples[split:] or samples
+    register_dictionary(dictionary_id, dictionary)
+
+    encoder = PacketEncoder(SENDER_ID)
+    sizes = sorted(len(sample) for sample in test)
+    print(f"{len(test)} payloads, median {sizes[len(sizes) // 2]} bytes, dictionary {len(dictionary)} bytes\n")
+    print(f"{'method':<20} {'shrunk':>7} {'ratio':>7} {'avg out':>9} {'avg wire':>9} {'airtime':>8} {'us/msg':>8}")
+    measure("none", test, lambda data: data, encoder)
+    measure("lz4.frame", test, lz4.frame.compress, encoder)
+    measure("lz4.block", test, lambda data: lz4.block.compress(data, store_size=True), encoder)
+    measure("seed dictionary", test, lambda data: compress_with_dictionary(data, SEED_DICTIONARY_ID), encoder)
+    measure("trained dictionary", test, lambda data: compress_with_dictionary(data, dictionary_id), encoder)
+
+if __name__ == "__main__":
+    main()
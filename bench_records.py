@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Memory and allocation benchmark for per-packet and per-peer records
+
+Compares the slotted record types against the dict-backed dataclass layouts
+they replaced, using tracemalloc to measure bytes retained per instance. The
+dict-backed layouts are built from the current fields, so both sides stay
+comparable as records grow; run it rather than trusting figures quoted elsewhere.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import field, fields, make_dataclass
+from typing import Any, Callable, List
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from bitchat import (
+    MessageType, Peer, DeliveryAck, parse_bitchat_packet, parse_bitchat_message_payload,
+    create_bitchat_packet, create_bitchat_message_payload_full
+)
+from encryption import NoiseCipherState, NoiseSession
+from web_ui import WebMessage, WebPeer
+
+COUNT = 20000
+
+def unslotted(cls: type) -> type:
+    """Dict-backed dataclass with the same fields and __post_init__ as a slotted one"""
+    namespace = {'__post_init__': cls.__post_init__} if hasattr(cls, '__post_init__') else {}
+    return make_dataclass(f"Legacy{cls.__name__}",
+                          [(f.name, f.type, field(init=f.init, default=f.default, default_factory=f.default_factory))
+                           for f in fields(cls)],
+                          namespace=namespace)
+
+# Packet and message used to copy every field out eagerly, the views now read them from the buffer
+LegacyPacket = make_dataclass('LegacyPacket', ['msg_type', 'sender_id', 'sender_id_str', 'recipient_id',
+                                               'recipient_id_str', 'payload', 'ttl'])
+LegacyMessage = make_dataclass('LegacyMessage', ['id', 'content', 'channel', 'is_encrypted', 'encrypted_content'])
+LegacyPeer = unslotted(Peer)
+LegacyDeliveryAck = unslotted(DeliveryAck)
+LegacyNoiseSession = unslotted(NoiseSession)
+LegacyWebMessage = unslotted(WebMessage)
+LegacyWebPeer = unslotted(WebPeer)
+
+def measure(factory: Callable[[int], Any], count: int = COUNT):
+    """Return (bytes per instance, microseconds per instance) for objects built by factory"""
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    keep: List[Any] = [factory(i) for i in range(count)]
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+    # Don't count the list holding the instances
+    used -= sys.getsizeof(keep)
+    del keep
+    return used / count, elapsed * 1e6 / count
+
+def main():
+    sender_id = os.urandom(8).hex()
+    raw_packet = create_bitchat_packet(sender_id, MessageType.ANNOUNCE, b"some-nickname")
+    message_payload, message_id = create_bitchat_message_payload_full(
+        "alice", "hello from the mesh", "#general", False, sender_id, False, None
+    )
+    remote_key = X25519PrivateKey.generate().public_key()
+    now = time.time()
+
+    def legacy_packet(i):
+        # Old parser copied every field out eagerly
+        packet = parse_bitchat_packet(raw_packet)
+        return LegacyPacket(packet.msg_type, packet.sender_id, packet.sender_id_str, packet.recipient_id,
+                            packet.recipient_id_str, packet.payload, packet.ttl)
+
+    def legacy_message(i):
+        message = parse_bitchat_message_payload(message_payload)
+        return LegacyMessage(message.id, message.content, message.channel, message.is_encrypted,
+                             message.encrypted_content)
+
+    cases = [
+        ("packet", legacy_packet, lambda i: parse_bitchat_packet(raw_packet)),
+        ("message", legacy_message, lambda i: parse_bitchat_message_payload(message_payload)),
+        ("peer", lambda i: LegacyPeer(f"peer{i}"), lambda i: Peer(f"peer{i}")),
+        ("delivery ack",
+         lambda i: LegacyDeliveryAck(message_id, f"ack{i}", sender_id, "alice", i, 1),
+         lambda i: DeliveryAck(message_id, f"ack{i}", sender_id, "alice", i, 1)),
+        ("noise session",
+         lambda i: LegacyNoiseSession(sender_id, NoiseCipherState(), NoiseCipherState(), remote_key, now),
+         lambda i: NoiseSession(sender_id, NoiseCipherState(), NoiseCipherState(), remote_key, now)),
+        ("web message",
+         lambda i: LegacyWebMessage(f"m{i}", "hello", "alice", sender_id, "12:00", False, True, "#general"),
+         lambda i: WebMessage(f"m{i}", "hello", "alice", sender_id, "12:00", False, True, "#general")),
+        ("web peer",
+         lambda i: LegacyWebPeer(sender_id, f"peer{i}", True),
+         lambda i: WebPeer(sender_id, f"peer{i}", True)),
+    ]
+
+    print(f"{'record':<14} {'before B':>9} {'after B':>9} {'saved':>7} {'before us':>10} {'after us':>9}")
+    for name, before_factory, after_factory in cases:
+        before_bytes, before_us = measure(before_factory)
+        after_bytes, after_us = measure(after_factory)
+        saved = 100 * (1 - after_bytes / before_bytes)
+        print(f"{name:<14} {before_bytes:9.0f} {after_bytes:9.0f} {saved:6.0f}% {before_us:10.2f} {after_us:9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -8,24 +8,40 @@ import uuid
 import struct
 import hashlib
 import random
+import heapq
 from datetime import datetime
 from typing import Optional, Dict, List, Tuple, Set, Union
 from dataclasses import dataclass, field
 from enum import IntEnum
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from functools import lru_cache, partial
 import logging
 import base64
 
-from bleak import BleakClient, BleakScanner, BleakGATTCharacteristic
-from bleak.backends.device import BLEDevice
+from bleak import BleakClient
 import aioconsole
-from pybloom_live import BloomFilter
 
 from encryption import EncryptionService, NoiseError
-from compression import compress_if_beneficial, decompress
-from fragmentation import Fragment, FragmentType, fragment_payload
+from handshake_runner import HandshakeRunner
+from channel_keys import ChannelKeyStore
+from compression import compress_if_beneficial, decompress, decompression_stats, COMPRESSION_THRESHOLD, DICTIONARY_THRESHOLD
+from fragmentation import (
+    Fragment, FragmentType, fragment_payload, fragment_chunk_size, FragmentCollector, FRAGMENT_HEADER,
+    PADDING_BLOCK_SIZES
+)
 from terminal_ux import ChatContext, ChatMode, Public, Channel, PrivateDM, format_message_display, print_help, clear_screen
-from persistence import AppState, load_state, save_state, encrypt_password, decrypt_password
+from packet_trace import PacketTrace, TRACE_IN, TRACE_OUT
+from send_scheduler import Lane
+from link_manager import LinkManager, Link, DeviceProfileCache
+from bridge import Bridge, BridgeLink, parse_endpoint
+from scanner import CandidateTable, ContinuousScanner
+from relay import RelayEngine
+from persistence import (
+    AppState, load_state, save_state, encrypt_password, decrypt_password, get_dedup_file_path,
+    save_session_snapshot, load_session_snapshot, clear_session_snapshot, get_outbox_path
+)
+from outbox import Outbox
+from dedup import MessageDedup
 
 # Version
 VERSION = "v1.1.0"
@@ -63,6 +79,17 @@ class DebugLevel(IntEnum):
 
 DEBUG_LEVEL = DebugLevel.CLEAN
 
+# Default packet trace dump written on exit when started with --trace
+DEFAULT_TRACE_FILE = "bitchat_trace.bin"
+
+# With --resume-sessions, Noise sessions are restored from a snapshot no older than this
+SESSION_SNAPSHOT_MAX_AGE = 600
+# Send nonces are snapshotted this far ahead of the live ones, so the file only
+# has to be rewritten before traffic every SESSION_SNAPSHOT_NONCE_RESERVE
+# messages; other changes are written after SESSION_SNAPSHOT_DEBOUNCE seconds
+SESSION_SNAPSHOT_NONCE_RESERVE = 256
+SESSION_SNAPSHOT_DEBOUNCE = 2.0
+
 def debug_println(*args, **kwargs):
     if DEBUG_LEVEL >= DebugLevel.BASIC:
         try:
@@ -104,29 +131,242 @@ class MessageType(IntEnum):
     VERSION_HELLO = 0x20
     VERSION_ACK = 0x21
 
-@dataclass
+@dataclass(slots=True)
 class Peer:
     nickname: Optional[str] = None
+    supports_ack_batch: bool = False  # Set once the peer advertises batched ACK support
+
+# Fixed packet header: version, type, TTL, timestamp (ms), flags, payload length
+PACKET_HEADER = struct.Struct('>BBBQBH')
+SENDER_ID_SIZE = 8
+RECIPIENT_ID_SIZE = 8
+
+# Raw type byte -> MessageType, avoids enum construction on the hot path
+MESSAGE_TYPES: Dict[int, MessageType] = {t.value: t for t in MessageType}
+
+# Largest payload a compressed packet may inflate to. Messages (also when
+# wrapped in Noise) carry up to 64 KiB of content plus their fields, anything
+# else fits comfortably in a few padding blocks.
+DECOMPRESSED_SIZE_LIMITS: Dict[int, int] = {
+    MessageType.MESSAGE: 65536 + 1024,
+    MessageType.NOISE_ENCRYPTED: 65536 + 1024,
+}
+DEFAULT_DECOMPRESSED_SIZE_LIMIT = 4096
 
-@dataclass
 class BitchatPacket:
-    msg_type: MessageType
-    sender_id: bytes
-    sender_id_str: str
-    recipient_id: Optional[bytes]
-    recipient_id_str: Optional[str]
-    payload: bytes
-    ttl: int
-
-@dataclass
+    """Lazy view over a raw BitChat packet.
+    
+    Only the fixed header is unpacked up front. The sender/recipient IDs,
+    payload and signature are sliced out of the underlying buffer on first
+    access, so packets that are only relayed or dropped never pay for them.
+    """
+    __slots__ = (
+        'raw', 'msg_type', 'ttl', 'timestamp', 'flags',
+        '_payload_offset', '_payload_len',
+        '_sender_id', '_sender_id_str', '_recipient_id', '_recipient_id_str',
+        '_payload', '_signature', 'source',
+    )
+    
+    def __init__(self, raw: Union[bytes, bytearray, memoryview], msg_type: MessageType,
+                 ttl: int, timestamp: int, flags: int, payload_len: int):
+        self.raw = raw
+        self.msg_type = msg_type
+        self.ttl = ttl
+        self.timestamp = timestamp
+        self.flags = flags
+        self._payload_offset = PACKET_HEADER.size + SENDER_ID_SIZE
+        if flags & FLAG_HAS_RECIPIENT:
+            self._payload_offset += RECIPIENT_ID_SIZE
+        self._payload_len = payload_len
+        self._sender_id = None
+        self._sender_id_str = None
+        self._recipient_id = None
+        self._recipient_id_str = None
+        self._payload = None
+        self._signature = None
+        self.source: Optional[str] = None  # Address of the link the packet arrived on
+    
+    @property
+    def has_recipient(self) -> bool:
+        return (self.flags & FLAG_HAS_RECIPIENT) != 0
+    
+    @property
+    def has_signature(self) -> bool:
+        return (self.flags & FLAG_HAS_SIGNATURE) != 0
+    
+    @property
+    def is_compressed(self) -> bool:
+        return (self.flags & FLAG_IS_COMPRESSED) != 0
+    
+    @property
+    def sender_id(self) -> bytes:
+        if self._sender_id is None:
+            start = PACKET_HEADER.size
+            # Remove trailing null bytes
+            self._sender_id = bytes(self.raw[start:start + SENDER_ID_SIZE]).rstrip(b'\x00')
+        return self._sender_id
+    
+    @property
+    def sender_id_str(self) -> str:
+        if self._sender_id_str is None:
+            self._sender_id_str = self.sender_id.hex()
+        return self._sender_id_str
+    
+    @property
+    def recipient_id(self) -> Optional[bytes]:
+        if self._recipient_id is None and self.has_recipient:
+            start = PACKET_HEADER.size + SENDER_ID_SIZE
+            # Remove trailing null bytes
+            self._recipient_id = bytes(self.raw[start:start + RECIPIENT_ID_SIZE]).rstrip(b'\x00')
+        return self._recipient_id
+    
+    @property
+    def recipient_id_str(self) -> Optional[str]:
+        if self._recipient_id_str is None and self.has_recipient:
+            self._recipient_id_str = self.recipient_id.hex()
+        return self._recipient_id_str
+    
+    @property
+    def payload_view(self) -> memoryview:
+        """Zero-copy view of the payload as it is on the wire (still compressed if flagged)"""
+        start = self._payload_offset
+        return memoryview(self.raw)[start:start + self._payload_len]
+    
+    @property
+    def payload(self) -> bytes:
+        if self._payload is None:
+            payload = bytes(self.payload_view)
+            if self.is_compressed:
+                payload = decompress(payload, DECOMPRESSED_SIZE_LIMITS.get(self.msg_type, DEFAULT_DECOMPRESSED_SIZE_LIMIT))
+            self._payload = payload
+        return self._payload
+    
+    @property
+    def signature(self) -> Optional[bytes]:
+        if self._signature is None and self.has_signature:
+            start = self._payload_offset + self._payload_len
+            if len(self.raw) >= start + SIGNATURE_SIZE:
+                self._signature = bytes(self.raw[start:start + SIGNATURE_SIZE])
+            else:
+                debug_println(f"[WARN] Packet has signature flag but not enough data for signature.")
+        return self._signature
+    
+    def __repr__(self) -> str:
+        return (f"BitchatPacket(msg_type={self.msg_type!r}, sender_id_str={self.sender_id_str!r}, "
+                f"recipient_id_str={self.recipient_id_str!r}, ttl={self.ttl}, payload_len={self._payload_len})")
+
 class BitchatMessage:
-    id: str
-    content: str
-    channel: Optional[str]
-    is_encrypted: bool
-    encrypted_content: Optional[bytes]
+    """Two-stage view over a MESSAGE payload.
+    
+    Construction only reads the flags and the message ID (as a zero-copy
+    slice) so duplicates can be dropped before anything is decoded. The
+    sender, content and channel are decoded together on first access.
+    """
+    __slots__ = (
+        'data', 'flags', '_id_offset', '_body_offset', '_id',
+        '_sender', '_content', '_channel', '_encrypted_content', '_decoded',
+    )
+    
+    def __init__(self, data: Union[bytes, bytearray, memoryview]):
+        if len(data) < 10:
+            raise ValueError("Message payload too small")
+        
+        # 1. Flags, 2. Timestamp (skipped)
+        self.flags = data[0]
+        offset = 9
+        
+        # 3. ID
+        id_len = data[offset]; offset += 1
+        if offset + id_len > len(data):
+            raise ValueError("Message payload truncated in ID")
+        
+        self.data = data
+        self._id_offset = offset
+        self._body_offset = offset + id_len
+        self._id = None
+        self._decoded = False
+    
+    @property
+    def id_view(self) -> memoryview:
+        """Zero-copy view of the raw message ID, hashable like bytes for dedup lookups"""
+        return memoryview(self.data)[self._id_offset:self._body_offset]
+    
+    @property
+    def id(self) -> str:
+        if self._id is None:
+            self._id = str(self.id_view, 'utf-8')
+        return self._id
+    
+    @property
+    def id_bytes(self) -> bytes:
+        return bytes(self.id_view)
+    
+    @property
+    def is_private(self) -> bool:
+        return (self.flags & MSG_FLAG_IS_PRIVATE) != 0
+    
+    @property
+    def is_encrypted(self) -> bool:
+        return (self.flags & MSG_FLAG_IS_ENCRYPTED) != 0
+    
+    @property
+    def sender(self) -> str:
+        self._decode()
+        return self._sender
+    
+    @property
+    def content(self) -> str:
+        self._decode()
+        return self._content
+    
+    @property
+    def channel(self) -> Optional[str]:
+        self._decode()
+        return self._channel
+    
+    @property
+    def encrypted_content(self) -> Optional[bytes]:
+        self._decode()
+        return self._encrypted_content
+    
+    def _decode(self):
+        """Second stage: decode the remaining fields, matching Swift implementation"""
+        if self._decoded:
+            return
+        data = memoryview(self.data)
+        offset = self._body_offset
+        
+        # 4. Sender
+        sender_len = data[offset]; offset += 1
+        self._sender = str(data[offset:offset+sender_len], 'utf-8'); offset += sender_len
+        
+        # 5. Content
+        content_len = struct.unpack_from('>H', data, offset)[0]; offset += 2
+        content_bytes = data[offset:offset+content_len]; offset += content_len
+        self._content = ""
+        self._encrypted_content = None
+        if self.is_encrypted:
+            self._encrypted_content = bytes(content_bytes)
+        else:
+            self._content = str(content_bytes, 'utf-8', errors='ignore')
+        
+        # 6. Sender Peer ID
+        if self.flags & MSG_FLAG_HAS_SENDER_PEER_ID:
+            peer_id_len = data[offset]; offset += 1
+            offset += peer_id_len # Skip peer id
+        
+        # 7. Channel
+        self._channel = None
+        if self.flags & MSG_FLAG_HAS_CHANNEL:
+            channel_len = data[offset]; offset += 1
+            self._channel = str(data[offset:offset+channel_len], 'utf-8')
+        
+        self._decoded = True
+    
+    def __repr__(self) -> str:
+        return f"BitchatMessage(id={self.id!r}, flags=0x{self.flags:02x})"
 
-@dataclass
+@dataclass(slots=True)
 class DeliveryAck:
     original_message_id: str
     ack_id: str
@@ -135,77 +375,271 @@ class DeliveryAck:
     timestamp: int
     hop_count: int
 
+# Fragments are the only packet types sent without a (broadcast) recipient field
+FRAGMENT_TYPES = frozenset((MessageType.FRAGMENT_START, MessageType.FRAGMENT_CONTINUE, MessageType.FRAGMENT_END))
+
+# Payload types worth compressing. Noise payloads are already ciphertext and
+# fragments are slices of packets that were considered whole.
+COMPRESSIBLE_TYPES = frozenset((MessageType.MESSAGE, MessageType.CHANNEL_METADATA))
+
+# Packets that keep sessions and delivery state moving go ahead of chat traffic
+CONTROL_TYPES = frozenset((
+    MessageType.ANNOUNCE, MessageType.KEY_EXCHANGE, MessageType.LEAVE,
+    MessageType.DELIVERY_ACK, MessageType.DELIVERY_STATUS_REQUEST, MessageType.READ_RECEIPT,
+    MessageType.NOISE_HANDSHAKE_INIT, MessageType.NOISE_HANDSHAKE_RESP, MessageType.NOISE_IDENTITY_ANNOUNCE,
+    MessageType.CHANNEL_KEY_VERIFY_REQUEST, MessageType.CHANNEL_KEY_VERIFY_RESPONSE,
+    MessageType.VERSION_HELLO, MessageType.VERSION_ACK,
+))
+
+def packet_lane(msg_type: int) -> Lane:
+    """Send scheduler lane for a locally originated packet"""
+    if msg_type in CONTROL_TYPES:
+        return Lane.CONTROL
+    if msg_type in FRAGMENT_TYPES:
+        return Lane.BULK
+    return Lane.USER
+
+DEFAULT_TTL = 7
+
+# iOS pads ALL packets to standard block sizes for consistent BLE transmission
+PADDING_POOL_SIZE = 4096
+
+class PacketEncoder:
+    """Builds outgoing packets for one local sender.
+    
+    The version byte and sender ID are written once into a reusable buffer;
+    each packet only fills in the variable header fields, recipient, payload
+    and padding before a single copy out of the buffer.
+    
+    With ``compact_compression`` payloads may use the dictionary and block
+    formats, which only this client decodes; otherwise they use lz4.frame.
+    """
+    
+    def __init__(self, sender_id: str, compact_compression: bool = False):
+        self.sender_id = sender_id
+        self.compact_compression = compact_compression
+        self._buffer = bytearray(PADDING_BLOCK_SIZES[-1])
+        self._buffer[0] = 1  # Version
+        self._sender_bytes = self._encode_peer_id(sender_id)
+        self._buffer[PACKET_HEADER.size:PACKET_HEADER.size + SENDER_ID_SIZE] = self._sender_bytes
+        self._recipient_cache: Dict[str, bytes] = {}
+        self._padding_pool = b''
+        self._padding_offset = 0
+        self.compression_stats = {'attempted': 0, 'compressed': 0, 'bytes_in': 0, 'bytes_saved': 0}
+    
+    @staticmethod
+    def _encode_peer_id(peer_id: str) -> bytes:
+        """Encode a hex peer ID as exactly 8 bytes, padded with zeros if needed"""
+        return bytes.fromhex(peer_id)[:8].ljust(8, b'\x00')
+    
+    def _recipient_bytes(self, recipient_id: Optional[str]) -> bytes:
+        if not recipient_id:
+            return BROADCAST_RECIPIENT
+        encoded = self._recipient_cache.get(recipient_id)
+        if encoded is None:
+            if len(self._recipient_cache) >= 1024:
+                self._recipient_cache.clear()
+            encoded = self._encode_peer_id(recipient_id)
+            self._recipient_cache[recipient_id] = encoded
+        return encoded
+    
+    def _random_padding(self, length: int) -> bytes:
+        """Take random padding bytes from a pool refilled with one os.urandom call"""
+        if self._padding_offset + length > len(self._padding_pool):
+            self._padding_pool = os.urandom(PADDING_POOL_SIZE)
+            self._padding_offset = 0
+        start = self._padding_offset
+        self._padding_offset += length
+        return self._padding_pool[start:self._padding_offset]
+    
+    def encode(self, msg_type: MessageType, payload: bytes, recipient_id: Optional[str] = None,
+               signature: Optional[bytes] = None, ttl: int = DEFAULT_TTL,
+               compress: Optional[bool] = None) -> bytes:
+        """Encode a packet, padded iOS-style to the next block size.
+        
+        Payloads of COMPRESSIBLE_TYPES are compressed when that makes them
+        smaller; pass ``compress`` to override the per-type policy.
+        """
+        if DEBUG_LEVEL >= DebugLevel.FULL:
+            debug_full_println(f"[RAW SEND] Creating packet: type={msg_type.name}, payload_len={len(payload)}")
+        
+        flags = 0
+        if compress is None:
+            compress = msg_type in COMPRESSIBLE_TYPES
+        min_size = DICTIONARY_THRESHOLD if self.compact_compression else COMPRESSION_THRESHOLD
+        if compress and len(payload) >= min_size:
+            compressed, is_compressed = compress_if_beneficial(payload, self.compact_compression)
+            stats = self.compression_stats
+            stats['attempted'] += 1
+            stats['bytes_in'] += len(payload)
+            if is_compressed:
+                stats['compressed'] += 1
+                stats['bytes_saved'] += len(payload) - len(compressed)
+                payload = compressed
+                flags |= FLAG_IS_COMPRESSED
+        
+        # Include recipient field if:
+        # 1. A specific recipient is provided (targeted message), OR
+        # 2. This is a message type that uses broadcast recipient (not fragments)
+        has_recipient = recipient_id is not None or msg_type not in FRAGMENT_TYPES
+        if has_recipient:
+            flags |= FLAG_HAS_RECIPIENT
+        if signature:
+            flags |= FLAG_HAS_SIGNATURE
+        
+        payload_len = len(payload)
+        offset = PACKET_HEADER.size + SENDER_ID_SIZE
+        length = offset + payload_len
+        if has_recipient:
+            length += RECIPIENT_ID_SIZE
+        if signature:
+            length += len(signature)
+        
+        # Find smallest block that fits, accounting for encryption overhead (~16 bytes for AES-GCM tag).
+        # PKCS#7 only supports padding up to 255 bytes; beyond that the packet is sent unpadded.
+        padding_needed = 0
+        for block_size in PADDING_BLOCK_SIZES:
+            if length + 16 <= block_size:
+                padding_needed = block_size - length
+                break
+        if padding_needed > 255:
+            padding_needed = 0
+        
+        total = length + padding_needed
+        buffer = self._buffer
+        if total > len(buffer):
+            buffer.extend(bytes(total - len(buffer)))
+        
+        PACKET_HEADER.pack_into(buffer, 0, 1, msg_type, ttl, int(time.time() * 1000), flags, payload_len)
+        if has_recipient:
+            buffer[offset:offset + RECIPIENT_ID_SIZE] = self._recipient_bytes(recipient_id)
+            offset += RECIPIENT_ID_SIZE
+        buffer[offset:offset + payload_len] = payload
+        offset += payload_len
+        if signature:
+            buffer[offset:offset + len(signature)] = signature
+            offset += len(signature)
+        if padding_needed:
+            # iOS-style PKCS#7 padding: random bytes + padding length as last byte
+            buffer[offset:offset + padding_needed - 1] = self._random_padding(padding_needed - 1)
+            buffer[total - 1] = padding_needed
+        
+        return bytes(memoryview(buffer)[:total])
+
+# ACK coalescing for peers that understand batched ACKs. The batch limit keeps
+# the JSON payload under the fragmentation threshold.
+ACK_COALESCE_WINDOW = 0.2
+ACK_BATCH_MAX = 6
+
+# Delivery tracking: private messages are resent with exponential backoff until
+# ACKed, public messages are only remembered until their ACK window closes
+DELIVERY_TIMEOUT = 10.0
+DELIVERY_BACKOFF = 2.0
+DELIVERY_MAX_ATTEMPTS = 4
+PUBLIC_DELIVERY_TIMEOUT = 30.0
+DELIVERY_CHECK_INTERVAL = 1.0
+SENT_ACKS_LIMIT = 1024
+
+SESSION_CHECK_INTERVAL = 5  # Seconds between session expiry/rekey passes
+
+# Outbox flushing: at most OUTBOX_BATCH messages per pass, OUTBOX_PACE seconds
+# apart, and only while fewer than OUTBOX_MAX_QUEUED packets wait on the links
+OUTBOX_CHECK_INTERVAL = 1.0
+OUTBOX_BATCH = 10
+OUTBOX_PACE = 0.25
+OUTBOX_MAX_QUEUED = 8
+OUTBOX_HANDSHAKE_INTERVAL = 30.0  # Seconds between handshakes for queued private messages
+
+INITIAL_SCAN_TIMEOUT = 10     # Seconds to wait for a first device at startup
+SCANNER_RECHECK_INTERVAL = 5  # Seconds between connection passes when nothing else wakes the scanner
+
+@dataclass(slots=True)
+class PendingDelivery:
+    message_id: str
+    content: str
+    is_private: bool
+    sent_at: float
+    deadline: float
+    attempts: int = 1
+    recipient_id: Optional[str] = None
+    recipient_nickname: Optional[str] = None
+
 class DeliveryTracker:
-    def __init__(self):
-        self.pending_messages: Dict[str, Tuple[str, float, bool]] = {}
-        self.sent_acks: Set[str] = set()
-    
-    def track_message(self, message_id: str, content: str, is_private: bool):
-        self.pending_messages[message_id] = (content, time.time(), is_private)
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.pending_messages: Dict[str, PendingDelivery] = {}
+        # Min-heap of (deadline, message_id); entries left behind by ACKs or
+        # reschedules are skipped when they surface
+        self.deadlines: List[Tuple[float, str]] = []
+        self.sent_acks: 'OrderedDict[str, None]' = OrderedDict()
+    
+    def track_message(self, message_id: str, content: str, is_private: bool,
+                      recipient_id: Optional[str] = None, recipient_nickname: Optional[str] = None):
+        now = self.clock()
+        timeout = DELIVERY_TIMEOUT if is_private else PUBLIC_DELIVERY_TIMEOUT
+        entry = PendingDelivery(message_id, content, is_private, now, now + timeout,
+                                recipient_id=recipient_id, recipient_nickname=recipient_nickname)
+        self.pending_messages[message_id] = entry
+        heapq.heappush(self.deadlines, (entry.deadline, message_id))
     
     def mark_delivered(self, message_id: str) -> bool:
         return self.pending_messages.pop(message_id, None) is not None
     
+    def pop_due(self) -> List[PendingDelivery]:
+        """Remove and return messages whose deadline has passed"""
+        now = self.clock()
+        due = []
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, message_id = heapq.heappop(self.deadlines)
+            entry = self.pending_messages.get(message_id)
+            if entry is None or entry.deadline != deadline:
+                continue  # Already delivered or rescheduled
+            del self.pending_messages[message_id]
+            due.append(entry)
+        return due
+    
+    def reschedule(self, entry: PendingDelivery):
+        """Track a due message again for its next attempt, backing off exponentially"""
+        entry.attempts += 1
+        self._track_again(entry, DELIVERY_TIMEOUT * DELIVERY_BACKOFF ** (entry.attempts - 1))
+    
+    def postpone(self, entry: PendingDelivery):
+        """Track a due message again without using up an attempt, for when it couldn't be sent"""
+        self._track_again(entry, DELIVERY_TIMEOUT)
+    
+    def _track_again(self, entry: PendingDelivery, delay: float):
+        entry.deadline = self.clock() + delay
+        self.pending_messages[entry.message_id] = entry
+        heapq.heappush(self.deadlines, (entry.deadline, entry.message_id))
+    
     def should_send_ack(self, ack_id: str) -> bool:
         if ack_id in self.sent_acks:
+            self.sent_acks.move_to_end(ack_id)
             return False
-        self.sent_acks.add(ack_id)
+        self.sent_acks[ack_id] = None
+        if len(self.sent_acks) > SENT_ACKS_LIMIT:
+            self.sent_acks.popitem(last=False)
         return True
 
-class FragmentCollector:
-    def __init__(self):
-        self.fragments: Dict[str, Dict[int, bytes]] = {}
-        self.metadata: Dict[str, Tuple[int, int, str]] = {}
-    
-    def add_fragment(self, fragment_id: bytes, index: int, total: int, 
-                    original_type: int, data: bytes, sender_id: str) -> Optional[Tuple[bytes, str]]:
-        fragment_id_hex = fragment_id.hex()
-        
-        debug_full_println(f"[COLLECTOR] Adding fragment {index + 1}/{total} for ID {fragment_id_hex[:8]}")
-        
-        if fragment_id_hex not in self.fragments:
-            debug_full_println(f"[COLLECTOR] Creating new fragment collection for ID {fragment_id_hex[:8]}")
-            self.fragments[fragment_id_hex] = {}
-            self.metadata[fragment_id_hex] = (total, original_type, sender_id)
-        
-        fragment_map = self.fragments[fragment_id_hex]
-        fragment_map[index] = data
-        debug_full_println(f"[COLLECTOR] Fragment {index + 1} stored. Have {len(fragment_map)}/{total} fragments")
-        
-        if len(fragment_map) == total:
-            debug_full_println("[COLLECTOR] ✓ All fragments received! Reassembling...")
-            
-            complete_data = bytearray()
-            for i in range(total):
-                if i in fragment_map:
-                    debug_full_println(f"[COLLECTOR] Appending fragment {i + 1} ({len(fragment_map[i])} bytes)")
-                    complete_data.extend(fragment_map[i])
-                else:
-                    debug_full_println(f"[COLLECTOR] ✗ Missing fragment {i + 1}")
-                    return None
-            
-            debug_full_println(f"[COLLECTOR] ✓ Reassembly complete: {len(complete_data)} bytes total")
-            
-            sender = self.metadata.get(fragment_id_hex, (0, 0, "Unknown"))[2]
-            
-            del self.fragments[fragment_id_hex]
-            del self.metadata[fragment_id_hex]
-            
-            return (bytes(complete_data), sender)
-        
-        return None
-
 class BitchatClient:
     def __init__(self):
         self.my_peer_id = os.urandom(8).hex()
+        self.encoder = get_packet_encoder(self.my_peer_id)
         self.nickname = "my-python-client"
         self.peers: Dict[str, Peer] = {}
-        self.bloom = BloomFilter(capacity=500, error_rate=0.01)
-        self.processed_messages: Set[str] = set()  # Backup for message IDs
+        self.dedup = MessageDedup()
         self.fragment_collector = FragmentCollector()
+        self.trace = PacketTrace()
+        self.candidates = CandidateTable()
+        self.scanner = ContinuousScanner(BITCHAT_SERVICE_UUID, self.candidates)
+        self.links = LinkManager(BITCHAT_CHARACTERISTIC_UUID, self.handle_link_data, self.handle_link_lost,
+                                 on_send_error=self.handle_send_error, service_uuid=BITCHAT_SERVICE_UUID,
+                                 profiles=DeviceProfileCache())
+        self.relay = RelayEngine(self.relay_packet, lambda: len(self.peers))
         self.delivery_tracker = DeliveryTracker()
+        self.pending_acks: Dict[Tuple[str, bool], List[str]] = {}
         self.chat_context = ChatContext()
-        self.channel_keys: Dict[str, bytes] = {}
+        self.channel_keys = ChannelKeyStore()
         self.app_state = AppState()
         self.blocked_peers: Set[str] = set()
         self.channel_creators: Dict[str, str] = {}
@@ -213,8 +647,8 @@ class BitchatClient:
         self.channel_key_commitments: Dict[str, str] = {}
         self.discovered_channels: Set[str] = set()
         self.encryption_service = EncryptionService()
-        self.client: Optional[BleakClient] = None
-        self.characteristic: Optional[BleakGATTCharacteristic] = None
+        self.handshakes = HandshakeRunner(self.encryption_service)
+        self.bridge: Optional[Bridge] = None
         self.running = True
         self.background_scanner_task = None  # Track background scanner task
         self.disconnection_callback_registered = False
@@ -225,17 +659,23 @@ class BitchatClient:
         
         # Pending private messages waiting for handshake completion
         self.pending_private_messages: Dict[str, List[Tuple[str, str, str]]] = {}  # peer_id -> [(content, nickname, message_id)]
+        self.outbox: Optional[Outbox] = None  # Durable copy of queued messages, opened once the identity is loaded
         
         # Setup encryption service callbacks for better handshake handling
         self.encryption_service.on_peer_authenticated = self._on_peer_authenticated
         self.encryption_service.on_handshake_required = self._on_handshake_required
+        self.encryption_service.on_nonces_advanced = self.session_nonces_advanced
+        self.resume_sessions = False
+        self.snapshot_marks: Dict[str, Tuple[bytes, int]] = {}  # peer_id -> (send key, send nonce in the snapshot)
+        self.snapshot_timer: Optional[asyncio.TimerHandle] = None
     
     def _on_peer_authenticated(self, peer_id: str, fingerprint: str):
-        """Callback when a peer is authenticated via Noise protocol"""
-        debug_println(f"[NOISE] Peer {peer_id} authenticated with fingerprint: {fingerprint[:16]}...")
+        """Callback when a peer is authenticated via Noise protocol.
         
-        # Send any pending private messages for this peer
-        asyncio.create_task(self.send_pending_private_messages(peer_id))
+        Runs on a handshake worker thread, so it only logs; the handshake
+        handlers send pending messages once the step has returned.
+        """
+        debug_println(f"[NOISE] Peer {peer_id} authenticated with fingerprint: {fingerprint[:16]}...")
         
     def _on_handshake_required(self, peer_id: str):
         """Callback when handshake is required for a peer"""
@@ -253,63 +693,92 @@ class BitchatClient:
         
         debug_println(f"[NOISE] Sending {len(pending_messages)} pending messages to {peer_id}")
         
-        for content, nickname, message_id in pending_messages:
-            try:
-                # Add longer delay before sending to allow BLE queue to clear
-                await asyncio.sleep(0.3)
-                # Call the actual send function with established session
-                await self.send_private_message(content, peer_id, nickname, message_id)
-                # Small delay between messages
-                await asyncio.sleep(0.2)
-            except Exception as e:
-                debug_println(f"[NOISE] Failed to send pending message to {peer_id}: {e}")
-                # Re-queue the message if it's a temporary error
-                if "blocking" in str(e).lower():
-                    debug_println(f"[NOISE] Re-queuing message due to BLE congestion")
-                    if peer_id not in self.pending_private_messages:
-                        self.pending_private_messages[peer_id] = []
-                    self.pending_private_messages[peer_id].append((content, nickname, message_id))
-                    # Don't retry immediately, let it retry later
-                    break
+        payloads = [
+            create_bitchat_message_payload_full(
+                self.nickname, content, None, True, self.my_peer_id, False, None, message_id
+            )[0]
+            for content, _, message_id in pending_messages
+        ]
         
-    async def find_device(self) -> Optional[BLEDevice]:
-        """Scan for BitChat service"""
-        debug_println("[1] Scanning for bitchat service...")
+        try:
+            # One pass over the session's cipher for the whole queue
+            packets = self.encode_private_messages(payloads, peer_id)
+        except Exception as e:
+            debug_println(f"[NOISE] Failed to encrypt pending messages for {peer_id}: {e}")
+            self.pending_private_messages.setdefault(peer_id, [])[:0] = pending_messages
+            return
         
-        devices = await BleakScanner.discover(
-            timeout=5.0,
-            service_uuids=[BITCHAT_SERVICE_UUID]
-        )
+        for (content, nickname, message_id), packet in zip(pending_messages, packets):
+            self.delivery_tracker.track_message(message_id, content, True, peer_id, nickname)
+            await self.send_packet(packet)
+            if self.outbox:
+                self.outbox.remove_message(message_id)
+            display = format_message_display(
+                datetime.now(), self.nickname, content, True, False, None, nickname, self.nickname
+            )
+            print(f"\r\033[K{display}\n> ", end='', flush=True)
+    
+    async def connect_best(self, announce: bool = True) -> Tuple[int, Optional[Exception]]:
+        """Open links to the best candidates heard until the link limit is reached.
+        
+        Returns how many links were opened and the last connection error.
+        """
+        opened = 0
+        error = None
+        for candidate in self.candidates.ranked(exclude=self.links.links):
+            if self.links.full or not self.running:
+                break
+            
+            was_connected = self.links.connected
+            debug_println(f"[SCANNER] Connecting to {candidate.address} (RSSI {candidate.rssi:.0f})")
+            try:
+                await self.links.connect(candidate.address)
+            except Exception as e:
+                self.candidates.failed(candidate.address)
+                debug_println(f"[SCANNER] Connection attempt to {candidate.address} failed: {e}")
+                error = e
+                continue
+            self.candidates.succeeded(candidate.address)
+            opened += 1
+            
+            if not announce:
+                continue
+            if was_connected:
+                print(f"\r\033[K\033[92m✓ Linked to {candidate.address} ({len(self.links)} links)\033[0m")
+            else:
+                print(f"\r\033[K\033[92m✓ Connected to BitChat network!\033[0m")
+            await self.announce_identity()
+            print("> ", end='', flush=True)
         
-        for device in devices:
-            debug_full_println(f"Found device: {device.name} - {device.address}")
-            return device
+        return opened, error
+    
+    def handle_link_lost(self, link: Link):
+        """Handle one link dropping; the others, and all peer and session state, stay"""
+        if link.transport == "ble":
+            # The device was fine until now, so it is the first one to retry
+            self.candidates.seen(link.address, None)
+        self.scanner.wake()
         
-        return None
+        if len(self.links):
+            print(f"\r\033[K\033[93m» Lost link to {link.address}, "
+                  f"{len(self.links)} link(s) still up\033[0m")
+            print("> ", end='', flush=True)
+            # Look for a replacement
+            if not self.background_scanner_task or self.background_scanner_task.done():
+                self.background_scanner_task = asyncio.create_task(self.background_scanner())
+        else:
+            self.handle_disconnect(link.client)
     
     def handle_disconnect(self, client: BleakClient):
-        """Handle disconnection from peer"""
+        """Handle the last link dropping.
+        
+        Peers, Noise sessions and pending messages are kept, so traffic picks
+        up where it left off once the scanner finds the mesh again.
+        """
         print(f"\r\033[K\033[91m✗ Disconnected from BitChat network\033[0m")
         print("\033[90m» Scanning for other devices...\033[0m")
         print("> ", end='', flush=True)
         
-        # Clear connection state
-        self.client = None
-        self.characteristic = None
-        self.peers.clear()  # Clear peer list since we're disconnected
-        self.chat_context.active_dms.clear()  # Clear DM list
-        
-        # Clear encryption sessions (but keep our own identity)
-        self.encryption_service.sessions.clear()
-        self.encryption_service.handshake_states.clear()
-        
-        # Clear pending private messages
-        self.pending_private_messages.clear()
-        
-        # If in a DM, switch to public
-        if isinstance(self.chat_context.current_mode, PrivateDM):
-            self.chat_context.switch_to_public()
-        
         # Restart background scanner if not already running
         if not self.background_scanner_task or self.background_scanner_task.done():
             self.background_scanner_task = asyncio.create_task(self.background_scanner())
@@ -318,25 +787,20 @@ class BitchatClient:
         """Connect to BitChat service"""
         print("\033[90m» Scanning for bitchat service...\033[0m")
         
-        scan_attempts = 0
-        max_initial_attempts = 10  # Try for ~10 seconds initially
-        
-        device = None
-        while not device and self.running:
-            device = await self.find_device()
-            if not device:
-                scan_attempts += 1
-                if scan_attempts == max_initial_attempts:
-                    print("\033[93m» No other BitChat devices found yet.\033[0m")
-                    print("\033[90m» This might be because:\033[0m")
-                    print("\033[90m  • You're the first one here (that's okay!)\033[0m")
-                    print("\033[90m  • Other devices are out of Bluetooth range\033[0m")
-                    print("\033[90m  • The iOS/Android app needs to be open\033[0m")
-                    print("\033[90m» Continuing to scan in the background...\033[0m")
-                    print("\033[90m» You can start using commands while waiting.\033[0m")
-                    # Return True to continue without connection
-                    return True
-                await asyncio.sleep(1)
+        await self.scanner.start()
+        if not self.candidates.ranked(exclude=self.links.links):
+            await self.scanner.wait(INITIAL_SCAN_TIMEOUT)
+        
+        if not self.candidates.ranked(exclude=self.links.links):
+            print("\033[93m» No other BitChat devices found yet.\033[0m")
+            print("\033[90m» This might be because:\033[0m")
+            print("\033[90m  • You're the first one here (that's okay!)\033[0m")
+            print("\033[90m  • Other devices are out of Bluetooth range\033[0m")
+            print("\033[90m  • The iOS/Android app needs to be open\033[0m")
+            print("\033[90m» Continuing to scan in the background...\033[0m")
+            print("\033[90m» You can start using commands while waiting.\033[0m")
+            # Return True to continue without connection
+            return True
         
         if not self.running:
             return False
@@ -345,30 +809,11 @@ class BitchatClient:
         debug_println("[1] Match Found! Connecting...")
         
         try:
-            self.client = BleakClient(device.address, disconnected_callback=self.handle_disconnect)
-            await self.client.connect()
+            opened, error = await self.connect_best(announce=False)
+            if not opened:
+                raise error
             
-            # Find characteristic
-            services = self.client.services
-            if not services:
-                raise Exception("No services found on device")
-                
-            for service in services:
-                for char in service.characteristics:
-                    if char.uuid.lower() == BITCHAT_CHARACTERISTIC_UUID.lower():
-                        self.characteristic = char
-                        debug_println(f"[2] Found characteristic: {char.uuid}")
-                        break
-                if self.characteristic:
-                    break
-            
-            if not self.characteristic:
-                raise Exception("Characteristic not found")
-            
-            # Subscribe to notifications
-            await self.client.start_notify(self.characteristic, self.notification_handler)
-            
-            debug_println("[2] Connection established.")
+            debug_println(f"[2] Connection established on {len(self.links)} link(s).")
             return True
             
         except Exception as e:
@@ -390,8 +835,18 @@ class BitchatClient:
         if self.app_state.nickname:
             self.nickname = self.app_state.nickname
         
+        # Persisted Noise identity, so our fingerprint (and blocks/favorites keyed on it) survive restarts
+        self.encryption_service.set_static_key(bytes(self.app_state.noise_static_key))
+        if self.resume_sessions:
+            self.restore_session_snapshot()
+        else:
+            clear_session_snapshot()
+        
+        # Messages that were still waiting when we last exited
+        self.open_outbox()
+        
         # If we have a connection, send Noise identity announce and regular announce
-        if self.client and self.characteristic:
+        if self.links.connected:
             # Send Noise identity announcement first
             try:
                 # Create a proper timestamp that matches iOS (milliseconds since epoch)
@@ -411,9 +866,7 @@ class BitchatClient:
                     self.nickname, timestamp_ms, signature
                 )
                 
-                identity_packet = create_bitchat_packet_with_signature(
-                    self.my_peer_id, MessageType.NOISE_IDENTITY_ANNOUNCE, identity_payload, signature
-                )
+                identity_packet = self.encoder.encode(MessageType.NOISE_IDENTITY_ANNOUNCE, identity_payload, signature=signature)
                 await self.send_packet(identity_packet)
                 debug_println("[3] Sent Noise identity announcement (binary format)")
             except Exception as e:
@@ -421,19 +874,15 @@ class BitchatClient:
                 import traceback
                 debug_println(f"[3] Traceback: {traceback.format_exc()}")
                 # Fallback to old key exchange
-                handshake_message = self.encryption_service.initiate_handshake(self.my_peer_id)
-                handshake_packet = create_bitchat_packet(
-                    self.my_peer_id, MessageType.KEY_EXCHANGE, handshake_message
-                )
+                handshake_message = await self.handshakes.initiate(self.my_peer_id)
+                handshake_packet = self.encoder.encode(MessageType.KEY_EXCHANGE, handshake_message)
                 await self.send_packet(handshake_packet)
             
             # Wait a bit between packets
             await asyncio.sleep(0.5)
             
             # Send announce
-            announce_packet = create_bitchat_packet(
-                self.my_peer_id, MessageType.ANNOUNCE, self.nickname.encode()
-            )
+            announce_packet = self.encoder.encode(MessageType.ANNOUNCE, self.nickname.encode())
             await self.send_packet(announce_packet)
             
             debug_println("[3] Handshake sent. You can now chat.")
@@ -451,152 +900,199 @@ class BitchatClient:
         self.password_protected_channels = self.app_state.password_protected_channels
         self.channel_key_commitments = self.app_state.channel_key_commitments
         
-        # Restore channel keys from saved passwords
+        # Restore channel keys from saved passwords. Keys come from the cache
+        # when possible, the rest are derived the first time the channel is used.
         if self.app_state.identity_key:
+            self.channel_keys.load_cache(self.app_state.identity_key)
             for channel, encrypted_password in self.app_state.encrypted_channel_passwords.items():
                 try:
                     password = decrypt_password(encrypted_password, self.app_state.identity_key)
-                    key = EncryptionService.derive_channel_key(password, channel)
-                    self.channel_keys[channel] = key
-                    debug_println(f"[CHANNEL] Restored key for password-protected channel: {channel}")
+                    if self.channel_keys.add_password(channel, password):
+                        debug_println(f"[CHANNEL] Restored cached key for password-protected channel: {channel}")
+                    else:
+                        debug_println(f"[CHANNEL] Key for {channel} will be derived on first use")
                 except Exception as e:
                     debug_println(f"[CHANNEL] Failed to restore key for {channel}: {e}")
     
-    async def send_packet(self, packet: bytes):
-        """Send packet, with fragmentation if needed"""
-        debug_full_println(f"[RAW SEND] {packet.hex()}")
-        if not self.client or not self.characteristic:
-            debug_println("[!] No connection available. Message queued.")
-            # In a real implementation, we might queue messages here
+    def save_session_snapshot(self, exact: bool = False):
+        """Write established Noise sessions to disk when --resume-sessions is on.
+        
+        Send nonces are written SESSION_SNAPSHOT_NONCE_RESERVE ahead, so a
+        session restored after a crash can never reuse a nonce (the peer then
+        sees a gap and a new handshake follows). ``exact`` writes the live
+        nonces, for a clean shutdown after the last packet has gone out.
+        """
+        if self.snapshot_timer:
+            self.snapshot_timer.cancel()
+            self.snapshot_timer = None
+        if not self.resume_sessions or not self.app_state.identity_key:
             return
+        try:
+            sessions = self.encryption_service.export_sessions(0 if exact else SESSION_SNAPSHOT_NONCE_RESERVE)
+            snapshot = {
+                'saved_at': time.time(),
+                'peer_id': self.my_peer_id,
+                'fingerprint': self.encryption_service.get_identity_fingerprint(),
+                'sessions': sessions,
+            }
+            save_session_snapshot(snapshot, self.app_state.identity_key)
+            self.snapshot_marks = {
+                peer_id: (bytes.fromhex(state['send_key']), state['send_nonce']) for peer_id, state in sessions.items()
+            }
+        except Exception as e:
+            debug_println(f"[NOISE] Failed to save session snapshot: {e}")
+            # A snapshot that may be behind the live nonces must never be restored
+            self.snapshot_marks = {}
+            try:
+                clear_session_snapshot()
+            except OSError:
+                pass
+    
+    def session_nonces_advanced(self):
+        """Keep the snapshot ahead of every send nonce, called after each transport encrypt/decrypt.
         
-        # Check if still connected before sending
-        if not self.client.is_connected:
-            debug_println("[!] Connection lost. Cannot send packet.")
-            # Trigger disconnection handling if not already done
-            if self.client:
-                self.handle_disconnect(self.client)
+        Runs before ciphertext reaches the caller, so it must not raise.
+        """
+        if not self.resume_sessions:
             return
-            
-        if should_fragment(packet):
-            await self.send_packet_with_fragmentation(packet)
-        else:
-            write_with_response = len(packet) > 512
-            try:
-                # Add small delay to prevent blocking errors
-                await asyncio.sleep(0.01)
-                await self.client.write_gatt_char(
-                    self.characteristic, 
-                    packet, 
-                    response=write_with_response
-                )
-            except Exception as e:
-                # Check if this is a connection error
-                if "not connected" in str(e).lower():
-                    debug_println("[!] Lost connection while sending")
-                    if self.client:
-                        self.handle_disconnect(self.client)
+        try:
+            for peer_id, session in self.encryption_service.session_manager.session_items():
+                mark = self.snapshot_marks.get(peer_id)
+                if mark is None or mark[0] != session.send_cipher.key or session.send_cipher.nonce > mark[1]:
+                    self.save_session_snapshot()
                     return
-                
-                # Handle blocking errors by retrying without response
-                if "could not complete without blocking" in str(e) or write_with_response:
-                    try:
-                        debug_println(f"[!] Write blocked, retrying without response after delay")
-                        await asyncio.sleep(0.1)  # Longer delay for retry
-                        await self.client.write_gatt_char(
-                            self.characteristic, 
-                            packet, 
-                            response=False
-                        )
-                        debug_println(f"[!] Retry successful")
-                    except Exception as e2:
-                        if "not connected" in str(e2).lower():
-                            debug_println("[!] Lost connection while sending")
-                            if self.client:
-                                self.handle_disconnect(self.client)
-                        elif "could not complete without blocking" in str(e2):
-                            debug_println(f"[!] Write still blocked after retry, dropping packet")
-                            # Don't raise, just log and continue
-                        else:
-                            raise e2
-                else:
-                    raise e
+            if self.snapshot_timer is None:
+                # Only receive nonces and timestamps moved, a late write costs at most a rehandshake
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    self.save_session_snapshot()  # No event loop to defer to
+                    return
+                self.snapshot_timer = loop.call_later(SESSION_SNAPSHOT_DEBOUNCE, self.save_session_snapshot)
+        except Exception as e:
+            debug_println(f"[NOISE] Session snapshot check failed: {e}")
+    
+    def restore_session_snapshot(self):
+        """Resume Noise sessions from a recent snapshot, keeping the peer ID they belong to"""
+        snapshot = load_session_snapshot(self.app_state.identity_key)
+        if not snapshot:
+            return
+        age = time.time() - snapshot.get('saved_at', 0)
+        if age > SESSION_SNAPSHOT_MAX_AGE or snapshot.get('fingerprint') != self.encryption_service.get_identity_fingerprint():
+            debug_println(f"[NOISE] Discarding session snapshot from {age:.0f}s ago")
+            clear_session_snapshot()
+            return
+        
+        # Peers know these sessions by our old peer ID
+        self.my_peer_id = snapshot['peer_id']
+        self.encoder = get_packet_encoder(self.my_peer_id, self.encoder.compact_compression)
+        restored = self.encryption_service.import_sessions(snapshot.get('sessions', {}))
+        if restored:
+            print(f"\033[90m» Resumed {restored} encrypted session(s) from {age:.0f}s ago\033[0m")
     
-    async def send_packet_with_fragmentation(self, packet: bytes):
-        """Fragment and send large packets"""
-        if not self.client or not self.characteristic:
-            debug_println("[!] No connection available. Cannot send fragmented message.")
+    def open_outbox(self):
+        """Open the outbox and put queued private messages back in line for their handshakes"""
+        try:
+            self.outbox = Outbox(get_outbox_path(), self.app_state.identity_key)
+        except Exception as e:
+            debug_println(f"[OUTBOX] Failed to open outbox: {e}")
             return
         
-        # Check if still connected
-        if not self.client.is_connected:
-            debug_println("[!] Connection lost. Cannot send fragmented packet.")
-            if self.client:
-                self.handle_disconnect(self.client)
+        for entry in self.outbox.entries(private=True):
+            self.pending_private_messages.setdefault(entry.peer_id, []).append(
+                (entry.content, entry.nickname, entry.message_id)
+            )
+        depth = self.outbox.depth()
+        if depth:
+            print(f"\033[90m» {depth} message(s) from the last session are waiting to be sent\033[0m")
+    
+    def queue_private_message(self, peer_id: str, nickname: str, content: str, message_id: str):
+        """Hold a private message until a session with the peer exists"""
+        self.pending_private_messages.setdefault(peer_id, []).append((content, nickname, message_id))
+        if self.outbox:
+            self.outbox.add(message_id, content, peer_id=peer_id, nickname=nickname)
+        debug_println(f"[NOISE] Queued private message for {peer_id}, {len(self.pending_private_messages[peer_id])} messages pending")
+    
+    async def send_packet(self, packet: bytes, lane: Optional[Lane] = None, exclude: Optional[str] = None):
+        """Queue a packet on every link, with fragmentation if needed.
+        
+        Relays pass ``Lane.BULK``; otherwise the lane follows the packet type.
+        ``exclude`` is the address of a link to leave out, such as the one a
+        relayed packet arrived on.
+        """
+        if DEBUG_LEVEL >= DebugLevel.FULL:
+            # Hex logging to match iOS format
+            debug_full_println(f"[RAW SEND] {' '.join(f'{b:02X}' for b in packet)}")
+        if not self.links.connected:
+            debug_println("[!] No connection available. Message dropped.")
             return
             
+        if should_fragment(packet):
+            await self.send_packet_with_fragmentation(packet, exclude, lane)
+            return
+        self.enqueue_packet(packet, lane, exclude)
+    
+    def enqueue_packet(self, packet: bytes, lane: Optional[Lane] = None, exclude: Optional[str] = None):
+        """Queue one unfragmented packet on every link except ``exclude``"""
+        if self.trace.enabled:
+            self.trace.record(TRACE_OUT, packet)
+        if not self.links.enqueue(packet, lane if lane is not None else packet_lane(packet[1]), exclude):
+            debug_println("[!] Send queue full or no other link, dropping packet")
+    
+    async def relay_packet(self, packet: bytes, source: Optional[str]):
+        """Send a relayed packet on every link except the one it came in on"""
+        await self.send_packet(packet, Lane.BULK, exclude=source)
+    
+    async def send_packet_with_fragmentation(self, packet: bytes, exclude: Optional[str] = None,
+                                             lane: Optional[Lane] = None):
+        """Fragment a large packet and queue the fragments as one group"""
         debug_println(f"[FRAG] Original packet size: {len(packet)} bytes")
         
-        fragment_size = 150  # Conservative size for iOS BLE
-        chunks = [packet[i:i+fragment_size] for i in range(0, len(packet), fragment_size)]
-        total_fragments = len(chunks)
+        # Fragments are shared by every link, so they have to fit the smallest MTU
+        mtu = self.links.mtu(exclude)
+        fragments = fragment_payload(packet, packet[1], fragment_chunk_size(mtu))
+        if not fragments:
+            # Fits in one chunk at this MTU, so it goes out whole
+            self.enqueue_packet(packet, lane, exclude)
+            return
+        total_fragments = len(fragments)
+        
+        debug_println(f"[FRAG] Fragment ID: {fragments[0].fragment_id.hex()}")
+        debug_println(f"[FRAG] Total fragments: {total_fragments} (MTU {mtu or 'unknown'})")
+        
+        fragment_packets = [
+            self.encoder.encode(MessageType(fragment.fragment_type), fragment.to_payload())
+            for fragment in fragments
+        ]
+        if self.trace.enabled:
+            for fragment_packet in fragment_packets:
+                self.trace.record(TRACE_OUT, fragment_packet)
+        if not self.links.enqueue_group(fragment_packets, Lane.BULK, exclude):
+            debug_println("[FRAG] Send queue full or no other link, dropping fragmented packet")
+            return
         
-        fragment_id = os.urandom(8)
-        debug_println(f"[FRAG] Fragment ID: {fragment_id.hex()}")
-        debug_println(f"[FRAG] Total fragments: {total_fragments}")
+        wire_bytes = sum(len(fragment_packet) for fragment_packet in fragment_packets)
+        overhead = wire_bytes - len(packet)
+        debug_println(f"[FRAG] {len(packet)} bytes queued as {wire_bytes} bytes in {total_fragments} writes "
+                      f"({overhead} bytes overhead, {100 * overhead / wire_bytes:.0f}% of airtime)")
+    
+    def handle_send_error(self, packet: bytes, error: Exception):
+        debug_println(f"[!] Failed to send {len(packet)} byte packet: {error}")
+    
+    async def handle_link_data(self, data: bytes, source: Optional[str] = None):
+        """Handle incoming BLE notifications from the link at address ``source``"""
+        if self.trace.enabled:
+            self.trace.record(TRACE_IN, data)
         
-        for index, chunk in enumerate(chunks):
-            if index == 0:
-                fragment_type = MessageType.FRAGMENT_START
-            elif index == len(chunks) - 1:
-                fragment_type = MessageType.FRAGMENT_END
-            else:
-                fragment_type = MessageType.FRAGMENT_CONTINUE
-            
-            # Create fragment payload
-            fragment_payload = bytearray()
-            fragment_payload.extend(fragment_id)
-            fragment_payload.extend(struct.pack('>H', index))
-            fragment_payload.extend(struct.pack('>H', total_fragments))
-            fragment_payload.append(MessageType.MESSAGE.value)
-            fragment_payload.extend(chunk)
-            
-            fragment_packet = create_bitchat_packet(
-                self.my_peer_id,
-                fragment_type,
-                bytes(fragment_payload)
-            )
-            
+        if DEBUG_LEVEL >= DebugLevel.FULL:
             try:
-                await self.client.write_gatt_char(
-                    self.characteristic,
-                    fragment_packet,
-                    response=False
-                )
-                
-                debug_println(f"[FRAG] ✓ Fragment {index + 1}/{total_fragments} sent")
-                
-                if index < len(chunks) - 1:
-                    await asyncio.sleep(0.02)  # 20ms delay
-            except Exception as e:
-                if "not connected" in str(e).lower():
-                    debug_println(f"[FRAG] Connection lost while sending fragment {index + 1}")
-                    if self.client:
-                        self.handle_disconnect(self.client)
-                    return
-                else:
-                    raise e
-    
-    async def notification_handler(self, sender: BleakGATTCharacteristic, data: bytes):
-        """Handle incoming BLE notifications"""
-        try:
-            # Enhanced hex logging to match iOS format
-            hex_string = ' '.join(f'{b:02X}' for b in data)
-            debug_full_println(f"[RAW RECV] Received {len(data)} bytes")
-            debug_full_println(f"[RAW RECV] {hex_string}")
-        except BlockingIOError:
-            # If even debug printing fails due to blocking, just silently continue
-            pass
+                # Enhanced hex logging to match iOS format
+                hex_string = ' '.join(f'{b:02X}' for b in data)
+                debug_full_println(f"[RAW RECV] Received {len(data)} bytes")
+                debug_full_println(f"[RAW RECV] {hex_string}")
+            except BlockingIOError:
+                # If even debug printing fails due to blocking, just silently continue
+                pass
             
         try:
             packet = parse_bitchat_packet(data)
@@ -605,6 +1101,7 @@ class BitchatClient:
             if packet.sender_id_str == self.my_peer_id:
                 return
             
+            packet.source = source
             await self.handle_packet(packet, data)
             
         except Exception as e:
@@ -616,6 +1113,10 @@ class BitchatClient:
     
     async def handle_packet(self, packet: BitchatPacket, raw_data: bytes):
         """Handle incoming packet"""
+        if not self.relay.observe(packet):
+            debug_full_println(f"[RELAY] Ignoring duplicate {packet.msg_type.name} from {packet.sender_id_str}")
+            return
+        
         if packet.msg_type == MessageType.ANNOUNCE:
             await self.handle_announce(packet)
         elif packet.msg_type == MessageType.MESSAGE:
@@ -636,6 +1137,8 @@ class BitchatClient:
             await self.handle_channel_announce(packet)
         elif packet.msg_type == MessageType.NOISE_IDENTITY_ANNOUNCE:
             await self.handle_noise_identity_announce(packet)
+        elif packet.msg_type == MessageType.DELIVERY_ACK:
+            await self.handle_delivery_ack(packet, raw_data)
     
     async def handle_announce(self, packet: BitchatPacket):
         """Handle peer announcement"""
@@ -656,23 +1159,15 @@ class BitchatClient:
                 # We have lower ID, initiate handshake
                 debug_println(f"[CRYPTO] Initiating Noise handshake with new peer {packet.sender_id_str} (tie-breaker: we have lower ID)")
                 try:
-                    handshake_message = self.encryption_service.initiate_handshake(packet.sender_id_str)
-                    handshake_packet = create_bitchat_packet_with_recipient(
-                        self.my_peer_id, packet.sender_id_str, MessageType.NOISE_HANDSHAKE_INIT, handshake_message, None
-                    )
-                    # Set TTL to 3 like iOS
-                    handshake_data = bytearray(handshake_packet)
-                    handshake_data[2] = 3
-                    handshake_packet = bytes(handshake_data)
+                    handshake_message = await self.handshakes.initiate(packet.sender_id_str)
+                    handshake_packet = self.encoder.encode(MessageType.NOISE_HANDSHAKE_INIT, handshake_message, packet.sender_id_str, ttl=3)
                     await self.send_packet(handshake_packet)
                     debug_println(f"[NOISE] Sent handshake init to {packet.sender_id_str}, payload size: {len(handshake_message)}")
                 except Exception as e:
                     debug_println(f"[CRYPTO] Failed to initiate handshake: {e}")
                     # Fallback to old key exchange
                     key_exchange_payload = self.encryption_service.get_combined_public_key_data()
-                    key_exchange_packet = create_bitchat_packet(
-                        self.my_peer_id, MessageType.KEY_EXCHANGE, key_exchange_payload
-                    )
+                    key_exchange_packet = self.encoder.encode(MessageType.KEY_EXCHANGE, key_exchange_payload)
                     await self.send_packet(key_exchange_packet)
             else:
                 # We have higher ID, send targeted identity announce to prompt them to initiate
@@ -693,10 +1188,7 @@ class BitchatClient:
                         self.nickname, timestamp_ms, signature
                     )
                     
-                    identity_packet = create_bitchat_packet_with_recipient(
-                        self.my_peer_id, packet.sender_id_str, MessageType.NOISE_IDENTITY_ANNOUNCE, 
-                        identity_payload, signature
-                    )
+                    identity_packet = self.encoder.encode(MessageType.NOISE_IDENTITY_ANNOUNCE, identity_payload, packet.sender_id_str, signature=signature)
                     await self.send_packet(identity_packet)
                 except Exception as e:
                     debug_println(f"[CRYPTO] Failed to send targeted identity announce: {e}")
@@ -714,12 +1206,8 @@ class BitchatClient:
         is_for_us = is_broadcast or (packet.recipient_id_str == self.my_peer_id)
         
         if not is_for_us:
-            # Relay if TTL > 1
-            if packet.ttl > 1:
-                await asyncio.sleep(random.uniform(0.01, 0.05))
-                relay_data = bytearray(raw_data)
-                relay_data[2] = packet.ttl - 1
-                await self.send_packet(bytes(relay_data))
+            # Relay towards the recipient
+            self.relay.schedule(packet, probabilistic=False)
             return
         is_private_message = not is_broadcast and is_for_us
         decrypted_payload = None
@@ -737,12 +1225,8 @@ class BitchatClient:
                 message = parse_bitchat_message_payload(unpadded)
             else:
                 message = parse_bitchat_message_payload(packet.payload)
-            # Check for duplicates using both bloom filter and set
-            if message.id not in self.processed_messages:
-                # Add to bloom filter and set
-                self.bloom.add(message.id)
-                self.processed_messages.add(message.id)
-                
+            # Check for duplicates before decoding the rest of the message
+            if self.dedup.add(message.id_view):
                 # Display the message
                 await self.display_message(message, packet, is_private_message)
                 
@@ -750,12 +1234,8 @@ class BitchatClient:
                 if should_send_ack(is_private_message, message.channel, None, self.nickname, len(self.peers)):
                     await self.send_delivery_ack(message.id, packet.sender_id_str, is_private_message)
                 
-                # Relay if TTL > 1
-                if packet.ttl > 1:
-                    await asyncio.sleep(random.uniform(0.01, 0.05))
-                    relay_data = bytearray(raw_data)
-                    relay_data[2] = packet.ttl - 1
-                    await self.send_packet(bytes(relay_data))
+                # Relay to the rest of the mesh
+                self.relay.schedule(packet)
             else:
                 debug_println(f"[DUPLICATE] Ignoring duplicate message: {message.id}")
                     
@@ -780,7 +1260,7 @@ class BitchatClient:
                 decrypted = self.encryption_service.decrypt_from_channel(
                     message.encrypted_content,
                     message.channel,
-                    self.channel_keys[message.channel],
+                    await self.channel_keys.ensure(message.channel),
                     creator_fingerprint
                 )
                 display_content = decrypted
@@ -821,50 +1301,45 @@ class BitchatClient:
     
     async def handle_fragment(self, packet: BitchatPacket, raw_data: bytes):
         """Handle message fragment"""
-        if len(packet.payload) >= 13:
-            fragment_id = packet.payload[0:8]
-            index = struct.unpack('>H', packet.payload[8:10])[0]
-            total = struct.unpack('>H', packet.payload[10:12])[0]
-            original_type = packet.payload[12]
-            fragment_data = packet.payload[13:]
+        payload = packet.payload
+        if len(payload) >= FRAGMENT_HEADER.size:
+            fragment_id, index, total, original_type = FRAGMENT_HEADER.unpack_from(payload)
+            fragment_data = memoryview(payload)[FRAGMENT_HEADER.size:]
             
+            debug_full_println(f"[COLLECTOR] Adding fragment {index + 1}/{total} for ID {fragment_id.hex()[:8]}")
             result = self.fragment_collector.add_fragment(
                 fragment_id, index, total, original_type, fragment_data, packet.sender_id_str
             )
             
             if result:
                 complete_data, _ = result
+                debug_full_println(f"[COLLECTOR] ✓ Reassembly complete: {len(complete_data)} bytes total")
                 reassembled_packet = parse_bitchat_packet(complete_data)
+                reassembled_packet.source = packet.source
                 await self.handle_packet(reassembled_packet, complete_data)
         
-        # Relay fragment if TTL > 1
-        if packet.ttl > 1:
-            await asyncio.sleep(random.uniform(0.01, 0.05))
-            relay_data = bytearray(raw_data)
-            relay_data[2] = packet.ttl - 1
-            await self.send_packet(bytes(relay_data))
+        # Relay every fragment, dropping one at random would waste the rest of the set
+        self.relay.schedule(packet, probabilistic=False)
     
     async def handle_key_exchange(self, packet: BitchatPacket):
         """Handle key exchange"""
         try:
             # Convert bytearray to bytes for encryption service
             payload_bytes = bytes(packet.payload) if isinstance(packet.payload, bytearray) else packet.payload
-            response = self.encryption_service.process_handshake_message(packet.sender_id_str, payload_bytes)
+            response = await self.handshakes.process(packet.sender_id_str, payload_bytes)
             if response:
-                response_packet = create_bitchat_packet(
-                    self.my_peer_id, MessageType.KEY_EXCHANGE, response
-                )
+                response_packet = self.encoder.encode(MessageType.KEY_EXCHANGE, response)
                 await self.send_packet(response_packet)
             
             if self.encryption_service.is_session_established(packet.sender_id_str):
                 debug_println(f"[CRYPTO] Handshake completed with {packet.sender_id_str}")
+                self.save_session_snapshot()
+                await self.send_pending_private_messages(packet.sender_id_str)
                 # If this is a new peer after reconnection, send our key exchange too
                 if packet.sender_id_str not in self.peers:
                     debug_println(f"[CRYPTO] Sending key exchange response to new peer {packet.sender_id_str}")
-                    handshake_message = self.encryption_service.initiate_handshake(packet.sender_id_str)
-                    key_exchange_packet = create_bitchat_packet(
-                        self.my_peer_id, MessageType.KEY_EXCHANGE, handshake_message
-                    )
+                    handshake_message = await self.handshakes.initiate(packet.sender_id_str)
+                    key_exchange_packet = self.encoder.encode(MessageType.KEY_EXCHANGE, handshake_message)
                     await self.send_packet(key_exchange_packet)
 
         except Exception as e:
@@ -888,22 +1363,18 @@ class BitchatClient:
         try:
             # Convert bytearray to bytes for encryption service
             payload_bytes = bytes(packet.payload) if isinstance(packet.payload, bytearray) else packet.payload
-            response = self.encryption_service.process_handshake_message(packet.sender_id_str, payload_bytes)
+            response = await self.handshakes.process(packet.sender_id_str, payload_bytes)
             debug_println(f"[NOISE] process_handshake_message returned: {bool(response)}, response size: {len(response) if response else 0}")
             
             if response:
                 # Send handshake response with proper recipient
-                response_packet = create_bitchat_packet_with_recipient(
-                    self.my_peer_id, packet.sender_id_str, MessageType.NOISE_HANDSHAKE_RESP, response, None
-                )
-                # Set TTL to 3 like iOS
-                response_data = bytearray(response_packet)
-                response_data[2] = 3
-                await self.send_packet(bytes(response_data))
+                response_packet = self.encoder.encode(MessageType.NOISE_HANDSHAKE_RESP, response, packet.sender_id_str, ttl=3)
+                await self.send_packet(response_packet)
                 debug_println(f"[NOISE] Sent handshake response to {packet.sender_id_str}, payload size: {len(response)}")
             
             if self.encryption_service.is_session_established(packet.sender_id_str):
                 debug_println(f"[NOISE] Handshake completed with {packet.sender_id_str}")
+                self.save_session_snapshot()
                 # Clear handshake attempt time on success (matching Swift)
                 self.handshake_attempt_times.pop(packet.sender_id_str, None)
                 peer_nickname = self.peers.get(packet.sender_id_str, Peer()).nickname or packet.sender_id_str
@@ -938,22 +1409,20 @@ class BitchatClient:
         try:
             # Convert bytearray to bytes for encryption service
             payload_bytes = bytes(packet.payload) if isinstance(packet.payload, bytearray) else packet.payload
-            response = self.encryption_service.process_handshake_message(packet.sender_id_str, payload_bytes)
+            response = await self.handshakes.process(packet.sender_id_str, payload_bytes)
             debug_println(f"[NOISE] process_handshake_message returned: {bool(response)}, response size: {len(response) if response else 0}")
             
             if response:
                 # Send final handshake message
-                final_packet = create_bitchat_packet_with_recipient(
-                    self.my_peer_id, packet.sender_id_str, MessageType.NOISE_HANDSHAKE_INIT, response, None  # Continue with same type
+                final_packet = self.encoder.encode(
+                    MessageType.NOISE_HANDSHAKE_INIT, response, packet.sender_id_str, ttl=3  # Continue with same type, TTL 3 like iOS
                 )
-                # Set TTL to 3 like iOS
-                final_data = bytearray(final_packet)
-                final_data[2] = 3
-                await self.send_packet(bytes(final_data))
+                await self.send_packet(final_packet)
                 debug_println(f"[NOISE] Sent final handshake message to {packet.sender_id_str}, payload size: {len(response)}")
             
             if self.encryption_service.is_session_established(packet.sender_id_str):
                 debug_println(f"[NOISE] Handshake completed with {packet.sender_id_str}")
+                self.save_session_snapshot()
                 # Clear handshake attempt time on success (matching Swift)
                 self.handshake_attempt_times.pop(packet.sender_id_str, None)
                 peer_nickname = self.peers.get(packet.sender_id_str, Peer()).nickname or packet.sender_id_str
@@ -1007,10 +1476,7 @@ class BitchatClient:
                                 message = parse_bitchat_message_payload(inner_packet.payload)
                                 
                                 # Check for duplicates
-                                if message.id not in self.processed_messages:
-                                    self.bloom.add(message.id)
-                                    self.processed_messages.add(message.id)
-                                    
+                                if self.dedup.add(message.id_view):
                                     # Display the message as private
                                     await self.display_message(message, packet, True)
                                     
@@ -1018,6 +1484,8 @@ class BitchatClient:
                                     await self.send_delivery_ack(message.id, packet.sender_id_str, True)
                                 else:
                                     debug_println(f"[DUPLICATE] Ignoring duplicate encrypted message: {message.id}")
+                                    # A resend means our ACK was lost, acknowledge again
+                                    await self.send_delivery_ack(message.id, packet.sender_id_str, True, force=True)
                                     
                             except Exception as e:
                                 debug_println(f"[NOISE] Failed to parse inner message payload: {e}")
@@ -1089,6 +1557,8 @@ class BitchatClient:
                 # Clear pending messages for this peer
                 if packet.sender_id_str in self.pending_private_messages:
                     del self.pending_private_messages[packet.sender_id_str]
+                    if self.outbox:
+                        self.outbox.discard_peer(packet.sender_id_str)
                     
                 # Clear encryption session for this peer
                 self.encryption_service.remove_session(packet.sender_id_str)
@@ -1139,17 +1609,24 @@ class BitchatClient:
         is_for_us = packet.recipient_id_str == self.my_peer_id if packet.recipient_id_str else False
         
         if is_for_us:
-            # Decrypt if needed
-            ack_payload = packet.payload
-            if packet.ttl == 3 and self.encryption_service.is_session_established(packet.sender_id_str):
+            # Public and channel ACKs are plain JSON. Only decrypt what isn't, since a
+            # failed decrypt would still use up a nonce of the peer's session
+            try:
+                ack_data = json.loads(packet.payload)
+            except (UnicodeDecodeError, ValueError):
+                ack_data = None
+            if not isinstance(ack_data, dict):
+                if not self.encryption_service.is_session_established(packet.sender_id_str):
+                    debug_println(f"[ACK] Encrypted ACK from {packet.sender_id_str} without a session")
+                    return
                 try:
-                    ack_payload = self.encryption_service.decrypt_from_peer(packet.sender_id_str, packet.payload)
-                except:
-                    pass
+                    ack_data = json.loads(self.encryption_service.decrypt_from_peer(packet.sender_id_str, packet.payload))
+                except Exception as e:
+                    debug_println(f"[ACK] Failed to decrypt delivery ACK: {e}")
+                    return
             
-            # Parse ACK
+            # Parse ACK, either a single ACK or a batch carrying several message IDs
             try:
-                ack_data = json.loads(ack_payload)
                 ack = DeliveryAck(
                     ack_data['originalMessageID'],
                     ack_data['ackID'],
@@ -1158,18 +1635,25 @@ class BitchatClient:
                     ack_data['timestamp'],
                     ack_data['hopCount']
                 )
+                message_ids = ack_data.get('originalMessageIDs') or [ack.original_message_id]
+                
+                if ack_data.get('supportsBatch'):
+                    peer = self.peers.get(packet.sender_id_str)
+                    if peer is not None:
+                        peer.supports_ack_batch = True
                 
-                if self.delivery_tracker.mark_delivered(ack.original_message_id):
+                delivered = sum(self.delivery_tracker.mark_delivered(message_id) for message_id in message_ids)
+                if delivered == 1:
                     print(f"\r\u001b[K\u001b[90m✓ Delivered to {ack.recipient_nickname}\u001b[0m\n> ", end='', flush=True)
+                elif delivered:
+                    print(f"\r\u001b[K\u001b[90m✓ {delivered} messages delivered to {ack.recipient_nickname}\u001b[0m\n> ", end='', flush=True)
                     
             except Exception as e:
                 debug_println(f"[ACK] Failed to parse delivery ACK: {e}")
                 
-        elif packet.ttl > 1:
+        else:
             # Relay ACK
-            relay_data = bytearray(raw_data)
-            relay_data[2] = packet.ttl - 1
-            await self.send_packet(bytes(relay_data))
+            self.relay.schedule(packet, probabilistic=False)
 
     async def handle_noise_identity_announce(self, packet: BitchatPacket):
         """Handle Noise identity announcement"""
@@ -1232,14 +1716,8 @@ class BitchatClient:
                 # Check if we already have a session or ongoing handshake
                 if not self.encryption_service.is_session_established(peer_id):
                     try:
-                        handshake_message = self.encryption_service.initiate_handshake(peer_id)
-                        handshake_packet = create_bitchat_packet_with_recipient(
-                            self.my_peer_id, peer_id, MessageType.NOISE_HANDSHAKE_INIT, handshake_message, None
-                        )
-                        # Set TTL to 3 like iOS
-                        handshake_data = bytearray(handshake_packet)
-                        handshake_data[2] = 3
-                        handshake_packet = bytes(handshake_data)
+                        handshake_message = await self.handshakes.initiate(peer_id)
+                        handshake_packet = self.encoder.encode(MessageType.NOISE_HANDSHAKE_INIT, handshake_message, peer_id, ttl=3)
                         await self.send_packet(handshake_packet)
                         debug_println(f"[NOISE] Initiated handshake with {peer_id}")
                     except Exception as e:
@@ -1426,16 +1904,41 @@ class BitchatClient:
         
         return bytes(data)
     
-    async def send_delivery_ack(self, message_id: str, sender_id: str, is_private: bool):
-        """Send delivery acknowledgment"""
+    async def send_delivery_ack(self, message_id: str, sender_id: str, is_private: bool, force: bool = False):
+        """Send delivery acknowledgment, batched per peer when the peer supports it"""
         ack_id = f"{message_id}-{self.my_peer_id}"
-        if not self.delivery_tracker.should_send_ack(ack_id):
+        if not self.delivery_tracker.should_send_ack(ack_id) and not force:
             return
         
-        debug_println(f"[ACK] Sending delivery ACK for message {message_id}")
+        peer = self.peers.get(sender_id)
+        if peer is None or not peer.supports_ack_batch:
+            await self.send_ack_packet([message_id], sender_id, is_private)
+            return
+        
+        key = (sender_id, is_private)
+        batch = self.pending_acks.setdefault(key, [])
+        batch.append(message_id)
+        if len(batch) >= ACK_BATCH_MAX:
+            await self.flush_acks(key)
+        elif len(batch) == 1:
+            asyncio.create_task(self.flush_acks_later(key))
+    
+    async def flush_acks_later(self, key: Tuple[str, bool]):
+        await asyncio.sleep(ACK_COALESCE_WINDOW)
+        await self.flush_acks(key)
+    
+    async def flush_acks(self, key: Tuple[str, bool]):
+        """Send the ACKs queued for a peer as one packet"""
+        message_ids = self.pending_acks.pop(key, None)
+        if message_ids:
+            await self.send_ack_packet(message_ids, *key)
+    
+    async def send_ack_packet(self, message_ids: List[str], sender_id: str, is_private: bool):
+        """Build and send an ACK packet for one or more messages"""
+        debug_println(f"[ACK] Sending delivery ACK for {len(message_ids)} message(s): {', '.join(message_ids)}")
         
         ack = DeliveryAck(
-            message_id,
+            message_ids[0],
             str(uuid.uuid4()),
             self.my_peer_id,
             self.nickname,
@@ -1443,14 +1946,19 @@ class BitchatClient:
             1
         )
         
-        ack_payload = json.dumps({
+        ack_data = {
             'originalMessageID': ack.original_message_id,
             'ackID': ack.ack_id,
             'recipientID': ack.recipient_id,
             'recipientNickname': ack.recipient_nickname,
             'timestamp': ack.timestamp,
-            'hopCount': ack.hop_count
-        }).encode()
+            'hopCount': ack.hop_count,
+            # Unknown keys are ignored by other clients, so this advertises batching safely
+            'supportsBatch': True
+        }
+        if len(message_ids) > 1:
+            ack_data['originalMessageIDs'] = message_ids
+        ack_payload = json.dumps(ack_data).encode()
         
         # Encrypt if private
         if is_private:
@@ -1460,35 +1968,17 @@ class BitchatClient:
                 pass
         
         # Send ACK packet
-        ack_packet = create_bitchat_packet_with_recipient(
-            self.my_peer_id,
-            sender_id,
-            MessageType.DELIVERY_ACK,
-            ack_payload,
-            None
-        )
-        
-        # Set TTL to 3
-        ack_packet_data = bytearray(ack_packet)
-        ack_packet_data[2] = 3
+        ack_packet = self.encoder.encode(MessageType.DELIVERY_ACK, ack_payload, sender_id, ttl=3)
         
-        await self.send_packet(bytes(ack_packet_data))
+        await self.send_packet(ack_packet)
     
     async def send_channel_announce(self, channel: str, is_protected: bool, key_commitment: Optional[str]):
         """Send channel announcement"""
         payload = f"{channel}|{'1' if is_protected else '0'}|{self.my_peer_id}|{key_commitment or ''}"
-        packet = create_bitchat_packet(
-            self.my_peer_id,
-            MessageType.CHANNEL_ANNOUNCE,
-            payload.encode()
-        )
-        
-        # Set TTL to 5
-        packet_data = bytearray(packet)
-        packet_data[2] = 5
+        packet = self.encoder.encode(MessageType.CHANNEL_ANNOUNCE, payload.encode(), ttl=5)
         
         debug_println(f"[CHANNEL] Sending channel announce for {channel}")
-        await self.send_packet(bytes(packet_data))
+        await self.send_packet(packet)
     
     async def save_app_state(self):
         """Save application state"""
@@ -1522,10 +2012,8 @@ class BitchatClient:
         
         if line == "/exit":
             # Send leave notification if connected
-            if self.client and self.client.is_connected:
-                leave_packet = create_bitchat_packet(
-                    self.my_peer_id, MessageType.LEAVE, self.nickname.encode()
-                )
+            if self.links.connected:
+                leave_packet = self.encoder.encode(MessageType.LEAVE, self.nickname.encode())
                 await self.send_packet(leave_packet)
                 await asyncio.sleep(0.1)  # Give time for the packet to send
             
@@ -1549,9 +2037,7 @@ class BitchatClient:
                 print("\033[90mThis nickname is reserved and cannot be used.\033[0m")
             else:
                 self.nickname = new_name
-                announce_packet = create_bitchat_packet(
-                    self.my_peer_id, MessageType.ANNOUNCE, self.nickname.encode()
-                )
+                announce_packet = self.encoder.encode(MessageType.ANNOUNCE, self.nickname.encode())
                 await self.send_packet(announce_packet)
                 print(f"\033[90m» Nickname changed to: {self.nickname}\033[0m")
                 await self.save_app_state()
@@ -1582,7 +2068,7 @@ class BitchatClient:
             return
         
         if line in ["/online", "/w"]:
-            if not self.client or not self.client.is_connected:
+            if not self.links.connected:
                 print("» You're not connected to any peers yet.")
                 print("\033[90mWaiting for other BitChat devices...\033[0m")
             else:
@@ -1617,13 +2103,14 @@ class BitchatClient:
             peer_count = len(self.peers)
             channel_count = len(self.chat_context.active_channels)
             dm_count = len(self.chat_context.active_dms)
-            connection_status = "Connected" if (self.client and self.client.is_connected) else "Offline"
+            connection_status = "Connected" if self.links.connected else "Offline"
             session_count = self.encryption_service.get_session_count()
             pending_handshakes = len(self.encryption_service.handshake_states)
             pending_messages = sum(len(msgs) for msgs in self.pending_private_messages.values())
             
             print("\n╭─── Connection Status ──────╮")
             print(f"│ Status: {connection_status:^18} │")
+            print(f"│ BLE links:       {self.links.ble_links:6}/{self.links.max_links:<4}│")
             print(f"│ Peers connected: {peer_count:6}     │")
             print(f"│ Active channels: {channel_count:6}     │")
             print(f"│ Active DMs:      {dm_count:6}     │")
@@ -1647,10 +2134,52 @@ class BitchatClient:
             # Show pending handshakes if any
             if pending_handshakes > 0:
                 print("\n🤝 Pending Handshakes:")
-                for peer_id in self.encryption_service.handshake_states.keys():
+                for peer_id in self.encryption_service.session_manager.handshake_peers():
                     nickname = self.peers.get(peer_id, Peer()).nickname or peer_id[:8] + "..."
                     print(f"  • {nickname}")
             
+            # Show compression savings if anything was compressed
+            compression = self.encoder.compression_stats
+            if compression['compressed']:
+                print(f"\n📦 Compression: {compression['compressed']}/{compression['attempted']} payloads, "
+                      f"{compression['bytes_saved']} of {compression['bytes_in']} bytes saved")
+            
+            # Show each link and how much it has carried
+            links = self.links.stats
+            if self.links.links:
+                print("\n📡 Links:")
+                for link in self.links.links.values():
+                    print(f"  • {link.transport} {link.address} (MTU {link.mtu or '-'}, {link.received} received, "
+                          f"{link.scheduler.stats['sent']} sent, {link.scheduler.pending()} queued)")
+            print(f"\n📡 Fan-out: {links['fanout_writes']} writes queued, {links['echo_avoided']} echoes avoided, "
+                  f"{links['connected']} links opened, {links['lost']} lost, "
+                  f"{len(self.candidates)} candidate device(s) heard")
+            profiles = self.links.profiles.stats
+            print(f"📡 GATT profile cache: {profiles['hits']} hits, {profiles['misses']} misses, "
+                  f"{profiles['stale']} stale")
+            
+            if self.outbox:
+                outbox = self.outbox.stats
+                oldest = self.outbox.oldest_age()
+                print(f"\n📤 Outbox: {self.outbox.depth()} waiting"
+                      f"{f' (oldest {oldest:.0f}s)' if oldest is not None else ''}, {outbox['sent']} sent, "
+                      f"{outbox['expired']} expired, {outbox['dropped']} dropped")
+            
+            sessions = self.encryption_service.session_manager.stats
+            print(f"\n🔁 Sessions: {sessions['created']} created, {sessions['rekeyed']} rekeyed, "
+                  f"{sessions['evicted_idle']} idle evicted, {sessions['evicted_lru']} LRU evicted, "
+                  f"{sessions['handshakes_expired']} handshakes timed out")
+            
+            # Crypto time: transport/channel work runs on the event loop, handshakes on workers
+            handshakes = self.handshakes.stats
+            print(f"\n🔐 Crypto: {self.encryption_service.loop_crypto_seconds * 1000:.1f} ms on event loop, "
+                  f"{handshakes['worker_seconds'] * 1000:.1f} ms in {handshakes['steps']} handshake steps "
+                  f"(peak {handshakes['peak_concurrent']} concurrent, {handshakes['queued']} queued)")
+            rejected = decompression_stats['rejected_oversize'] + decompression_stats['rejected_corrupt']
+            if rejected:
+                print(f"⚠️  Rejected compressed payloads: {decompression_stats['rejected_oversize']} oversize, "
+                      f"{decompression_stats['rejected_corrupt']} corrupt")
+            
             # Show pending messages if any
             if pending_messages > 0:
                 print("\n📝 Queued Messages:")
@@ -1661,6 +2190,18 @@ class BitchatClient:
             print("> ", end='', flush=True)
             return
         
+        if line == "/trace" or line.startswith("/trace "):
+            self.handle_trace_command(line)
+            return
+        
+        if line == "/pending":
+            self.handle_pending_command()
+            return
+        
+        if line == "/relay":
+            self.handle_relay_command()
+            return
+        
         if line == "/clear":
             clear_screen()
             print_banner()
@@ -1721,13 +2262,64 @@ class BitchatClient:
                 self.chat_context.current_mode.nickname
             )
         else:
-            # Check if we're connected before sending
-            if not self.client or not self.client.is_connected:
-                print("\033[93m⚠ You're not connected to any peers yet.\033[0m")
-                print("\033[90mYour message will be sent once someone joins the network.\033[0m")
-                print("\033[90m(This Python client doesn't queue messages while offline)\033[0m")
-            else:
-                await self.send_public_message(line)
+            # Queued in the outbox when offline
+            await self.send_public_message(line)
+    
+    def handle_trace_command(self, line: str):
+        """Handle /trace command"""
+        parts = line.split(maxsplit=2)
+        
+        if len(parts) == 1:
+            state = "on" if self.trace.enabled else "off"
+            print(f"» Packet tracing is {state} ({len(self.trace.records)}/{self.trace.records.maxlen} packets buffered)")
+        elif parts[1] == "on":
+            self.trace.enabled = True
+            print("» Packet tracing enabled")
+        elif parts[1] == "off":
+            self.trace.enabled = False
+            print("» Packet tracing disabled")
+        elif parts[1] == "clear":
+            self.trace.clear()
+            print("» Packet trace cleared")
+        elif parts[1] == "dump" and len(parts) == 3:
+            try:
+                count = self.trace.dump(parts[2])
+                print(f"» Wrote {count} packet(s) to {parts[2]}")
+                print(f"\033[90m» View with: python packet_trace.py {parts[2]}\033[0m")
+            except OSError as e:
+                print(f"\033[91m✗ Failed to write trace: {e}\033[0m")
+        else:
+            print("\033[93m⚠ Usage: /trace [on|off|clear|dump <file>]\033[0m")
+            print("\033[90mExample: /trace dump capture.bin\033[0m")
+        print("> ", end='', flush=True)
+    
+    def handle_pending_command(self):
+        """Handle /pending command"""
+        pending = sorted(self.delivery_tracker.pending_messages.values(), key=lambda entry: entry.sent_at)
+        if not pending:
+            print("» No messages waiting for delivery")
+        else:
+            now = time.time()
+            print(f"» {len(pending)} message(s) waiting for delivery:")
+            for entry in pending:
+                preview = entry.content if len(entry.content) <= 30 else entry.content[:27] + "..."
+                if entry.is_private:
+                    target = entry.recipient_nickname or entry.recipient_id
+                    status = f"attempt {entry.attempts}/{DELIVERY_MAX_ATTEMPTS}, next in {max(0, entry.deadline - now):.0f}s"
+                else:
+                    target = "public"
+                    status = f"ACK window closes in {max(0, entry.deadline - now):.0f}s"
+                print(f"  • {target}: \033[90m{preview}\033[0m ({status})")
+        print("> ", end='', flush=True)
+    
+    def handle_relay_command(self):
+        """Handle /relay command"""
+        stats = self.relay.stats
+        print(f"» Relayed: {stats['relayed']}, suppressed: {stats['suppressed']}, "
+              f"skipped: {stats['skipped']}, duplicates dropped: {stats['duplicates']}")
+        print(f"\033[90m» {len(self.relay.seen)} packets in seen-cache, "
+              f"relay probability {self.relay.relay_probability():.2f} with {len(self.peers)} peers\033[0m")
+        print("> ", end='', flush=True)
     
     async def handle_join_channel(self, line: str):
         """Handle /j command"""
@@ -1774,7 +2366,7 @@ class BitchatClient:
                 print("\033[90mMinimum 4 characters required.\033[0m")
                 return
             
-            key = EncryptionService.derive_channel_key(password, channel_name)
+            key = await self.channel_keys.derive(channel_name, password)
             
             # Verify password
             if channel_name in self.channel_key_commitments:
@@ -1783,7 +2375,7 @@ class BitchatClient:
                     print(f"❌ wrong password for channel {channel_name}. please enter the correct password.")
                     return
             
-            self.channel_keys[channel_name] = key
+            self.channel_keys.set(channel_name, key, password)
             self.discovered_channels.add(channel_name)
             
             # Save encrypted password
@@ -1808,8 +2400,8 @@ class BitchatClient:
         else:
             # Not password protected
             if password:
-                key = EncryptionService.derive_channel_key(password, channel_name)
-                self.channel_keys[channel_name] = key
+                key = await self.channel_keys.derive(channel_name, password)
+                self.channel_keys.set(channel_name, key, password)
                 self.discovered_channels.add(channel_name)
                 self.chat_context.switch_to_channel_silent(channel_name)
                 print("\r\033[K\033[90m─────────────────────────\033[0m")
@@ -1832,7 +2424,7 @@ class BitchatClient:
     
     async def handle_dm_command(self, line: str):
         """Handle /dm command"""
-        if not self.client or not self.client.is_connected:
+        if not self.links.connected:
             print("\033[93m⚠ Not connected to the BitChat network yet.\033[0m")
             print("\033[90mWait for a connection before sending direct messages.\033[0m")
             return
@@ -1957,15 +2549,9 @@ class BitchatClient:
             
             # Send leave notification
             leave_payload = channel.encode()
-            leave_packet = create_bitchat_packet(
-                self.my_peer_id, MessageType.LEAVE, leave_payload
-            )
+            leave_packet = self.encoder.encode(MessageType.LEAVE, leave_payload, ttl=3)
             
-            # Set TTL to 3
-            leave_packet_data = bytearray(leave_packet)
-            leave_packet_data[2] = 3
-            
-            await self.send_packet(bytes(leave_packet_data))
+            await self.send_packet(leave_packet)
             
             # Clean up
             self.channel_keys.pop(channel, None)
@@ -2017,10 +2603,10 @@ class BitchatClient:
             debug_println(f"[CHANNEL] Claiming ownership of {channel}")
         
         # Update password
-        old_key = self.channel_keys.get(channel)
-        new_key = EncryptionService.derive_channel_key(new_password, channel)
+        old_key = await self.channel_keys.ensure(channel)
+        new_key = await self.channel_keys.derive(channel, new_password)
         
-        self.channel_keys[channel] = new_key
+        self.channel_keys.set(channel, new_key, new_password)
         self.password_protected_channels.add(channel)
         
         # Save encrypted password
@@ -2043,7 +2629,7 @@ class BitchatClient:
                 notify_payload, _ = create_encrypted_channel_message_payload(
                     self.nickname, notify_msg, channel, old_key, self.encryption_service, self.my_peer_id
                 )
-                notify_packet = create_bitchat_packet(self.my_peer_id, MessageType.MESSAGE, notify_payload)
+                notify_packet = self.encoder.encode(MessageType.MESSAGE, notify_payload)
                 await self.send_packet(notify_packet)
             except:
                 pass
@@ -2056,7 +2642,7 @@ class BitchatClient:
         init_payload, _ = create_encrypted_channel_message_payload(
             self.nickname, init_msg, channel, new_key, self.encryption_service, self.my_peer_id
         )
-        init_packet = create_bitchat_packet(self.my_peer_id, MessageType.MESSAGE, init_payload)
+        init_packet = self.encoder.encode(MessageType.MESSAGE, init_payload)
         await self.send_packet(init_packet)
         
         await self.save_app_state()
@@ -2106,48 +2692,51 @@ class BitchatClient:
         is_protected = channel in self.password_protected_channels
         key_commitment = None
         if is_protected and channel in self.channel_keys:
-            key_commitment = hashlib.sha256(self.channel_keys[channel]).hexdigest()
+            key_commitment = hashlib.sha256(await self.channel_keys.ensure(channel)).hexdigest()
         
         await self.send_channel_announce(channel, is_protected, key_commitment)
         
         print(f"» Transferred ownership of {channel} to {target}")
     
-    async def send_public_message(self, content: str):
-        """Send a public or channel message"""
-        if not self.client or not self.characteristic:
-            print("\033[93m⚠ Not connected to any peers yet.\033[0m")
-            print("\033[90mYour message will be sent once a connection is established.\033[0m")
-            return
-            
-        current_channel = None
-        if isinstance(self.chat_context.current_mode, Channel):
+    async def send_public_message(self, content: str, channel: Optional[str] = None,
+                                  message_id: Optional[str] = None, from_outbox: bool = False):
+        """Send a public or channel message, or queue it in the outbox while offline"""
+        current_channel = channel
+        if not from_outbox and isinstance(self.chat_context.current_mode, Channel):
             current_channel = self.chat_context.current_mode.name
-            
-            # Check if password protected
-            if current_channel in self.password_protected_channels and current_channel not in self.channel_keys:
-                print(f"❌ Cannot send to password-protected channel {current_channel}. Join with password first.")
+        
+        # Check if password protected
+        if current_channel in self.password_protected_channels and current_channel not in self.channel_keys:
+            print(f"❌ Cannot send to password-protected channel {current_channel}. Join with password first.")
+            return
+        
+        if not self.links.connected:
+            if self.outbox is None:
+                print("\033[93m⚠ Not connected to any peers yet.\033[0m")
                 return
+            self.outbox.add(message_id or str(uuid.uuid4()), content, channel=current_channel)
+            print("\033[90m» Not connected yet, your message will be sent once a connection is established.\033[0m")
+            return
         
         # Create message payload
         if current_channel and current_channel in self.channel_keys:
             # Encrypted channel message
             creator_fingerprint = self.channel_creators.get(current_channel, '')
-            encrypted_content = self.encryption_service.encrypt_for_channel(content, current_channel, self.channel_keys[current_channel], creator_fingerprint)
+            channel_key = await self.channel_keys.ensure(current_channel)
+            encrypted_content = self.encryption_service.encrypt_for_channel(content, current_channel, channel_key, creator_fingerprint)
             payload, message_id = create_bitchat_message_payload_full(
-                self.nickname, content, current_channel, False, self.my_peer_id, True, encrypted_content
+                self.nickname, content, current_channel, False, self.my_peer_id, True, encrypted_content, message_id
             )
         else:
             # Regular message
             payload, message_id = create_bitchat_message_payload_full(
-                self.nickname, content, current_channel, False, self.my_peer_id, False, None
+                self.nickname, content, current_channel, False, self.my_peer_id, False, None, message_id
             )
         
         # Track for delivery
         self.delivery_tracker.track_message(message_id, content, False)
         
-        message_packet = create_bitchat_packet(
-            self.my_peer_id, MessageType.MESSAGE, payload
-        )
+        message_packet = self.encoder.encode(MessageType.MESSAGE, payload)
         
         await self.send_packet(message_packet)
         
@@ -2163,12 +2752,17 @@ class BitchatClient:
             None,
             self.nickname
         )
-        print(f"\x1b[1A\r\033[K{display}")
+        if from_outbox:
+            print(f"\r\033[K{display}\n> ", end='', flush=True)
+        else:
+            print(f"\x1b[1A\r\033[K{display}")
     
     async def send_private_message(self, content: str, target_peer_id: str, target_nickname: str, message_id: Optional[str] = None):
         """Send a private encrypted message"""
-        if not self.client or not self.characteristic:
-            print("\033[93m⚠ Not connected to any peers yet.\033[0m")
+        if not self.links.connected:
+            # Held in the outbox; the handshake starts once a link is up
+            self.queue_private_message(target_peer_id, target_nickname, content, message_id or str(uuid.uuid4()))
+            print("\033[90m» Not connected yet, your message will be sent once a connection is established.\033[0m")
             return
 
         # Check if we have a Noise session with this peer
@@ -2176,42 +2770,19 @@ class BitchatClient:
             debug_println(f"[NOISE] No session with {target_peer_id}, need to establish handshake")
             
             # Queue message for sending after handshake completes
-            msg_id = message_id if message_id else str(uuid.uuid4())
-            if target_peer_id not in self.pending_private_messages:
-                self.pending_private_messages[target_peer_id] = []
-            self.pending_private_messages[target_peer_id].append((content, target_nickname, msg_id))
-            debug_println(f"[NOISE] Queued private message for {target_peer_id}, {len(self.pending_private_messages[target_peer_id])} messages pending")
+            self.queue_private_message(target_peer_id, target_nickname, content, message_id or str(uuid.uuid4()))
             
             # Always initiate handshake for private messages since user explicitly requested it
             debug_println(f"[NOISE] Initiating handshake with {target_peer_id} for private message")
             
             # Check if we've recently tried to handshake with this peer (matching Swift logic)
-            current_time = time.time()
-            if target_peer_id in self.handshake_attempt_times:
-                last_attempt = self.handshake_attempt_times[target_peer_id]
-                if current_time - last_attempt < self.handshake_timeout:
-                    debug_println(f"[NOISE] Skipping handshake with {target_peer_id} - too recent (last attempt {current_time - last_attempt:.1f}s ago)")
-                    print(f"\033[90m» Handshake already in progress with {target_nickname}, please wait...\033[0m")
-                    return
-            
-            # Record handshake attempt time
-            self.handshake_attempt_times[target_peer_id] = current_time
+            last_attempt = self.handshake_attempt_times.get(target_peer_id)
+            if last_attempt is not None and time.time() - last_attempt < self.handshake_timeout:
+                debug_println(f"[NOISE] Skipping handshake with {target_peer_id} - too recent (last attempt {time.time() - last_attempt:.1f}s ago)")
+                print(f"\033[90m» Handshake already in progress with {target_nickname}, please wait...\033[0m")
+                return
             
-            try:
-                handshake_message = self.encryption_service.initiate_handshake(target_peer_id)
-                handshake_packet = create_bitchat_packet_with_recipient(
-                    self.my_peer_id, target_peer_id, MessageType.NOISE_HANDSHAKE_INIT, handshake_message, None
-                )
-                # Set TTL to 3 like iOS
-                handshake_data = bytearray(handshake_packet)
-                handshake_data[2] = 3
-                handshake_packet = bytes(handshake_data)
-                await self.send_packet(handshake_packet)
-                debug_println(f"[NOISE] Sent handshake init to {target_peer_id}, payload size: {len(handshake_message)}")
-            except Exception as e:
-                debug_println(f"[NOISE] Failed to initiate handshake: {e}")
-                # Clear the attempt time on failure so we can retry sooner
-                self.handshake_attempt_times.pop(target_peer_id, None)
+            if not await self.request_handshake(target_peer_id):
                 print(f"\033[91m✗ Failed to initiate secure connection with {target_nickname}\033[0m")
                 return
             
@@ -2223,45 +2794,17 @@ class BitchatClient:
         
         # Create message payload - don't set is_encrypted=True since encryption happens at Noise layer
         payload, message_id = create_bitchat_message_payload_full(
-            self.nickname, content, None, True, self.my_peer_id, False, None
+            self.nickname, content, None, True, self.my_peer_id, False, None, message_id
         )
         
         debug_println(f"[PRIVATE] Created message payload: {len(payload)} bytes")
         debug_println(f"[PRIVATE] Message payload hex: {payload.hex()}")
         
         # Track for delivery
-        self.delivery_tracker.track_message(message_id, content, True)
-        
-        # Create INNER packet (BitchatPacket with MESSAGE type) that will be encrypted
-        # This matches Swift implementation: BitchatPacket(type: MessageType.message, ...)
-        inner_packet = create_bitchat_packet_with_recipient(
-            self.my_peer_id,
-            target_peer_id,
-            MessageType.MESSAGE,
-            payload,
-            None
-        )
-        
-        # Set TTL for inner packet (matching Swift's adaptiveTTL behavior)
-        inner_packet_data = bytearray(inner_packet)
-        inner_packet_data[2] = 7  # TTL for inner packet
-        inner_packet = bytes(inner_packet_data)
-        
-        debug_println(f"[PRIVATE] Created inner packet: {len(inner_packet)} bytes")
+        self.delivery_tracker.track_message(message_id, content, True, target_peer_id, target_nickname)
         
         try:
-            # Encrypt the ENTIRE inner packet using Noise (matching Swift)
-            encrypted = self.encryption_service.encrypt_for_peer(target_peer_id, inner_packet)
-            debug_println(f"[PRIVATE] Encrypted inner packet: {len(encrypted)} bytes")
-            
-            # Create outer Noise encrypted packet
-            packet = create_bitchat_packet_with_recipient(
-                self.my_peer_id,
-                target_peer_id,
-                MessageType.NOISE_ENCRYPTED,
-                encrypted,
-                None
-            )
+            packet = self.encode_private_message(payload, target_peer_id)
             
             # Send with better error handling for BLE issues
             try:
@@ -2326,90 +2869,194 @@ class BitchatClient:
             print(f"\033[91m✗ Failed to send encrypted message to {target_nickname}\033[0m")
             print(f"\033[90m» Error: {e}\033[0m")
     
+    def encode_private_message(self, payload: bytes, target_peer_id: str) -> bytes:
+        """Wrap a message payload in a Noise encrypted packet for a peer"""
+        # Create INNER packet (BitchatPacket with MESSAGE type) that will be encrypted
+        # This matches Swift implementation: BitchatPacket(type: MessageType.message, ...)
+        # TTL for inner packet matches Swift's adaptiveTTL behavior
+        inner_packet = self.encoder.encode(MessageType.MESSAGE, payload, target_peer_id, ttl=7)
+        
+        debug_println(f"[PRIVATE] Created inner packet: {len(inner_packet)} bytes")
+        
+        # Encrypt the ENTIRE inner packet using Noise (matching Swift)
+        encrypted = self.encryption_service.encrypt_for_peer(target_peer_id, inner_packet)
+        debug_println(f"[PRIVATE] Encrypted inner packet: {len(encrypted)} bytes")
+        
+        # Create outer Noise encrypted packet
+        return self.encoder.encode(MessageType.NOISE_ENCRYPTED, encrypted, target_peer_id)
+    
+    def encode_private_messages(self, payloads: List[bytes], target_peer_id: str) -> List[bytes]:
+        """Wrap several message payloads for one peer, encrypting them as a batch"""
+        inner_packets = [self.encoder.encode(MessageType.MESSAGE, payload, target_peer_id, ttl=7) for payload in payloads]
+        encrypted = self.encryption_service.encrypt_many_for_peer(target_peer_id, inner_packets)
+        return [self.encoder.encode(MessageType.NOISE_ENCRYPTED, data, target_peer_id) for data in encrypted]
+    
+    async def delivery_retry_loop(self):
+        """Resend private messages whose delivery ACK hasn't arrived"""
+        while self.running:
+            await asyncio.sleep(DELIVERY_CHECK_INTERVAL)
+            
+            for entry in self.delivery_tracker.pop_due():
+                if not entry.is_private:
+                    continue  # Public messages are never resent
+                
+                nickname = entry.recipient_nickname or entry.recipient_id
+                if entry.attempts >= DELIVERY_MAX_ATTEMPTS:
+                    print(f"\r\033[K\033[91m✗ Message to {nickname} not delivered after {entry.attempts} attempts\033[0m\n> ", end='', flush=True)
+                    continue
+                
+                # Attempts only count resends that actually go out
+                if not self.links.connected:
+                    self.delivery_tracker.postpone(entry)
+                    continue
+                if not self.encryption_service.is_session_established(entry.recipient_id):
+                    debug_println(f"[DELIVERY] No session with {nickname}, postponing resend")
+                    self.delivery_tracker.postpone(entry)
+                    continue
+                
+                self.delivery_tracker.reschedule(entry)
+                debug_println(f"[DELIVERY] Resending {entry.message_id} to {nickname} (attempt {entry.attempts}/{DELIVERY_MAX_ATTEMPTS})")
+                try:
+                    # Same message ID so the recipient can dedup, fresh Noise nonce
+                    payload, _ = create_bitchat_message_payload_full(
+                        self.nickname, entry.content, None, True, self.my_peer_id, False, None, entry.message_id
+                    )
+                    await self.send_packet(self.encode_private_message(payload, entry.recipient_id))
+                except Exception as e:
+                    debug_println(f"[DELIVERY] Resend to {nickname} failed: {e}")
+    
+    async def request_handshake(self, peer_id: str) -> bool:
+        """Send a Noise handshake init to a peer, recording the attempt time"""
+        self.handshake_attempt_times[peer_id] = time.time()
+        try:
+            handshake_message = await self.handshakes.initiate(peer_id)
+            handshake_packet = self.encoder.encode(MessageType.NOISE_HANDSHAKE_INIT, handshake_message, peer_id, ttl=3)
+            await self.send_packet(handshake_packet)
+            debug_println(f"[NOISE] Sent handshake init to {peer_id}, payload size: {len(handshake_message)}")
+            return True
+        except Exception as e:
+            debug_println(f"[NOISE] Failed to initiate handshake: {e}")
+            # Clear the attempt time on failure so we can retry sooner
+            self.handshake_attempt_times.pop(peer_id, None)
+            return False
+    
+    async def outbox_flush_loop(self):
+        """Drain the outbox through the normal send path whenever a link is up.
+        
+        Public messages go out in small batches, paced and only while the link
+        queues are short, so a long backlog doesn't crowd out live traffic.
+        Private messages wait for a session; peers we can hear are asked for a
+        handshake now and then.
+        """
+        while self.running:
+            await asyncio.sleep(OUTBOX_CHECK_INTERVAL)
+            if not self.outbox or not self.links.connected:
+                continue
+            
+            for entry in self.outbox.entries(private=False, limit=OUTBOX_BATCH):
+                if not self.links.connected:
+                    break
+                while self.links.pending() >= OUTBOX_MAX_QUEUED and self.links.connected:
+                    await asyncio.sleep(OUTBOX_PACE)
+                self.outbox.remove(entry.id)
+                try:
+                    await self.send_public_message(entry.content, entry.channel, entry.message_id, from_outbox=True)
+                except Exception as e:
+                    debug_println(f"[OUTBOX] Failed to send queued message {entry.message_id}: {e}")
+                await asyncio.sleep(OUTBOX_PACE)
+            
+            # Pending private messages whose entries expired are dropped with them
+            live = {entry.message_id for entry in self.outbox.entries(private=True)}
+            for peer_id in list(self.pending_private_messages):
+                messages = [message for message in self.pending_private_messages[peer_id] if message[2] in live]
+                if not messages:
+                    del self.pending_private_messages[peer_id]
+                    continue
+                self.pending_private_messages[peer_id] = messages
+                if self.encryption_service.is_session_established(peer_id):
+                    await self.send_pending_private_messages(peer_id)
+                elif peer_id in self.peers and peer_id not in self.encryption_service.handshake_states:
+                    last_attempt = self.handshake_attempt_times.get(peer_id, 0)
+                    if time.time() - last_attempt >= OUTBOX_HANDSHAKE_INTERVAL:
+                        await self.request_handshake(peer_id)
+    
+    async def session_maintenance_loop(self):
+        """Expire idle sessions and stalled handshakes, and rekey quiet sessions"""
+        while self.running:
+            await asyncio.sleep(SESSION_CHECK_INTERVAL)
+            
+            for peer_id in self.encryption_service.cleanup_old_sessions():
+                debug_println(f"[NOISE] Dropped idle session with {peer_id}")
+            
+            if not self.links.connected:
+                continue
+            for peer_id in self.encryption_service.sessions_due_for_rekey():
+                self.encryption_service.session_manager.start_rekey(peer_id)
+                try:
+                    # The current session keeps working until the new one replaces it
+                    handshake_message = await self.handshakes.initiate(peer_id, keep_session=True)
+                    handshake_packet = self.encoder.encode(MessageType.NOISE_HANDSHAKE_INIT, handshake_message, peer_id, ttl=3)
+                    await self.send_packet(handshake_packet)
+                    debug_println(f"[NOISE] Rekeying session with {peer_id}")
+                except Exception as e:
+                    debug_println(f"[NOISE] Failed to start rekey with {peer_id}: {e}")
+    
     async def background_scanner(self):
-        """Background task to scan for peers when not connected"""
-        last_cleanup = time.time()
+        """Background task that keeps links open to the best devices around.
         
+        The scanner runs continuously while there is room for another link and
+        wakes this task as soon as a new device is heard or a link drops, so
+        reconnecting doesn't wait for a scan round.
+        """
         while self.running:
-            # Clean up old sessions periodically (every 5 minutes)
-            current_time = time.time()
-            if current_time - last_cleanup > 300:  # 5 minutes
-                self.encryption_service.cleanup_old_sessions()
-                last_cleanup = current_time
-                debug_println(f"[CLEANUP] Cleaned up old encryption sessions")
-            
-            if not self.client or not self.client.is_connected:
-                # Try to find and connect to a peer
-                device = await self.find_device()
-                if device:
-                    print(f"\r\033[K\033[92m» Found a BitChat device! Connecting...\033[0m")
-                    try:
-                        self.client = BleakClient(device.address, disconnected_callback=self.handle_disconnect)
-                        await self.client.connect()
-                        
-                        # Find characteristic
-                        services = self.client.services
-                        for service in services:
-                            for char in service.characteristics:
-                                if char.uuid.lower() == BITCHAT_CHARACTERISTIC_UUID.lower():
-                                    self.characteristic = char
-                                    break
-                            if self.characteristic:
-                                break
-                        
-                        if self.characteristic:
-                            # Subscribe to notifications
-                            await self.client.start_notify(self.characteristic, self.notification_handler)
-                            print(f"\r\033[K\033[92m✓ Connected to BitChat network!\033[0m")
-                            
-                            # Clear any stale peers from previous connection
-                            self.peers.clear()
-                            
-                            # Send Noise identity announcement
-                            try:
-                                timestamp_ms = int(time.time() * 1000)
-                                public_key_bytes = self.encryption_service.get_public_key()
-                                signing_public_key_bytes = self.encryption_service.get_signing_public_key_bytes()
-                                
-                                # Create binding data for signature
-                                timestamp_data = str(timestamp_ms).encode('utf-8')
-                                binding_data = self.my_peer_id.encode('utf-8') + public_key_bytes + timestamp_data
-                                signature = self.encryption_service.sign_data(binding_data)
-                                
-                                # Encode to binary format
-                                identity_payload = self.encode_noise_identity_announcement_binary(
-                                    self.my_peer_id, public_key_bytes, signing_public_key_bytes,
-                                    self.nickname, timestamp_ms, signature
-                                )
-                                
-                                identity_packet = create_bitchat_packet_with_signature(
-                                    self.my_peer_id, MessageType.NOISE_IDENTITY_ANNOUNCE, identity_payload, signature
-                                )
-                                await self.send_packet(identity_packet)
-                            except Exception as e:
-                                debug_println(f"[SCANNER] Failed to send identity: {e}")
-                                # Fallback
-                                key_exchange_payload = self.encryption_service.get_combined_public_key_data()
-                                key_exchange_packet = create_bitchat_packet(
-                                    self.my_peer_id, MessageType.KEY_EXCHANGE, key_exchange_payload
-                                )
-                                await self.send_packet(key_exchange_packet)
-                            
-                            await asyncio.sleep(0.5)
-                            
-                            announce_packet = create_bitchat_packet(
-                                self.my_peer_id, MessageType.ANNOUNCE, self.nickname.encode()
-                            )
-                            await self.send_packet(announce_packet)
-                            
-                            print("> ", end='', flush=True)
-                    except Exception as e:
-                        debug_println(f"[SCANNER] Connection attempt failed: {e}")
-                        self.client = None
-                        self.characteristic = None
+            if self.links.full:
+                # Scanning competes with the open links for airtime
+                await self.scanner.stop()
+            else:
+                await self.scanner.start()
+                await self.connect_best()
+            
+            # Sleep until something changes or a backed-off device may be retried
+            wait = self.candidates.next_retry(exclude=self.links.links)
+            await self.scanner.wait(min(wait, SCANNER_RECHECK_INTERVAL) if wait else SCANNER_RECHECK_INTERVAL)
+    
+    def handle_bridge_link_up(self, link: BridgeLink):
+        """Announce ourselves to the mesh behind a new bridge link"""
+        print(f"\r\033[K\033[92m✓ Bridged to {link.address}\033[0m")
+        print("> ", end='', flush=True)
+        asyncio.create_task(self.announce_identity())
+    
+    async def announce_identity(self):
+        """Send our Noise identity and nickname announcements"""
+        try:
+            timestamp_ms = int(time.time() * 1000)
+            public_key_bytes = self.encryption_service.get_public_key()
+            signing_public_key_bytes = self.encryption_service.get_signing_public_key_bytes()
+            
+            # Create binding data for signature
+            timestamp_data = str(timestamp_ms).encode('utf-8')
+            binding_data = self.my_peer_id.encode('utf-8') + public_key_bytes + timestamp_data
+            signature = self.encryption_service.sign_data(binding_data)
+            
+            # Encode to binary format
+            identity_payload = self.encode_noise_identity_announcement_binary(
+                self.my_peer_id, public_key_bytes, signing_public_key_bytes,
+                self.nickname, timestamp_ms, signature
+            )
             
-            # Wait before next scan
-            await asyncio.sleep(5)  # Scan every 5 seconds when not connected
+            identity_packet = self.encoder.encode(MessageType.NOISE_IDENTITY_ANNOUNCE, identity_payload, signature=signature)
+            await self.send_packet(identity_packet)
+        except Exception as e:
+            debug_println(f"[SCANNER] Failed to send identity: {e}")
+            # Fallback
+            key_exchange_payload = self.encryption_service.get_combined_public_key_data()
+            key_exchange_packet = self.encoder.encode(MessageType.KEY_EXCHANGE, key_exchange_payload)
+            await self.send_packet(key_exchange_packet)
+        
+        await asyncio.sleep(0.5)
+        
+        announce_packet = self.encoder.encode(MessageType.ANNOUNCE, self.nickname.encode())
+        await self.send_packet(announce_packet)
     
     async def input_loop(self):
         """Handle user input asynchronously"""
@@ -2436,16 +3083,69 @@ class BitchatClient:
             DEBUG_LEVEL = DebugLevel.BASIC
             print("🐛 Debug mode: BASIC (connection info)")
         
+        # --trace [file]: record packets and dump them on exit
+        trace_file = None
+        if "--trace" in sys.argv:
+            index = sys.argv.index("--trace")
+            if index + 1 < len(sys.argv) and not sys.argv[index + 1].startswith("-"):
+                trace_file = sys.argv[index + 1]
+            else:
+                trace_file = DEFAULT_TRACE_FILE
+            self.trace.enabled = True
+            print(f"🔎 Packet tracing enabled (dump on exit: {trace_file})")
+        
+        # --resume-sessions: snapshot Noise sessions so a restart can skip the handshakes
+        if "--resume-sessions" in sys.argv:
+            self.resume_sessions = True
+        
+        # --compact-compression: dictionary/block payload formats, only for meshes of this client
+        if "--compact-compression" in sys.argv:
+            self.encoder = get_packet_encoder(self.my_peer_id, True)
+        
+        # --links N: how many BLE devices to stay connected to at once
+        if "--links" in sys.argv:
+            index = sys.argv.index("--links")
+            if index + 1 < len(sys.argv) and sys.argv[index + 1].isdigit():
+                self.links.max_links = max(1, int(sys.argv[index + 1]))
+        
+        # --bridge-listen [host:]port and --bridge-connect host:port (repeatable): IP bridge links
+        # --bridge-secret <secret>: only link with nodes started with the same secret
+        bridge_listen = None
+        bridge_peers = []
+        bridge_secret = None
+        for index, arg in enumerate(sys.argv[:-1]):
+            if arg == "--bridge-listen":
+                bridge_listen = parse_endpoint(sys.argv[index + 1])
+            elif arg == "--bridge-connect":
+                bridge_peers.append(parse_endpoint(sys.argv[index + 1]))
+            elif arg == "--bridge-secret":
+                bridge_secret = sys.argv[index + 1].encode()
+        
+        # Restore recently seen message IDs so a restart doesn't replay them
+        self.dedup = MessageDedup.load(get_dedup_file_path())
+        
         # Connect to BLE
-        connected = await self.connect()
+        await self.connect()
         
         # Perform handshake (will work even without connection)
         await self.handshake()
         
-        # Start background scanner if not connected
-        scanner_task = None
-        if not connected or not self.client:
-            scanner_task = asyncio.create_task(self.background_scanner())
+        if bridge_listen or bridge_peers:
+            self.bridge = Bridge(self.links, bridge_listen, bridge_peers,
+                                 on_link_up=self.handle_bridge_link_up, on_error=self.handle_send_error,
+                                 secret=bridge_secret)
+            await self.bridge.start()
+            if bridge_listen:
+                print(f"\033[90m» Bridge listening on {bridge_listen[0]}:{self.bridge.port}\033[0m")
+                if not bridge_secret and bridge_listen[0] not in ("127.0.0.1", "::1", "localhost"):
+                    print("\033[93m⚠ Bridge is reachable from the network without --bridge-secret\033[0m")
+        
+        delivery_task = asyncio.create_task(self.delivery_retry_loop())
+        session_task = asyncio.create_task(self.session_maintenance_loop())
+        outbox_task = asyncio.create_task(self.outbox_flush_loop())
+        
+        # Background scanner reconnects when offline and adds links up to the limit
+        self.background_scanner_task = asyncio.create_task(self.background_scanner())
         
         # Run input loop
         try:
@@ -2457,26 +3157,51 @@ class BitchatClient:
             self.running = False
             
             # Send leave notification if connected
-            if self.client and self.client.is_connected:
+            if self.links.connected:
                 try:
-                    leave_packet = create_bitchat_packet(
-                        self.my_peer_id, MessageType.LEAVE, self.nickname.encode()
-                    )
+                    for key in list(self.pending_acks):
+                        await self.flush_acks(key)
+                    leave_packet = self.encoder.encode(MessageType.LEAVE, self.nickname.encode())
                     await self.send_packet(leave_packet)
-                    await asyncio.sleep(0.1)  # Give time for the packet to send
+                    await self.links.flush(1.0)  # Give time for queued packets to go out
                 except:
                     pass  # Ignore errors during shutdown
             
+            delivery_task.cancel()
+            session_task.cancel()
+            outbox_task.cancel()
+            
             # Cancel background scanner
-            if scanner_task:
-                scanner_task.cancel()
+            if self.background_scanner_task:
+                self.background_scanner_task.cancel()
                 try:
-                    await scanner_task
+                    await self.background_scanner_task
                 except asyncio.CancelledError:
                     pass
             
-            if self.client and self.client.is_connected:
-                await self.client.disconnect()
+            await self.relay.stop()
+            await self.scanner.stop()
+            self.handshakes.shutdown()
+            self.channel_keys.shutdown()
+            if self.bridge:
+                await self.bridge.stop()
+            await self.links.close()
+            if self.resume_sessions:
+                self.save_session_snapshot(exact=True)  # Nothing more goes out
+            if self.outbox:
+                self.outbox.close()
+            
+            try:
+                self.dedup.save(get_dedup_file_path())
+            except OSError as e:
+                debug_println(f"[!] Failed to save dedup cache: {e}")
+            
+            if trace_file:
+                try:
+                    count = self.trace.dump(trace_file)
+                    print(f"» Wrote {count} traced packet(s) to {trace_file}")
+                except OSError as e:
+                    print(f"» Failed to write packet trace: {e}")
 
 # Helper functions
 
@@ -2511,250 +3236,69 @@ def unpad_packet(data: bytes) -> bytes:
     result = data[:-padding_length]
     return result
 
-def parse_bitchat_packet(data: bytes) -> BitchatPacket:
-    """Parse a BitChat packet from raw bytes"""
-    HEADER_SIZE = 13
-    SENDER_ID_SIZE = 8
-    RECIPIENT_ID_SIZE = 8
+def parse_bitchat_packet(data: Union[bytes, bytearray, memoryview]) -> BitchatPacket:
+    """Parse a BitChat packet from raw bytes
     
+    Only the fixed header is decoded here; everything else is read lazily
+    from ``data`` by the returned view, so the buffer must not be mutated
+    while the packet is in use.
+    """
     # Don't remove padding here - we need to parse the header first to know the actual packet size
     # The iOS client expects properly structured packets with padding intact during parsing
     
-    if len(data) < HEADER_SIZE + SENDER_ID_SIZE:
+    if len(data) < PACKET_HEADER.size + SENDER_ID_SIZE:
         raise ValueError("Packet too small")
     
-    offset = 0
-    
-    # Version
-    version = data[offset]
-    offset += 1
+    version, type_byte, ttl, timestamp, flags, payload_len = PACKET_HEADER.unpack_from(data)
     if version != 1:
         raise ValueError("Unsupported version")
     
-    # Type
-    msg_type = MessageType(data[offset])
-    offset += 1
-    
-    # TTL
-    ttl = data[offset]
-    offset += 1
-    
-    # Timestamp (skip)
-    offset += 8
-    
-    # Flags
-    flags = data[offset]
-    offset += 1
-    has_recipient = (flags & FLAG_HAS_RECIPIENT) != 0
-    has_signature = (flags & FLAG_HAS_SIGNATURE) != 0
-    is_compressed = (flags & FLAG_IS_COMPRESSED) != 0
-    
-    # Payload length
-    payload_len = struct.unpack('>H', data[offset:offset+2])[0]
-    offset += 2
-    
-    # Sender ID (trim null bytes)
-    sender_id_raw = data[offset:offset+SENDER_ID_SIZE]
-    # Remove trailing null bytes
-    sender_id = sender_id_raw.rstrip(b'\x00')
-    sender_id_str = sender_id.hex()
-    offset += SENDER_ID_SIZE
-    
-    # Recipient ID
-    recipient_id = None
-    recipient_id_str = None
-    if has_recipient:
-        recipient_id_raw = data[offset:offset+RECIPIENT_ID_SIZE]
-        # Remove trailing null bytes
-        recipient_id = recipient_id_raw.rstrip(b'\x00')
-        recipient_id_str = recipient_id.hex()
-        offset += RECIPIENT_ID_SIZE
-    
-    # Payload
-    payload_end = offset + payload_len
-    payload = data[offset:payload_end]
-    offset = payload_end
-
-    # Signature
-    signature = None
-    if has_signature:
-        if len(data) >= offset + SIGNATURE_SIZE:
-            signature = data[offset:offset+SIGNATURE_SIZE]
-        else:
-            debug_println(f"[WARN] Packet has signature flag but not enough data for signature.")
-    
-    # Decompress if needed
-    if is_compressed:
-        payload = decompress(payload)
+    msg_type = MESSAGE_TYPES.get(type_byte)
+    if msg_type is None:
+        raise ValueError(f"{type_byte} is not a valid MessageType")
     
-    # Ensure payload is bytes
-    if isinstance(payload, bytearray):
-        payload = bytes(payload)
-    
-    return BitchatPacket(
-        msg_type, sender_id, sender_id_str,
-        recipient_id, recipient_id_str, payload, ttl
-    )
-
-def parse_bitchat_message_payload(data: bytes) -> BitchatMessage:
-    """Parse message payload, matching Swift implementation"""
-    offset = 0
-
-    # 1. Flags
-    flags = data[offset]; offset += 1
-    is_private = (flags & MSG_FLAG_IS_PRIVATE) != 0
-    has_sender_peer_id = (flags & MSG_FLAG_HAS_SENDER_PEER_ID) != 0
-    has_channel = (flags & MSG_FLAG_HAS_CHANNEL) != 0
-    is_encrypted = (flags & MSG_FLAG_IS_ENCRYPTED) != 0
-
-    # 2. Timestamp
-    offset += 8 # Skip timestamp
-
-    # 3. ID
-    id_len = data[offset]; offset += 1
-    id_str = data[offset:offset+id_len].decode('utf-8'); offset += id_len
-
-    # 4. Sender
-    sender_len = data[offset]; offset += 1
-    sender = data[offset:offset+sender_len].decode('utf-8'); offset += sender_len
-
-    # 5. Content
-    content_len = struct.unpack('>H', data[offset:offset+2])[0]; offset += 2
-    content_bytes = data[offset:offset+content_len]; offset += content_len
-    content = ""
-    encrypted_content = None
-    if is_encrypted:
-        encrypted_content = content_bytes
-    else:
-        content = content_bytes.decode('utf-8', errors='ignore')
-
-    # 6. Sender Peer ID
-    if has_sender_peer_id:
-        peer_id_len = data[offset]; offset += 1
-        offset += peer_id_len # Skip peer id
+    return BitchatPacket(data, msg_type, ttl, timestamp, flags, payload_len)
 
-    # 7. Channel
-    channel = None
-    if has_channel:
-        channel_len = data[offset]; offset += 1
-        channel = data[offset:offset+channel_len].decode('utf-8')
+def parse_bitchat_message_payload(data: Union[bytes, bytearray, memoryview]) -> BitchatMessage:
+    """Parse message payload, matching Swift implementation
+    
+    Only the flags and message ID are read up front; see BitchatMessage.
+    """
+    return BitchatMessage(data)
 
-    return BitchatMessage(id_str, content, channel, is_encrypted, encrypted_content)
+@lru_cache(maxsize=8)
+def get_packet_encoder(sender_id: str, compact_compression: bool = False) -> PacketEncoder:
+    """Get the shared encoder for a sender ID"""
+    return PacketEncoder(sender_id, compact_compression)
 
 def create_bitchat_packet(sender_id: str, msg_type: MessageType, payload: bytes) -> bytes:
     """Create a BitChat packet"""
-    return create_bitchat_packet_with_recipient(sender_id, None, msg_type, payload, None)
+    return get_packet_encoder(sender_id).encode(msg_type, payload)
 
 def create_bitchat_packet_with_signature(sender_id: str, msg_type: MessageType, 
                                         payload: bytes, signature: Optional[bytes]) -> bytes:
     """Create a BitChat packet with signature"""
-    return create_bitchat_packet_with_recipient(sender_id, None, msg_type, payload, signature)
+    return get_packet_encoder(sender_id).encode(msg_type, payload, signature=signature)
 
 def create_bitchat_packet_with_recipient_and_signature(sender_id: str, recipient_id: str,
                                                       msg_type: MessageType, payload: bytes,
                                                       signature: Optional[bytes]) -> bytes:
     """Create a BitChat packet with recipient and signature"""
-    return create_bitchat_packet_with_recipient(sender_id, recipient_id, msg_type, payload, signature)
+    return get_packet_encoder(sender_id).encode(msg_type, payload, recipient_id, signature)
 
 def create_bitchat_packet_with_recipient(sender_id: str, recipient_id: Optional[str],
                                        msg_type: MessageType, payload: bytes,
-                                       signature: Optional[bytes]) -> bytes:
+                                       signature: Optional[bytes], ttl: int = DEFAULT_TTL) -> bytes:
     """Create a BitChat packet with all options"""
-    debug_full_println(f"[RAW SEND] Creating packet: type={msg_type.name}, payload_len={len(payload)}")
-    
-    # Create the packet first
-    packet = bytearray()
-    
-    # Version
-    packet.append(1)
-    
-    # Type
-    packet.append(msg_type.value)
-    
-    # TTL
-    packet.append(7)
-    
-    # Timestamp
-    timestamp_ms = int(time.time() * 1000)
-    packet.extend(struct.pack('>Q', timestamp_ms))
-    
-    # Flags
-    flags = 0
-    # Include recipient field if:
-    # 1. A specific recipient is provided (targeted message), OR  
-    # 2. This is a message type that uses broadcast recipient (not fragments)
-    exclude_recipient_types = [MessageType.FRAGMENT_START, MessageType.FRAGMENT_CONTINUE, MessageType.FRAGMENT_END]
-    if recipient_id is not None or msg_type not in exclude_recipient_types:
-        flags |= FLAG_HAS_RECIPIENT
-    if signature:
-        flags |= FLAG_HAS_SIGNATURE
-    packet.append(flags)
-    
-    # Payload length
-    packet.extend(struct.pack('>H', len(payload)))
-    
-    # Sender ID (exactly 8 bytes, padded with zeros if needed)
-    sender_bytes = bytes.fromhex(sender_id)
-    packet.extend(sender_bytes[:8])  # Take first 8 bytes
-    if len(sender_bytes) < 8:
-        packet.extend(bytes(8 - len(sender_bytes)))  # Pad with zeros
-    
-    # Recipient ID (exactly 8 bytes if present)
-    if flags & FLAG_HAS_RECIPIENT:
-        if recipient_id:
-            recipient_bytes = bytes.fromhex(recipient_id)
-            packet.extend(recipient_bytes[:8])  # Take first 8 bytes
-            if len(recipient_bytes) < 8:
-                packet.extend(bytes(8 - len(recipient_bytes)))  # Pad with zeros
-        else:
-            packet.extend(BROADCAST_RECIPIENT)
-    
-    # Payload
-    packet.extend(payload)
-    
-    # Signature
-    if signature:
-        packet.extend(signature)
-    
-    # Apply iOS-style padding to standard block sizes for traffic analysis resistance
-    # iOS pads ALL packets to 256 bytes for consistent BLE transmission
-    block_sizes = [256, 512, 1024, 2048]
-    # Account for encryption overhead (~16 bytes for AES-GCM tag)
-    total_size = len(packet) + 16
-    
-    # Find smallest block that fits
-    target_size = None
-    for block_size in block_sizes:
-        if total_size <= block_size:
-            target_size = block_size
-            break
-    
-    if target_size is None:
-        # For very large messages, just use the original size (will be fragmented anyway)
-        target_size = len(packet)
-    
-    padding_needed = target_size - len(packet)
-    
-    # PKCS#7 only supports padding up to 255 bytes
-    # If we need more padding than that, don't pad - return original data
-    if 0 < padding_needed <= 255:
-        # iOS-style PKCS#7 padding: random bytes + padding length as last byte
-        padding = bytearray(os.urandom(padding_needed - 1))
-        padding.append(padding_needed)
-        packet.extend(padding)
-
-    # Add hex logging to match iOS format
-    final_packet = bytes(packet)
-    hex_string = ' '.join(f'{b:02X}' for b in final_packet)
-    debug_full_println(f"[RAW SEND] {hex_string}")
-    
-    return final_packet
+    return get_packet_encoder(sender_id).encode(msg_type, payload, recipient_id, signature, ttl)
 
 def create_bitchat_message_payload_full(sender: str, content: str, channel: Optional[str],
-                                      is_private: bool, sender_peer_id: str, is_encrypted: bool, encrypted_content: Optional[bytes]) -> Tuple[bytes, str]:
+                                      is_private: bool, sender_peer_id: str, is_encrypted: bool, encrypted_content: Optional[bytes],
+                                      message_id: Optional[str] = None) -> Tuple[bytes, str]:
     """Create message payload with all fields, matching Swift implementation"""
     data = bytearray()
-    message_id = str(uuid.uuid4())
+    if message_id is None:
+        message_id = str(uuid.uuid4())
 
     # 1. Flags
     flags = 0
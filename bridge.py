@@ -0,0 +1,260 @@
+"""
+IP bridge transport for BitChat
+Carries raw BitChat packets between nodes over TCP, so separate BLE meshes
+(one per room or building) act as one. Each bridge connection becomes a link
+in the LinkManager: packets arriving on it go through the same parsing, dedup
+and relay path as BLE notifications, and outbound packets fan out to it like
+any other link. Frames are a 4-byte big-endian length followed by the packet.
+Each connection is paced outbound and rate limited inbound.
+
+The listener binds to localhost unless given a host. Nodes started with a
+shared secret prove they know it before a connection becomes a link: each
+end sends a random challenge and answers the other's with an HMAC-SHA256.
+"""
+
+import hmac
+import os
+import time
+import struct
+import asyncio
+import hashlib
+from typing import Callable, List, Optional, Set, Tuple
+
+from link_manager import LinkManager
+from send_scheduler import SendScheduler, LinkClosed
+
+DEFAULT_BRIDGE_PORT = 7433
+BRIDGE_MAGIC = b"BCBR\x01"  # Sent first by both ends
+BRIDGE_AUTH_MAGIC = b"BCBR\x02"  # Sent instead when a shared secret is set
+CHALLENGE_SIZE = 16
+GREETING_TIMEOUT = 10
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 1 << 17
+
+# Outbound pacing and inbound limit per connection, in packets per second
+BRIDGE_SEND_RATE = 500.0
+BRIDGE_RECEIVE_RATE = 500.0
+BRIDGE_RECEIVE_BURST = 200.0
+
+# Dialer backoff between reconnect attempts, in seconds
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+
+class BridgeProtocolError(Exception):
+    """The other end isn't a BitChat bridge or sent a malformed frame"""
+
+def parse_endpoint(text: str, default_host: str = "127.0.0.1") -> Tuple[str, int]:
+    """Parse ``host:port``, ``port`` or ``host`` into a (host, port) pair"""
+    host, _, port = text.rpartition(":")
+    if not host:
+        if text.isdigit():
+            return default_host, int(text)
+        return text, DEFAULT_BRIDGE_PORT
+    return host.strip("[]"), int(port)
+
+class BridgeLink:
+    """One TCP connection to a remote bridge node, usable as a LinkManager link"""
+    transport = "tcp"
+    mtu = None
+
+    def __init__(self, address: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 on_error: Optional[Callable[[bytes, Exception], None]] = None,
+                 receive_rate: float = BRIDGE_RECEIVE_RATE, receive_burst: float = BRIDGE_RECEIVE_BURST,
+                 clock: Callable[[], float] = time.monotonic):
+        self.address = address
+        self.client = None  # Not a BLE link
+        self.reader = reader
+        self.writer = writer
+        self.on_lost: Optional[Callable[['BridgeLink'], None]] = None  # Set by LinkManager.add
+        self.scheduler = SendScheduler(self.write, on_error=on_error,
+                                       rate=BRIDGE_SEND_RATE, max_rate=BRIDGE_SEND_RATE)
+        self.receive_rate = receive_rate
+        self.receive_burst = receive_burst
+        self.clock = clock
+        self._tokens = receive_burst
+        self._last_refill = clock()
+        self.connected_at = time.time()
+        self.received = 0
+        self.stats = {'frames_in': 0, 'frames_out': 0, 'rate_limited': 0}
+
+    @property
+    def is_connected(self) -> bool:
+        return not self.writer.is_closing()
+
+    async def write(self, packet: bytes):
+        """Write one frame, called only by the link's scheduler"""
+        if self.writer.is_closing():
+            self._closed()
+            raise LinkClosed(f"{self.address} is closed")
+        self.writer.write(FRAME_HEADER.pack(len(packet)) + packet)
+        try:
+            await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            self._closed()
+            raise LinkClosed(str(e))
+        self.stats['frames_out'] += 1
+
+    def _allow(self) -> bool:
+        now = self.clock()
+        self._tokens = min(self.receive_burst, self._tokens + (now - self._last_refill) * self.receive_rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def read_frames(self, deliver: Callable[['BridgeLink', bytes], 'asyncio.Future']):
+        """Read frames until the connection closes, passing each to ``deliver``"""
+        try:
+            while True:
+                header = await self.reader.readexactly(FRAME_HEADER.size)
+                (length,) = FRAME_HEADER.unpack(header)
+                if length > MAX_FRAME_SIZE:
+                    raise BridgeProtocolError(f"Frame of {length} bytes is too large")
+                data = await self.reader.readexactly(length)
+                self.stats['frames_in'] += 1
+                if not self._allow():
+                    self.stats['rate_limited'] += 1
+                    continue
+                await deliver(self, data)
+        except (BridgeProtocolError, asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            self.close()
+            self._closed()
+
+    def _closed(self):
+        if self.on_lost:
+            self.on_lost(self)
+
+    def close(self):
+        if not self.writer.is_closing():
+            self.writer.close()
+
+    async def disconnect(self):
+        self.close()
+
+class Bridge:
+    """TCP listener and dialers that add bridge connections to a LinkManager.
+
+    ``on_link_up`` is called with each new link once it is registered, for
+    example to announce ourselves to the far mesh. With a ``secret`` only
+    nodes started with the same secret are accepted or dialed.
+    """
+
+    def __init__(self, links: LinkManager, listen: Optional[Tuple[str, int]] = None,
+                 peers: Optional[List[Tuple[str, int]]] = None,
+                 on_link_up: Optional[Callable[[BridgeLink], None]] = None,
+                 on_error: Optional[Callable[[bytes, Exception], None]] = None,
+                 secret: Optional[bytes] = None):
+        self.links = links
+        self.secret = secret
+        self.listen = listen
+        self.peers = list(peers or ())
+        self.on_link_up = on_link_up
+        self.on_error = on_error
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._open: Set[BridgeLink] = set()
+        self.stats = {'accepted': 0, 'dialed': 0, 'rejected': 0}
+
+    @property
+    def port(self) -> Optional[int]:
+        """Port the listener is bound to, useful when listening on port 0"""
+        if self.server and self.server.sockets:
+            return self.server.sockets[0].getsockname()[1]
+        return None
+
+    async def start(self):
+        if self.listen:
+            self.server = await asyncio.start_server(self._accept, *self.listen)
+        for host, port in self.peers:
+            self._spawn(self._dial(host, port))
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _greet(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Exchange the greeting and, with a secret, prove both ends know it"""
+        magic = BRIDGE_AUTH_MAGIC if self.secret else BRIDGE_MAGIC
+        challenge = os.urandom(CHALLENGE_SIZE) if self.secret else b""
+        writer.write(magic + challenge)
+        await writer.drain()
+        received = await asyncio.wait_for(reader.readexactly(len(magic) + len(challenge)), timeout=GREETING_TIMEOUT)
+        if received[:len(magic)] != magic:
+            raise BridgeProtocolError("Not a BitChat bridge, or the shared secret isn't set on both ends")
+        if not self.secret:
+            return
+        peer_challenge = received[len(magic):]
+        if peer_challenge == challenge:
+            raise BridgeProtocolError("Challenge reflected")
+        # Each end signs its own challenge first, so one end's answer is never valid for the other
+        writer.write(hmac.new(self.secret, challenge + peer_challenge, hashlib.sha256).digest())
+        await writer.drain()
+        answer = await asyncio.wait_for(reader.readexactly(hashlib.sha256().digest_size), timeout=GREETING_TIMEOUT)
+        expected = hmac.new(self.secret, peer_challenge + challenge, hashlib.sha256).digest()
+        if not hmac.compare_digest(answer, expected):
+            raise BridgeProtocolError("Wrong bridge secret")
+
+    async def _serve(self, address: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        link = BridgeLink(address, reader, writer, on_error=self.on_error)
+        self.links.add(link)
+        self._open.add(link)
+        if self.on_link_up:
+            self.on_link_up(link)
+        try:
+            await link.read_frames(self.links.receive)
+        finally:
+            self._open.discard(link)
+
+    async def _accept(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        host, port = writer.get_extra_info('peername')[:2]
+        try:
+            await self._greet(reader, writer)
+        except (BridgeProtocolError, asyncio.IncompleteReadError, asyncio.TimeoutError, OSError):
+            self.stats['rejected'] += 1
+            writer.close()
+            return
+        self.stats['accepted'] += 1
+        await self._serve(f"{host}:{port}", reader, writer)
+
+    async def _dial(self, host: str, port: int):
+        """Keep a connection to a remote bridge open, reconnecting with backoff"""
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(RECONNECT_MAX_DELAY, delay * 2)
+                continue
+            try:
+                await self._greet(reader, writer)
+            except (BridgeProtocolError, asyncio.IncompleteReadError, asyncio.TimeoutError, OSError):
+                self.stats['rejected'] += 1
+                writer.close()
+                await asyncio.sleep(RECONNECT_MAX_DELAY)
+                continue
+            self.stats['dialed'] += 1
+            delay = RECONNECT_MIN_DELAY
+            await self._serve(f"{host}:{port}", reader, writer)
+            await asyncio.sleep(delay)
+
+    async def stop(self):
+        """Close the listener, stop dialing and let the LinkManager drop the links"""
+        if self.server:
+            self.server.close()
+        for link in list(self._open):
+            link.close()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.server:
+            await self.server.wait_closed()
+            self.server = None
+
+# Export classes and functions
+__all__ = ['Bridge', 'BridgeLink', 'BridgeProtocolError', 'parse_endpoint',
+           'DEFAULT_BRIDGE_PORT', 'MAX_FRAME_SIZE']
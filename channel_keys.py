@@ -0,0 +1,156 @@
+"""
+Channel key store for BitChat
+Holds the keys of password-protected channels. PBKDF2 derivations run in a
+process pool so several channels derive in parallel without blocking the
+event loop, and saved passwords are only derived the first time their channel
+is actually used. Derived keys are cached on disk, encrypted with the
+identity-derived key, so restarts skip PBKDF2 for passwords that haven't
+changed.
+"""
+
+import os
+import asyncio
+import hashlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional
+
+from encryption import EncryptionService
+from persistence import derive_encryption_key, load_channel_key_cache, save_channel_key_cache
+
+DERIVE_WORKERS = min(4, os.cpu_count() or 1)
+
+class ChannelKeyStore:
+    """Channel name -> key, deriving lazily and caching across restarts.
+
+    Supports the mapping operations the client needs. ``in`` is true for
+    channels whose key is derived or can be derived from a saved password;
+    ``get`` and indexing only return keys that are already derived, use
+    ``ensure`` to derive on demand.
+    """
+
+    def __init__(self, identity_key: Optional[List[int]] = None, persist: bool = True):
+        self.identity_key = identity_key
+        self.persist = persist
+        self._keys: Dict[str, bytes] = {}
+        self._passwords: Dict[str, str] = {}  # Saved but not derived yet
+        self._cache: Dict[str, Dict[str, str]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._executor: Optional[Executor] = None
+        self.stats = {'derived': 0, 'cache_hits': 0}
+
+    def load_cache(self, identity_key: Optional[List[int]]):
+        """Read the on-disk cache for this identity"""
+        self.identity_key = identity_key
+        if identity_key and self.persist:
+            self._cache = load_channel_key_cache(identity_key)
+
+    def _check(self, channel: str, password: str) -> str:
+        # Keyed hash of the password, so a changed password misses the cache
+        secret = derive_encryption_key(bytes(self.identity_key or ()))
+        salt = hashlib.sha256(channel.encode('utf-8')).digest()[:16]
+        return hashlib.blake2b(password.encode('utf-8'), key=secret, salt=salt, digest_size=16).hexdigest()
+
+    def _cached(self, channel: str, password: str) -> Optional[bytes]:
+        entry = self._cache.get(channel)
+        if entry and entry.get('check') == self._check(channel, password):
+            return bytes.fromhex(entry['key'])
+        return None
+
+    def add_password(self, channel: str, password: str) -> bool:
+        """Remember a saved password, returns True if its key came from the cache"""
+        key = self._cached(channel, password)
+        if key is not None:
+            self.stats['cache_hits'] += 1
+            self._keys[channel] = key
+            return True
+        self._passwords[channel] = password
+        return False
+
+    async def derive(self, channel: str, password: str) -> bytes:
+        """Key for a password, from the cache or the process pool; doesn't store it"""
+        key = self._cached(channel, password)
+        if key is not None:
+            self.stats['cache_hits'] += 1
+            return key
+
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(DERIVE_WORKERS)
+        try:
+            key = await loop.run_in_executor(self._executor, EncryptionService.derive_channel_key, password, channel)
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            # No usable process pool on this platform, threads at least keep the loop responsive
+            self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(DERIVE_WORKERS)
+            key = await loop.run_in_executor(self._executor, EncryptionService.derive_channel_key, password, channel)
+        self.stats['derived'] += 1
+        return key
+
+    def set(self, channel: str, key: bytes, password: Optional[str] = None):
+        """Store a channel key, caching it on disk when the password is known"""
+        self._keys[channel] = key
+        self._passwords.pop(channel, None)
+        if password is not None and self.identity_key and self.persist:
+            self._cache[channel] = {'check': self._check(channel, password), 'key': key.hex()}
+            self._save()
+
+    async def ensure(self, channel: str) -> Optional[bytes]:
+        """Channel key, deriving it from a saved password first if needed"""
+        key = self._keys.get(channel)
+        if key is not None or channel not in self._passwords:
+            return key
+
+        # Concurrent callers share one derivation
+        task = self._inflight.get(channel)
+        if task is None:
+            task = asyncio.ensure_future(self._derive_saved(channel, self._passwords[channel]))
+            self._inflight[channel] = task
+            task.add_done_callback(lambda _: self._inflight.pop(channel, None))
+        await asyncio.shield(task)
+        return self._keys.get(channel)
+
+    async def _derive_saved(self, channel: str, password: str):
+        key = await self.derive(channel, password)
+        # The channel may have been left or given a new password meanwhile
+        if self._passwords.get(channel) == password:
+            self.set(channel, key, password)
+
+    def pop(self, channel: str, default=None):
+        self._passwords.pop(channel, None)
+        if self._cache.pop(channel, None) is not None:
+            self._save()
+        return self._keys.pop(channel, default)
+
+    def get(self, channel: str, default=None):
+        return self._keys.get(channel, default)
+
+    def __getitem__(self, channel: str) -> bytes:
+        return self._keys[channel]
+
+    def __contains__(self, channel: str) -> bool:
+        return channel in self._keys or channel in self._passwords
+
+    def keys(self):
+        return self._keys.keys() | self._passwords.keys()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def _save(self):
+        try:
+            save_channel_key_cache(self._cache, self.identity_key)
+        except OSError:
+            pass  # The cache is only an optimisation
+
+    def shutdown(self):
+        """Stop the derivation workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Export classes and functions
+__all__ = ['ChannelKeyStore', 'DERIVE_WORKERS']
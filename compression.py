@@ -1,26 +1,177 @@
-from typing import Tuple
+import struct
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
+import lz4.block
 import lz4.frame
 
 COMPRESSION_THRESHOLD = 100
 
-def compress_if_beneficial(data: bytes) -> Tuple[bytes, bool]:
-    """Compress data if it reduces size"""
-    if len(data) < COMPRESSION_THRESHOLD:
-        return (data, False)
+# Payloads up to this size use a raw lz4 block with a 4-byte size prefix; the
+# ~15 byte lz4.frame header would eat most of the savings on short messages
+BLOCK_FORMAT_LIMIT = 4096
+
+# lz4.frame data always starts with this magic number, which a block's size
+# prefix can never match for payloads we accept
+LZ4_FRAME_MAGIC = b'\x04\x22\x4d\x18'
+
+# Dictionary-compressed payloads: magic, dictionary ID, original size, raw block.
+# A plain block's little-endian size prefix is at most BLOCK_FORMAT_LIMIT, so its
+# second byte can't be 0xd1.
+DICTIONARY_MAGIC = b'\xbc\xd1'
+DICTIONARY_HEADER = struct.Struct('>2sBH')
+DICTIONARY_THRESHOLD = 24  # With a shared dictionary even short messages shrink
+DICTIONARY_FILE_MAGIC = b"BCDICT1"
+DICTIONARY_DIR = Path(__file__).parent / "dictionaries"
+
+# Decompression never produces more than this unless the caller passes its own
+# cap. Frames are inflated DECOMPRESS_CHUNK bytes at a time and abandoned as
+# soon as they pass the cap; block and dictionary payloads declare their size
+# up front and are rejected before anything is allocated.
+MAX_DECOMPRESSED_SIZE = 65536
+DECOMPRESS_CHUNK = 4096
+
+decompression_stats = {'decompressed': 0, 'rejected_oversize': 0, 'rejected_corrupt': 0}
+
+class DecompressionLimitExceeded(ValueError):
+    """Compressed payload would expand past the allowed size"""
+
+# Built-in seed dictionary: common chat phrases and the fixed parts of a message
+# payload. Trained dictionaries get IDs above this one and are loaded from
+# DICTIONARY_DIR; only change DEFAULT_DICTIONARY_ID once peers ship the new one.
+SEED_DICTIONARY_ID = 1
+SEED_DICTIONARY = "|".join((
+    "my-python-client", "#general", "anyone here?", "is anyone around", "where are you",
+    "on my way", "see you soon", "see you there", "sounds good", "no worries", "thank you",
+    "thanks!", "what's up", "how are you", "I'm here", "are you there?", "let me know",
+    "hello everyone", "good morning", "good night", "right now", "meet at the ",
+    " of the ", " in the ", " to the ", " and the ", " for the ", " that ", " with ",
+    " this ", " have ", " just ", " what ", " when ", " will ", " about ", " there ",
+    " you ", " are ", " can ", " not ", " yes", " ok", " lol", "haha",
+)).encode()
+DEFAULT_DICTIONARY_ID = SEED_DICTIONARY_ID
+
+DICTIONARIES: Dict[int, bytes] = {SEED_DICTIONARY_ID: SEED_DICTIONARY}
+
+def register_dictionary(dictionary_id: int, dictionary: bytes):
+    """Make a dictionary available for compression and decompression"""
+    if not 0 < dictionary_id < 256:
+        raise ValueError("Dictionary IDs must fit in one byte and be non-zero")
+    DICTIONARIES[dictionary_id] = bytes(dictionary)
+
+def save_dictionary_file(path, dictionary_id: int, dictionary: bytes):
+    with open(path, 'wb') as f:
+        f.write(DICTIONARY_FILE_MAGIC + bytes((dictionary_id,)) + dictionary)
+
+def load_dictionary_file(path) -> Tuple[int, bytes]:
+    """Read a dictionary written by train_dictionary.py"""
+    data = Path(path).read_bytes()
+    if not data.startswith(DICTIONARY_FILE_MAGIC) or len(data) <= len(DICTIONARY_FILE_MAGIC) + 1:
+        raise ValueError(f"{path} is not a BitChat compression dictionary")
+    return data[len(DICTIONARY_FILE_MAGIC)], data[len(DICTIONARY_FILE_MAGIC) + 1:]
+
+def load_dictionaries(directory: Path = DICTIONARY_DIR):
+    """Register every dictionary shipped in a directory"""
+    if not directory.is_dir():
+        return
+    for path in sorted(directory.glob("*.dict")):
+        try:
+            register_dictionary(*load_dictionary_file(path))
+        except (OSError, ValueError):
+            pass
+
+def compress_with_dictionary(data: bytes, dictionary_id: int = DEFAULT_DICTIONARY_ID) -> bytes:
+    """Compress with a shared dictionary into the dictionary payload format"""
+    block = lz4.block.compress(data, store_size=False, dict=DICTIONARIES[dictionary_id])
+    return DICTIONARY_HEADER.pack(DICTIONARY_MAGIC, dictionary_id, len(data)) + block
+
+def decompress_with_dictionary(data: bytes, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """Decompress a payload produced by compress_with_dictionary"""
+    _, dictionary_id, size = DICTIONARY_HEADER.unpack_from(data)
+    if size > max_size:
+        raise DecompressionLimitExceeded(f"Payload declares {size} bytes, limit is {max_size}")
+    dictionary = DICTIONARIES.get(dictionary_id)
+    if dictionary is None:
+        raise ValueError(f"Unknown compression dictionary {dictionary_id}")
+    return lz4.block.decompress(data[DICTIONARY_HEADER.size:], uncompressed_size=size, dict=dictionary)
+
+def _decompress_frame(data: bytes, max_size: int) -> bytes:
+    decompressor = lz4.frame.LZ4FrameDecompressor()
+    output = bytearray()
+    pending = data
+    while True:
+        output += decompressor.decompress(pending, max_length=DECOMPRESS_CHUNK)
+        pending = b''
+        if len(output) > max_size:
+            raise DecompressionLimitExceeded(f"Frame expands past {max_size} bytes")
+        if decompressor.eof:
+            return bytes(output)
+        if decompressor.needs_input:
+            raise ValueError("Truncated lz4 frame")
+
+def _decompress_block(data: bytes, max_size: int) -> bytes:
+    size = int.from_bytes(data[:4], 'little')
+    if size > max_size:
+        raise DecompressionLimitExceeded(f"Block declares {size} bytes, limit is {max_size}")
+    return lz4.block.decompress(data)
+
+def compress_if_beneficial(data: bytes, compact: bool = False,
+                           dictionary_id: Optional[int] = DEFAULT_DICTIONARY_ID) -> Tuple[bytes, bool]:
+    """Compress data if it reduces size.
+    
+    By default only lz4.frame is produced, the format every BitChat client
+    decodes. With ``compact``, short payloads use the shared dictionary and
+    mid-sized ones a size-prefixed block; only this client decodes those.
+    """
+    if not compact:
+        if len(data) < COMPRESSION_THRESHOLD:
+            return (data, False)
+        compressed = lz4.frame.compress(data)
+        return (compressed, True) if len(compressed) < len(data) else (data, False)
     
-    compressed = lz4.frame.compress(data)
+    use_dictionary = dictionary_id in DICTIONARIES and len(data) <= BLOCK_FORMAT_LIMIT
+    if len(data) < (DICTIONARY_THRESHOLD if use_dictionary else COMPRESSION_THRESHOLD):
+        return (data, False)
+
+    if len(data) > BLOCK_FORMAT_LIMIT:
+        compressed = lz4.frame.compress(data)
+    else:
+        compressed = compress_with_dictionary(data, dictionary_id) if use_dictionary else data
+        if len(data) >= COMPRESSION_THRESHOLD:
+            block = lz4.block.compress(data, store_size=True)
+            if len(block) < len(compressed):
+                compressed = block
     if len(compressed) < len(data):
         return (compressed, True)
     else:
         return (data, False)
 
-def decompress(data: bytes) -> bytes:
-    """Decompress LZ4 data"""
+def decompress(data: bytes, max_size: int = MAX_DECOMPRESSED_SIZE) -> bytes:
+    """Decompress LZ4 data in frame, size-prefixed block or dictionary format.
+    
+    Raises DecompressionLimitExceeded if the output would be larger than
+    max_size, and ValueError for anything else that fails to decode.
+    """
     try:
-        return lz4.frame.decompress(data)
+        if data[:4] == LZ4_FRAME_MAGIC:
+            result = _decompress_frame(data, max_size)
+        elif data[:2] == DICTIONARY_MAGIC:
+            result = decompress_with_dictionary(data, max_size)
+        else:
+            result = _decompress_block(data, max_size)
+    except DecompressionLimitExceeded:
+        decompression_stats['rejected_oversize'] += 1
+        raise
     except Exception as e:
+        decompression_stats['rejected_corrupt'] += 1
         raise ValueError(f"Decompression failed: {e}")
+    decompression_stats['decompressed'] += 1
+    return result
+
+load_dictionaries()
 
 # Export functions
-__all__ = ['compress_if_beneficial', 'decompress', 'COMPRESSION_THRESHOLD']
\ No newline at end of file
+__all__ = ['compress_if_beneficial', 'decompress', 'compress_with_dictionary', 'decompress_with_dictionary',
+           'register_dictionary', 'load_dictionary_file', 'save_dictionary_file', 'load_dictionaries',
+           'DecompressionLimitExceeded', 'decompression_stats', 'COMPRESSION_THRESHOLD', 'BLOCK_FORMAT_LIMIT',
+           'DICTIONARY_THRESHOLD', 'DEFAULT_DICTIONARY_ID', 'MAX_DECOMPRESSED_SIZE']
@@ -0,0 +1,149 @@
+"""
+Message deduplication for BitChat
+Remembers recently seen message IDs in two rotating bloom filter generations,
+so memory stays constant however long the client runs. Each generation covers
+up to DEDUP_WINDOW seconds and is sized from the message rate observed in the
+one before it; an ID counts as seen if either generation has it.
+
+Saved format: MAGIC, then per generation (previous first)
+    created (float64) | capacity (uint32) | count (uint32) | bit array
+all big-endian. The bit array length follows from the capacity.
+"""
+
+import math
+import time
+import struct
+import hashlib
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+DEDUP_WINDOW = 600.0  # Seconds per generation, IDs are remembered for one to two windows
+DEDUP_FALSE_POSITIVE_RATE = 0.001
+INITIAL_CAPACITY = 1024
+MIN_CAPACITY = 256
+MAX_CAPACITY = 65536  # About 115 KB of bits per generation
+CAPACITY_HEADROOM = 1.5
+
+DEDUP_MAGIC = b"BCDEDUP1"
+GENERATION_HEADER = struct.Struct('>dII')
+
+def message_key(message_id: Union[bytes, memoryview]) -> bytes:
+    """Compact 16-byte key for a message ID of any length"""
+    return hashlib.blake2b(message_id, digest_size=16).digest()
+
+class BloomGeneration:
+    """Fixed-size bloom filter over 16-byte keys"""
+    __slots__ = ('created', 'capacity', 'count', 'num_bits', 'num_hashes', 'bits')
+
+    def __init__(self, created: float, capacity: int, count: int = 0, bits: Optional[bytearray] = None):
+        self.created = created
+        self.capacity = capacity
+        self.count = count
+        num_bits = math.ceil(-capacity * math.log(DEDUP_FALSE_POSITIVE_RATE) / math.log(2) ** 2)
+        self.num_bits = (num_bits + 7) // 8 * 8
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray(self.num_bits // 8)
+
+    def _positions(self, key: bytes):
+        # Keys are already uniform hashes, so double hashing on their halves is enough
+        h1 = int.from_bytes(key[:8], 'big')
+        h2 = int.from_bytes(key[8:], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: bytes):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class MessageDedup:
+    """Time-windowed, constant-memory set of seen message IDs"""
+
+    def __init__(self, window: float = DEDUP_WINDOW, clock: Callable[[], float] = time.time):
+        # Wall clock rather than monotonic so saved generations can be aged after a restart
+        self.window = window
+        self.clock = clock
+        self.current = BloomGeneration(clock(), INITIAL_CAPACITY)
+        self.previous: Optional[BloomGeneration] = None
+
+    def add(self, message_id: Union[bytes, memoryview]) -> bool:
+        """Record a message ID, returns False if it was already seen"""
+        key = message_key(message_id)
+        self._maybe_rotate()
+        if key in self.current or (self.previous is not None and key in self.previous):
+            return False
+        self.current.add(key)
+        return True
+
+    def __contains__(self, message_id: Union[bytes, memoryview]) -> bool:
+        key = message_key(message_id)
+        return key in self.current or (self.previous is not None and key in self.previous)
+
+    def _maybe_rotate(self):
+        now = self.clock()
+        current = self.current
+        elapsed = now - current.created
+        if elapsed < self.window and current.count < current.capacity:
+            return
+        # Size the next generation for the rate we just saw over a full window
+        rate = current.count / max(elapsed, 1.0)
+        capacity = int(rate * self.window * CAPACITY_HEADROOM)
+        capacity = min(MAX_CAPACITY, max(MIN_CAPACITY, capacity))
+        self.previous = current if elapsed < 2 * self.window else None
+        self.current = BloomGeneration(now, capacity)
+
+    def save(self, path: Union[str, Path]):
+        """Write both generations to disk"""
+        with open(path, 'wb') as f:
+            f.write(DEDUP_MAGIC)
+            for generation in (self.previous, self.current):
+                if generation is None:
+                    continue
+                f.write(GENERATION_HEADER.pack(generation.created, generation.capacity, generation.count))
+                f.write(generation.bits)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], window: float = DEDUP_WINDOW,
+             clock: Callable[[], float] = time.time) -> 'MessageDedup':
+        """Restore saved generations, dropping any older than two windows.
+
+        A missing or unreadable file gives an empty cache.
+        """
+        dedup = cls(window, clock)
+        try:
+            data = Path(path).read_bytes()
+        except OSError:
+            return dedup
+        if not data.startswith(DEDUP_MAGIC):
+            return dedup
+
+        generations = []
+        offset = len(DEDUP_MAGIC)
+        try:
+            while offset < len(data):
+                created, capacity, count = GENERATION_HEADER.unpack_from(data, offset)
+                offset += GENERATION_HEADER.size
+                if not 0 < capacity <= MAX_CAPACITY:
+                    return dedup
+                generation = BloomGeneration(created, capacity, count)
+                size = len(generation.bits)
+                if offset + size > len(data):
+                    return dedup
+                generation.bits = bytearray(data[offset:offset + size])
+                offset += size
+                generations.append(generation)
+        except struct.error:
+            return dedup
+
+        now = clock()
+        generations = [g for g in generations if now - g.created < 2 * window]
+        if generations:
+            dedup.current = generations[-1]
+            dedup.previous = generations[-2] if len(generations) > 1 else None
+        return dedup
+
+# Export classes and functions
+__all__ = ['MessageDedup', 'BloomGeneration', 'message_key', 'DEDUP_WINDOW']
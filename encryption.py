@@ -7,21 +7,53 @@ Compatible with Swift NoiseEncryptionService implementation.
 import os
 import time
 import json
+import struct
+import functools
 import secrets
-from dataclasses import dataclass
-from typing import Optional, Dict, Tuple, Callable
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Tuple, Callable
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.hmac import HMAC
 import hashlib
 
+from session_manager import SessionManager
+
 # Noise Protocol Constants
 NOISE_PROTOCOL_NAME = "Noise_XX_25519_ChaChaPoly_SHA256"
 NOISE_DH_LEN = 32  # Curve25519 key size
 NOISE_HASH_LEN = 32  # SHA256 hash size
 
+# Transport nonce: 4 zero bytes then the 64-bit counter, little-endian (matching Swift)
+NONCE_STRUCT = struct.Struct('<4xQ')
+
+def _loop_timed(method):
+    """Add the method's run time to EncryptionService.loop_crypto_seconds"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.loop_crypto_seconds += time.perf_counter() - start
+    return wrapper
+
+def _advances_nonces(method):
+    """Call EncryptionService.on_nonces_advanced once the method has used transport nonces"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            # Runs before an encrypted result reaches the caller, so a snapshot
+            # written here is never behind a nonce that went out on the air
+            if self.on_nonces_advanced:
+                self.on_nonces_advanced()
+    return wrapper
+
 class NoiseError(Exception):
     """Base class for Noise protocol errors"""
     pass
@@ -349,62 +381,88 @@ class NoiseHandshakeState:
 
 class NoiseCipherState:
     """Cipher state for Noise Protocol transport encryption"""
+    __slots__ = ('key', 'nonce', '_aead')
     
     def __init__(self):
         self.key = None
         self.nonce = 0
+        self._aead = None
     
     def initialize_key(self, key: bytes):
         """Initialize cipher with key"""
         self.key = key
         self.nonce = 0
+        # The AEAD object is keyed once here and reused for every message
+        self._aead = ChaCha20Poly1305(key)
     
     def has_key(self) -> bool:
         """Check if cipher has a key"""
         return self.key is not None
     
+    @classmethod
+    def restore(cls, key: bytes, nonce: int) -> 'NoiseCipherState':
+        """Rebuild a transport cipher from a snapshot"""
+        cipher = cls()
+        cipher.initialize_key(key)
+        cipher.nonce = nonce
+        return cipher
+    
     def encrypt(self, plaintext: bytes, associated_data: bytes = b'') -> bytes:
         """Encrypt plaintext with ChaCha20-Poly1305"""
-        if not self.has_key():
+        if self._aead is None:
             raise NoiseError("Cipher not initialized")
         
-        # Create nonce from counter (12 bytes, matching Swift)
-        # Swift puts counter at positions 4-12, zeros at 0-4
-        nonce = b'\x00\x00\x00\x00' + self.nonce.to_bytes(8, byteorder='little')
-        
-        cipher = ChaCha20Poly1305(self.key)
-        ciphertext = cipher.encrypt(nonce, plaintext, associated_data)
-        
+        ciphertext = self._aead.encrypt(NONCE_STRUCT.pack(self.nonce), plaintext, associated_data)
         self.nonce += 1
         return ciphertext
     
     def decrypt(self, ciphertext: bytes, associated_data: bytes = b'') -> bytes:
         """Decrypt ciphertext with ChaCha20-Poly1305"""
-        if not self.has_key():
+        if self._aead is None:
             raise NoiseError("Cipher not initialized")
         
-        #print(f"[NOISE] NoiseCipher.decrypt: nonce={self.nonce}, ciphertext_len={len(ciphertext)}, ad_len={len(associated_data)}")
-        #print(f"[NOISE] NoiseCipher.decrypt: ad_hex={associated_data.hex()[:32]}...")
+        nonce = NONCE_STRUCT.pack(self.nonce)
+        # Increment nonce even on failure to maintain sync (Noise protocol requirement)
+        self.nonce += 1
+        return self._aead.decrypt(nonce, ciphertext, associated_data)
+    
+    def encrypt_many(self, plaintexts: List[bytes], associated_data: bytes = b'') -> List[bytes]:
+        """Encrypt several messages in order, using consecutive nonces"""
+        if self._aead is None:
+            raise NoiseError("Cipher not initialized")
         
-        # Create nonce from counter (12 bytes, matching Swift)
-        # Swift puts counter at positions 4-12, zeros at 0-4
-        nonce = b'\x00\x00\x00\x00' + self.nonce.to_bytes(8, byteorder='little')
-        #print(f"[NOISE] NoiseCipher.decrypt: nonce_bytes={nonce.hex()}")
+        encrypt = self._aead.encrypt
+        pack = NONCE_STRUCT.pack
+        nonce = self.nonce
+        ciphertexts = []
+        for plaintext in plaintexts:
+            ciphertexts.append(encrypt(pack(nonce), plaintext, associated_data))
+            nonce += 1
+        self.nonce = nonce
+        return ciphertexts
+    
+    def decrypt_many(self, ciphertexts: List[bytes], associated_data: bytes = b'') -> List[Optional[bytes]]:
+        """Decrypt several messages in order, None where authentication failed.
+        
+        Every message consumes a nonce whether or not it decrypts, as with decrypt.
+        """
+        if self._aead is None:
+            raise NoiseError("Cipher not initialized")
         
-        cipher = ChaCha20Poly1305(self.key)
-        try:
-            plaintext = cipher.decrypt(nonce, ciphertext, associated_data)
-            self.nonce += 1
-            #print(f"[NOISE] NoiseCipher.decrypt: SUCCESS, plaintext_len={len(plaintext)}")
-            return plaintext
-        except Exception as e:
-            #print(f"[NOISE] NoiseCipher.decrypt: FAILED with {type(e).__name__}: {e}")
-            #print(f"[NOISE] NoiseCipher.decrypt: key={self.key.hex()[:32]}...")
-            # Increment nonce even on failure to maintain sync (Noise protocol requirement)
-            self.nonce += 1
-            raise
+        decrypt = self._aead.decrypt
+        pack = NONCE_STRUCT.pack
+        nonce = self.nonce
+        plaintexts = []
+        for ciphertext in ciphertexts:
+            try:
+                plaintexts.append(decrypt(pack(nonce), ciphertext, associated_data))
+            except InvalidTag:
+                plaintexts.append(None)
+            nonce += 1
+        self.nonce = nonce
+        return plaintexts
 
-@dataclass
+@dataclass(slots=True)
 class NoiseSession:
     """Represents an established Noise session with a peer"""
     peer_id: str
@@ -412,6 +470,17 @@ class NoiseSession:
     receive_cipher: NoiseCipherState
     remote_static_key: X25519PublicKey
     established_time: float
+    fingerprint: str = field(init=False)
+    last_used: float = field(init=False, default=0.0)
+    
+    def __post_init__(self):
+        self.last_used = self.established_time
+        # Hashed once here, the block check asks for it on every incoming packet
+        key_bytes = self.remote_static_key.public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        self.fingerprint = hashlib.sha256(key_bytes).hexdigest()
     
     def encrypt(self, plaintext: bytes) -> bytes:
         """Encrypt data for transport"""
@@ -421,13 +490,17 @@ class NoiseSession:
         """Decrypt received data"""
         return self.receive_cipher.decrypt(ciphertext)
     
+    def encrypt_many(self, plaintexts: List[bytes]) -> List[bytes]:
+        """Encrypt a batch of messages for transport"""
+        return self.send_cipher.encrypt_many(plaintexts)
+    
+    def decrypt_many(self, ciphertexts: List[bytes]) -> List[Optional[bytes]]:
+        """Decrypt a batch of received messages, None for any that fail"""
+        return self.receive_cipher.decrypt_many(ciphertexts)
+    
     def get_fingerprint(self) -> str:
         """Get peer's public key fingerprint"""
-        key_bytes = self.remote_static_key.public_bytes(
-            encoding=serialization.Encoding.Raw,
-            format=serialization.PublicFormat.Raw
-        )
-        return hashlib.sha256(key_bytes).hexdigest()
+        return self.fingerprint
 
 class EncryptionService:
     """
@@ -435,22 +508,30 @@ class EncryptionService:
     Compatible with Swift NoiseEncryptionService.
     """
     
-    def __init__(self, identity_path: Optional[str] = None):
+    def __init__(self, identity_path: Optional[str] = None, static_key: Optional[bytes] = None):
         # Load or create static identity key
-        self.static_identity_key = self._load_or_create_identity(identity_path)
-        
-        # Active Noise sessions
-        self.sessions: Dict[str, NoiseSession] = {}
+        if static_key is not None:
+            self.static_identity_key = X25519PrivateKey.from_private_bytes(static_key)
+        else:
+            self.static_identity_key = self._load_or_create_identity(identity_path)
         
-        # Handshake states in progress
-        self.handshake_states: Dict[str, NoiseHandshakeState] = {}
+        # Active Noise sessions and handshake states in progress, capped and
+        # expired by the session manager
+        self.session_manager = SessionManager()
+        self.sessions: Dict[str, NoiseSession] = self.session_manager.sessions
+        self.handshake_states: Dict[str, NoiseHandshakeState] = self.session_manager.handshake_states
         
         # Store our peer ID for tie-breaking (set from outside)
         self.my_peer_id: Optional[str] = None
         
+        # Time spent in transport and channel crypto. These run on the caller's
+        # thread (the event loop); handshakes go through HandshakeRunner instead.
+        self.loop_crypto_seconds = 0.0
+        
         # Callbacks
         self.on_peer_authenticated: Optional[Callable[[str, str], None]] = None
         self.on_handshake_required: Optional[Callable[[str], None]] = None
+        self.on_nonces_advanced: Optional[Callable[[], None]] = None
     
     def _load_or_create_identity(self, identity_path: Optional[str]) -> X25519PrivateKey:
         """Load existing identity or create new one"""
@@ -482,6 +563,11 @@ class EncryptionService:
         
         return key
     
+    def set_static_key(self, static_key: bytes):
+        """Switch to a persisted static identity, dropping sessions made with the old one"""
+        self.static_identity_key = X25519PrivateKey.from_private_bytes(static_key)
+        self.session_manager.clear()
+    
     def get_identity_fingerprint(self) -> str:
         """Get our identity fingerprint"""
         public_key = self.static_identity_key.public_key()
@@ -513,20 +599,20 @@ class EncryptionService:
         # In a full implementation, this would be a separate Ed25519 key
         return self.get_public_key_bytes()
     
-    def initiate_handshake(self, peer_id: str) -> bytes:
-        """Initiate Noise handshake with a peer"""
-        # Clean up any existing handshake state and session
-        if peer_id in self.handshake_states:
-            #print(f"[NOISE] Cleaning up existing handshake state for {peer_id}")
-            del self.handshake_states[peer_id]
+    def initiate_handshake(self, peer_id: str, keep_session: bool = False) -> bytes:
+        """Initiate Noise handshake with a peer.
         
-        if peer_id in self.sessions:
-            #print(f"[NOISE] Removing existing session for {peer_id}")
-            del self.sessions[peer_id]
+        With keep_session (a rekey), the current session stays usable until
+        the new one replaces it.
+        """
+        # Clean up any existing handshake state and session
+        self.session_manager.drop_handshake(peer_id)
+        if not keep_session:
+            self.session_manager.drop_session(peer_id)
         
         # Create new handshake state as initiator
         handshake = NoiseHandshakeState(NoiseRole.INITIATOR, self.static_identity_key)
-        self.handshake_states[peer_id] = handshake
+        self.session_manager.start_handshake(peer_id, handshake)
         #print(f"[NOISE] Initiating handshake with {peer_id}")
         
         # Write first message (-> e)
@@ -543,13 +629,11 @@ class EncryptionService:
             raise NoiseError(f"Handshake message too short: {len(message)} bytes")
         
         # Check if we have an ongoing handshake
-        if peer_id in self.handshake_states:
-            handshake = self.handshake_states[peer_id]
-            #print(f"[NOISE] Continuing handshake with {peer_id}, pattern {handshake.current_pattern}, role {handshake.role}")
-        else:
+        handshake = self.handshake_states.get(peer_id)
+        if handshake is None:
             # New handshake from peer - we are responder
             handshake = NoiseHandshakeState(NoiseRole.RESPONDER, self.static_identity_key)
-            self.handshake_states[peer_id] = handshake
+            self.session_manager.start_handshake(peer_id, handshake)
             #print(f"[NOISE] Starting new handshake with {peer_id} as responder")
         
         # Validate handshake state
@@ -584,10 +668,8 @@ class EncryptionService:
                         remote_static_key=remote_key,
                         established_time=time.time()
                     )
-                    self.sessions[peer_id] = session
-                    
-                    # Cleanup handshake state
-                    del self.handshake_states[peer_id]
+                    # Store the session and clean up the handshake state together
+                    self.session_manager.finish_handshake(peer_id, session)
                     #print(f"[NOISE] Handshake completed with {peer_id}")
                     
                     # Notify authentication
@@ -599,8 +681,7 @@ class EncryptionService:
             
         except Exception as e:
             # Handshake failed, cleanup
-            if peer_id in self.handshake_states:
-                del self.handshake_states[peer_id]
+            self.session_manager.drop_handshake(peer_id)
             #print(f"[NOISE] Handshake failed with {peer_id}: {type(e).__name__}: {e}")
             #print(f"[NOISE] Message length: {len(message)}, first 32 bytes: {message[:32].hex()}")
             import traceback
@@ -621,33 +702,62 @@ class EncryptionService:
         """Check if we have an established session with peer (alias for compatibility)"""
         return self.has_established_session(peer_id)
     
+    @_advances_nonces
+    @_loop_timed
     def encrypt(self, data: bytes, peer_id: str) -> bytes:
         """Encrypt data for a specific peer"""
-        if peer_id not in self.sessions:
+        session = self.sessions.get(peer_id)
+        if session is None:
             if self.on_handshake_required:
                 self.on_handshake_required(peer_id)
             raise NoiseError(f"No session with peer {peer_id}")
         
-        session = self.sessions[peer_id]
+        self.session_manager.touch(peer_id)
         return session.encrypt(data)
     
     def encrypt_for_peer(self, peer_id: str, data: bytes) -> bytes:
         """Encrypt data for a specific peer (reordered args for compatibility)"""
         return self.encrypt(data, peer_id)
     
+    @_advances_nonces
+    @_loop_timed
     def decrypt_from_peer(self, peer_id: str, data: bytes) -> bytes:
         """Decrypt data from a specific peer"""
-        if peer_id not in self.sessions:
+        session = self.sessions.get(peer_id)
+        if session is None:
             raise NoiseError(f"No session with peer {peer_id}")
         
-        session = self.sessions[peer_id]
+        self.session_manager.touch(peer_id)
         return session.decrypt(data)
     
+    @_advances_nonces
+    @_loop_timed
+    def encrypt_many_for_peer(self, peer_id: str, data: List[bytes]) -> List[bytes]:
+        """Encrypt several messages for a peer in one pass, in sending order"""
+        session = self.sessions.get(peer_id)
+        if session is None:
+            if self.on_handshake_required:
+                self.on_handshake_required(peer_id)
+            raise NoiseError(f"No session with peer {peer_id}")
+        
+        self.session_manager.touch(peer_id)
+        return session.encrypt_many(data)
+    
+    @_advances_nonces
+    @_loop_timed
+    def decrypt_many_from_peer(self, peer_id: str, data: List[bytes]) -> List[Optional[bytes]]:
+        """Decrypt several messages from a peer in receiving order, None for any that fail"""
+        session = self.sessions.get(peer_id)
+        if session is None:
+            raise NoiseError(f"No session with peer {peer_id}")
+        
+        self.session_manager.touch(peer_id)
+        return session.decrypt_many(data)
+    
     def get_peer_fingerprint(self, peer_id: str) -> Optional[str]:
         """Get fingerprint for a peer"""
-        if peer_id in self.sessions:
-            return self.sessions[peer_id].get_fingerprint()
-        return None
+        session = self.sessions.get(peer_id)
+        return session.fingerprint if session is not None else None
     
     def sign_data(self, data: bytes) -> bytes:
         """Sign data with our identity key (placeholder for EdDSA)"""
@@ -657,28 +767,60 @@ class EncryptionService:
     
     def remove_session(self, peer_id: str):
         """Remove session with a peer"""
-        if peer_id in self.sessions:
-            del self.sessions[peer_id]
-        if peer_id in self.handshake_states:
-            del self.handshake_states[peer_id]
+        self.session_manager.drop_session(peer_id)
+        self.session_manager.drop_handshake(peer_id)
     
     def clear_handshake_state(self, peer_id: str):
         """Clear handshake state for a peer (used when handshake fails)"""
-        if peer_id in self.handshake_states:
-            #print(f"[NOISE] Clearing failed handshake state for {peer_id}")
-            del self.handshake_states[peer_id]
-    
-    def cleanup_old_sessions(self, max_age: float = 3600):
-        """Remove sessions older than max_age seconds"""
+        self.session_manager.drop_handshake(peer_id)
+    
+    def cleanup_old_sessions(self) -> List[str]:
+        """Drop idle sessions and stalled handshakes, returns the peers whose session went"""
+        return self.session_manager.expire()
+    
+    def sessions_due_for_rekey(self) -> List[str]:
+        """Idle sessions that should be replaced by a fresh handshake"""
+        return self.session_manager.due_for_rekey()
+    
+    def export_sessions(self, send_nonce_reserve: int = 0) -> Dict[str, dict]:
+        """Transport keys and nonces of established sessions, for a snapshot.
+        
+        Send nonces are reported ``send_nonce_reserve`` ahead of the live ones.
+        """
+        return {
+            peer_id: {
+                'send_key': session.send_cipher.key.hex(),
+                'send_nonce': session.send_cipher.nonce + send_nonce_reserve,
+                'receive_key': session.receive_cipher.key.hex(),
+                'receive_nonce': session.receive_cipher.nonce,
+                'remote_static_key': session.remote_static_key.public_bytes(
+                    encoding=serialization.Encoding.Raw,
+                    format=serialization.PublicFormat.Raw
+                ).hex(),
+                'established_time': session.established_time,
+            }
+            for peer_id, session in self.session_manager.session_items()
+        }
+    
+    def import_sessions(self, sessions: Dict[str, dict], max_age: float = 3600) -> int:
+        """Restore sessions from export_sessions, skipping any older than max_age"""
         current_time = time.time()
-        expired_peers = []
-        
-        for peer_id, session in self.sessions.items():
-            if current_time - session.established_time > max_age:
-                expired_peers.append(peer_id)
-        
-        for peer_id in expired_peers:
-            del self.sessions[peer_id]
+        restored = 0
+        for peer_id, state in sessions.items():
+            try:
+                if current_time - state['established_time'] > max_age:
+                    continue
+                self.session_manager.add_session(peer_id, NoiseSession(
+                    peer_id=peer_id,
+                    send_cipher=NoiseCipherState.restore(bytes.fromhex(state['send_key']), state['send_nonce']),
+                    receive_cipher=NoiseCipherState.restore(bytes.fromhex(state['receive_key']), state['receive_nonce']),
+                    remote_static_key=X25519PublicKey.from_public_bytes(bytes.fromhex(state['remote_static_key'])),
+                    established_time=state['established_time']
+                ))
+                restored += 1
+            except (KeyError, TypeError, ValueError):
+                continue
+        return restored
     
     def get_session_count(self) -> int:
         """Get number of active sessions"""
@@ -686,9 +828,10 @@ class EncryptionService:
     
     def get_active_peers(self) -> list:
         """Get list of peers with active sessions"""
-        return list(self.sessions.keys())
+        return [peer_id for peer_id, _ in self.session_manager.session_items()]
     
     # Channel encryption methods (basic implementation)
+    @_loop_timed
     def encrypt_for_channel(self, message: str, channel: str, key: bytes, creator_fingerprint: str) -> bytes:
         """Encrypt message for channel"""
         cipher = ChaCha20Poly1305(key)
@@ -696,6 +839,7 @@ class EncryptionService:
         plaintext = message.encode('utf-8')
         return nonce + cipher.encrypt(nonce, plaintext, None)
     
+    @_loop_timed
     def decrypt_from_channel(self, data: bytes, channel: str, key: bytes, creator_fingerprint: str) -> str:
         """Decrypt message from channel"""
         if len(data) < 12:
@@ -708,6 +852,7 @@ class EncryptionService:
         plaintext = cipher.decrypt(nonce, ciphertext, None)
         return plaintext.decode('utf-8')
     
+    @_loop_timed
     def encrypt_with_key(self, data: bytes, key: bytes) -> bytes:
         """Encrypt data with a specific key"""
         cipher = ChaCha20Poly1305(key)
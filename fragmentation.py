@@ -1,16 +1,34 @@
 import os
+import time
+import struct
+from collections import OrderedDict
 from enum import IntEnum
 from dataclasses import dataclass
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 
 MAX_FRAGMENT_SIZE = 500
 
+# Fragment payload header: fragment ID, index, total, original message type
+FRAGMENT_HEADER = struct.Struct('>8sHHB')
+
+# Wire sizing. Fragment packets carry the 14 byte packet header and the sender ID
+# but no recipient, and the encoder pads packets iOS-style to these block sizes.
+PADDING_BLOCK_SIZES = (256, 512, 1024, 2048)
+FRAGMENT_PACKET_OVERHEAD = 14 + 8 + FRAGMENT_HEADER.size
+ATT_WRITE_OVERHEAD = 3  # ATT opcode + handle
+ATT_DEFAULT_MTU = 23    # Reported before an MTU exchange, writes are split anyway
+# The encoder only pads into a block with this much room to spare, and never by
+# more than 255 bytes. Unpadded packets end in payload, which a receiver doing
+# PKCS#7 unpadding would strip, so every fragment has to be padded.
+PADDING_HEADROOM = 16
+MAX_PADDING = 255
+
 class FragmentType(IntEnum):
     START = 0x05
     CONTINUE = 0x06
     END = 0x07
 
-@dataclass
+@dataclass(slots=True)
 class Fragment:
     fragment_id: bytes
     fragment_type: FragmentType
@@ -18,14 +36,54 @@ class Fragment:
     total: int
     original_type: int
     data: bytes
+    
+    def to_payload(self) -> bytes:
+        """Encode as a fragment packet payload"""
+        return FRAGMENT_HEADER.pack(self.fragment_id, self.index, self.total, self.original_type) + self.data
+
+def is_padded(length: int) -> bool:
+    """Whether the encoder pads a packet of this unpadded length"""
+    for block_size in PADDING_BLOCK_SIZES:
+        if length + PADDING_HEADROOM <= block_size:
+            return block_size - length <= MAX_PADDING
+    return False
+
+def fragment_block_size(mtu: Optional[int]) -> int:
+    """Largest padding block that fits in a single ATT write at this MTU.
+    
+    Every packet is padded to at least 256 bytes, so that is the floor even
+    when the MTU is smaller and a fragment can't go out in one write.
+    """
+    block_size = PADDING_BLOCK_SIZES[0]
+    if mtu:
+        max_write = mtu - ATT_WRITE_OVERHEAD
+        for size in PADDING_BLOCK_SIZES:
+            if size <= max_write:
+                block_size = size
+    return block_size
+
+def fragment_chunk_size(mtu: Optional[int]) -> int:
+    """Largest chunk whose fragment packet is still padded within one block.
+    
+    The chunk is also capped so the unpadded fragment fits one ATT write once
+    an MTU has been negotiated.
+    """
+    chunk_size = fragment_block_size(mtu) - PADDING_HEADROOM - FRAGMENT_PACKET_OVERHEAD
+    if mtu and mtu > ATT_DEFAULT_MTU:
+        chunk_size = min(chunk_size, mtu - ATT_WRITE_OVERHEAD - FRAGMENT_PACKET_OVERHEAD)
+    return max(1, chunk_size)
 
-def fragment_payload(payload: bytes, original_msg_type: int) -> List[Fragment]:
+def fragment_payload(payload: bytes, original_msg_type: int, chunk_size: int = MAX_FRAGMENT_SIZE) -> List[Fragment]:
     """Fragment a large payload"""
-    if len(payload) <= MAX_FRAGMENT_SIZE:
+    if len(payload) <= chunk_size:
         return []
     
+    # Shrink the chunk until the last, shorter fragment is padded as well
+    while chunk_size > 1 and not is_padded(FRAGMENT_PACKET_OVERHEAD + (len(payload) - 1) % chunk_size + 1):
+        chunk_size -= 1
+    
     fragment_id = os.urandom(8)
-    chunks = [payload[i:i+MAX_FRAGMENT_SIZE] for i in range(0, len(payload), MAX_FRAGMENT_SIZE)]
+    chunks = [payload[i:i+chunk_size] for i in range(0, len(payload), chunk_size)]
     total = len(chunks)
     
     fragments = []
@@ -48,5 +106,184 @@ def fragment_payload(payload: bytes, original_msg_type: int) -> List[Fragment]:
     
     return fragments
 
+# Reassembly limits
+FRAGMENT_TIMEOUT = 30.0  # Seconds an incomplete set may sit idle before it is dropped
+MAX_FRAGMENT_BYTES_PER_SENDER = 256 * 1024
+MAX_FRAGMENT_BYTES_TOTAL = 1024 * 1024
+MAX_PARTIAL_PACKETS = 256  # Incomplete sets kept at once, however small
+
+class _PartialPacket:
+    """Reassembly state for one fragment set"""
+    __slots__ = ('sender_id', 'total', 'original_type', 'chunk_size', 'buffer',
+                 'received', 'count', 'last_len', 'pending_last', 'size', 'last_seen')
+    
+    def __init__(self, sender_id: str, total: int, original_type: int, now: float):
+        self.sender_id = sender_id
+        self.total = total
+        self.original_type = original_type
+        self.chunk_size = 0
+        self.buffer: Optional[bytearray] = None
+        self.received = bytearray(total)
+        self.count = 0
+        self.last_len = 0
+        self.pending_last: Optional[bytes] = None
+        self.size = 0
+        self.last_seen = now
+
+class FragmentCollector:
+    """Reassembles fragmented packets with bounded memory.
+    
+    Every fragment except the last has the same size, so the output buffer is
+    preallocated as ``total * chunk_size`` once the first non-final fragment is
+    seen and each chunk is written straight to its offset. Incomplete sets
+    expire after ``timeout`` seconds. The number of sets and per-sender and
+    global byte caps (counting the received bitmap as well as the buffer) are
+    enforced by evicting the least recently updated sets.
+    """
+    
+    def __init__(self, timeout: float = FRAGMENT_TIMEOUT,
+                 max_bytes_per_sender: int = MAX_FRAGMENT_BYTES_PER_SENDER,
+                 max_bytes_total: int = MAX_FRAGMENT_BYTES_TOTAL,
+                 max_partials: int = MAX_PARTIAL_PACKETS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.timeout = timeout
+        self.max_bytes_per_sender = max_bytes_per_sender
+        self.max_bytes_total = max_bytes_total
+        self.max_partials = max_partials
+        self.clock = clock
+        # (sender_id, fragment_id) -> state, least recently updated first
+        self.partials: 'OrderedDict[Tuple[str, bytes], _PartialPacket]' = OrderedDict()
+        self.bytes_by_sender: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.stats = {'completed': 0, 'expired': 0, 'evicted': 0, 'rejected': 0}
+    
+    def add_fragment(self, fragment_id: bytes, index: int, total: int,
+                     original_type: int, data: bytes, sender_id: str) -> Optional[Tuple[bytes, str]]:
+        """Add a fragment, returning (reassembled data, sender) once the set is complete"""
+        now = self.clock()
+        self.expire(now)
+        
+        is_last = index == total - 1
+        if total == 0 or index >= total or (not data and not is_last):
+            self.stats['rejected'] += 1
+            return None
+        
+        key = (sender_id, bytes(fragment_id))
+        partial = self.partials.get(key)
+        if partial is None:
+            while len(self.partials) >= self.max_partials:
+                self._drop(next(iter(self.partials)), 'evicted')
+            partial = _PartialPacket(sender_id, total, original_type, now)
+            self.partials[key] = partial
+            if not self._account(key, partial, total):  # The received bitmap
+                return None
+        elif partial.total != total or partial.original_type != original_type:
+            # A set can't change shape midway, drop it rather than guess
+            self._drop(key, 'rejected')
+            return None
+        else:
+            self.partials.move_to_end(key)
+            partial.last_seen = now
+        
+        if partial.received[index]:
+            return None  # Duplicate fragment
+        
+        if is_last:
+            if partial.chunk_size and len(data) > partial.chunk_size:
+                self._drop(key, 'rejected')
+                return None
+            partial.last_len = len(data)
+        elif not partial.chunk_size:
+            if not self._allocate(key, partial, len(data)):
+                return None
+        elif len(data) != partial.chunk_size:
+            self._drop(key, 'rejected')
+            return None
+        
+        if partial.buffer is not None:
+            offset = index * partial.chunk_size
+            partial.buffer[offset:offset + len(data)] = data
+        elif is_last:
+            # Chunk size is unknown until a non-final fragment arrives
+            partial.pending_last = bytes(data)
+            if not self._account(key, partial, len(data)):
+                return None
+        
+        partial.received[index] = 1
+        partial.count += 1
+        
+        if partial.count < total:
+            return None
+        
+        if partial.buffer is not None:
+            length = partial.chunk_size * (total - 1) + partial.last_len
+            complete_data = bytes(memoryview(partial.buffer)[:length])
+        else:
+            complete_data = partial.pending_last  # Single-fragment set
+        self._drop(key, 'completed')
+        return (complete_data, sender_id)
+    
+    def expire(self, now: Optional[float] = None):
+        """Drop incomplete sets that have been idle longer than the timeout"""
+        if now is None:
+            now = self.clock()
+        deadline = now - self.timeout
+        while self.partials:
+            key, partial = next(iter(self.partials.items()))
+            if partial.last_seen > deadline:
+                break
+            self._drop(key, 'expired')
+    
+    def _allocate(self, key: Tuple[str, bytes], partial: _PartialPacket, chunk_size: int) -> bool:
+        """Preallocate the output buffer once the chunk size is known"""
+        if partial.last_len > chunk_size:
+            self._drop(key, 'rejected')
+            return False
+        partial.chunk_size = chunk_size
+        pending = partial.last_len if partial.pending_last is not None else 0
+        if not self._account(key, partial, chunk_size * partial.total - pending):
+            return False
+        partial.buffer = bytearray(chunk_size * partial.total)
+        if partial.pending_last is not None:
+            offset = (partial.total - 1) * chunk_size
+            partial.buffer[offset:offset + partial.last_len] = partial.pending_last
+            partial.pending_last = None
+        return True
+    
+    def _account(self, key: Tuple[str, bytes], partial: _PartialPacket, size: int) -> bool:
+        """Reserve memory for a set, evicting older sets to stay under the caps"""
+        sender_id = partial.sender_id
+        if partial.size + size > self.max_bytes_per_sender or partial.size + size > self.max_bytes_total:
+            self._drop(key, 'rejected')
+            return False
+        
+        for evict_key in list(self.partials):
+            sender_bytes = self.bytes_by_sender.get(sender_id, 0)
+            if sender_bytes + size <= self.max_bytes_per_sender and self.total_bytes + size <= self.max_bytes_total:
+                break
+            if evict_key == key:
+                continue
+            if sender_bytes + size > self.max_bytes_per_sender and evict_key[0] != sender_id:
+                continue
+            self._drop(evict_key, 'evicted')
+        
+        partial.size += size
+        self.bytes_by_sender[sender_id] = self.bytes_by_sender.get(sender_id, 0) + size
+        self.total_bytes += size
+        return True
+    
+    def _drop(self, key: Tuple[str, bytes], reason: str):
+        partial = self.partials.pop(key)
+        self.stats[reason] += 1
+        if partial.size:
+            self.total_bytes -= partial.size
+            remaining = self.bytes_by_sender[partial.sender_id] - partial.size
+            if remaining:
+                self.bytes_by_sender[partial.sender_id] = remaining
+            else:
+                del self.bytes_by_sender[partial.sender_id]
+
 # Export classes and functions
-__all__ = ['Fragment', 'FragmentType', 'fragment_payload', 'MAX_FRAGMENT_SIZE']
\ No newline at end of file
+__all__ = ['Fragment', 'FragmentType', 'fragment_payload', 'fragment_block_size', 'fragment_chunk_size', 'is_padded',
+           'FragmentCollector', 'FRAGMENT_HEADER', 'MAX_FRAGMENT_SIZE', 'FRAGMENT_TIMEOUT', 'MAX_PARTIAL_PACKETS',
+           'PADDING_BLOCK_SIZES', 'FRAGMENT_PACKET_OVERHEAD']
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+Noise handshake runner for BitChat
+Runs handshake steps (X25519 key generation, DH and HKDF) on a small thread
+pool so a burst of peers answering at once doesn't stall BLE notifications.
+At most MAX_CONCURRENT_HANDSHAKES steps run at a time, and steps for the same
+peer always run one after another in the order they were submitted.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from encryption import EncryptionService
+
+MAX_CONCURRENT_HANDSHAKES = 4
+
+T = TypeVar('T')
+
+class _PeerQueue:
+    """Per-peer lock plus the number of steps holding or waiting for it"""
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class HandshakeRunner:
+    """Async front end to an EncryptionService's handshake methods"""
+
+    def __init__(self, service: EncryptionService, max_concurrent: int = MAX_CONCURRENT_HANDSHAKES):
+        self.service = service
+        self.max_concurrent = max_concurrent
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._budget: Optional[asyncio.Semaphore] = None
+        self._peers: Dict[str, _PeerQueue] = {}
+        self._running = 0
+        self.stats = {'steps': 0, 'failed': 0, 'queued': 0, 'peak_concurrent': 0, 'worker_seconds': 0.0}
+
+    async def initiate(self, peer_id: str, keep_session: bool = False) -> bytes:
+        """Start a handshake as initiator, returns the first message"""
+        return await self._run(peer_id, self.service.initiate_handshake, peer_id, keep_session)
+
+    async def process(self, peer_id: str, message: bytes) -> Optional[bytes]:
+        """Process a handshake message, returns the response to send if any"""
+        return await self._run(peer_id, self.service.process_handshake_message, peer_id, message)
+
+    async def _run(self, peer_id: str, step: Callable[..., T], *args) -> T:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_concurrent, thread_name_prefix="noise-handshake")
+            self._budget = asyncio.Semaphore(self.max_concurrent)
+
+        queue = self._peers.get(peer_id)
+        if queue is None:
+            queue = self._peers[peer_id] = _PeerQueue()
+        queue.users += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, which keeps each peer's steps in order
+            async with queue.lock:
+                if self._budget.locked():
+                    self.stats['queued'] += 1
+                async with self._budget:
+                    self._running += 1
+                    self.stats['peak_concurrent'] = max(self.stats['peak_concurrent'], self._running)
+                    try:
+                        return await asyncio.get_running_loop().run_in_executor(
+                            self._executor, self._timed, step, args
+                        )
+                    except Exception:
+                        self.stats['failed'] += 1
+                        raise
+                    finally:
+                        self._running -= 1
+                        self.stats['steps'] += 1
+        finally:
+            queue.users -= 1
+            if not queue.users:
+                del self._peers[peer_id]
+
+    def _timed(self, step: Callable[..., T], args) -> T:
+        # Runs on a worker thread; float += is atomic enough under the GIL for a metric
+        start = time.perf_counter()
+        try:
+            return step(*args)
+        finally:
+            self.stats['worker_seconds'] += time.perf_counter() - start
+
+    def shutdown(self):
+        """Stop the worker threads, steps already running are allowed to finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Export classes and functions
+__all__ = ['HandshakeRunner', 'MAX_CONCURRENT_HANDSHAKES']
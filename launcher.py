@@ -15,8 +15,7 @@ def check_requirements():
         'flask',
         'flask_socketio',
         'bleak',
-        'aioconsole',
-        'pybloom_live'
+        'aioconsole'
     ]
     
     missing = []
@@ -0,0 +1,333 @@
+"""
+BLE link manager for BitChat
+Keeps GATT connections to up to MAX_LINKS BitChat devices at once, so this
+node can bridge several groups of phones instead of hanging off a single one.
+Every link has its own notification subscription and its own paced send
+queue. Outbound packets go out on every link except the one they arrived on,
+and losing one link leaves the others, and all peer state, untouched.
+The characteristic handle and MTU of each device are cached across restarts,
+so a reconnect can skip walking the GATT table.
+"""
+
+import time
+import asyncio
+from functools import partial
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from bleak import BleakClient
+from bleak.backends.characteristic import BleakGATTCharacteristic
+
+from send_scheduler import SendScheduler, Lane, WriteBlocked, LinkClosed
+from persistence import load_device_profiles, save_device_profiles
+
+MAX_LINKS = 4
+
+ATT_DEFAULT_MTU = 23  # What backends report when the real MTU hasn't been negotiated or read
+PROFILE_MAX_AGE = 7 * 24 * 3600.0  # Seconds before a cached device profile is no longer trusted
+PROFILE_REFRESH = 24 * 3600.0      # Rewrite unchanged profiles this often so they don't age out
+
+class DeviceProfileCache:
+    """Device address -> BitChat characteristic handle and MTU, kept across restarts"""
+
+    def __init__(self, persist: bool = True, max_age: float = PROFILE_MAX_AGE,
+                 clock: Callable[[], float] = time.time):
+        self.persist = persist
+        self.max_age = max_age
+        self.clock = clock
+        self._profiles: Optional[Dict[str, Dict[str, float]]] = None
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0}
+
+    @property
+    def profiles(self) -> Dict[str, Dict[str, float]]:
+        # Loaded on first use so a cache nobody connects with never touches the disk
+        if self._profiles is None:
+            self._profiles = load_device_profiles() if self.persist else {}
+        return self._profiles
+
+    def get(self, address: str) -> Optional[Dict[str, float]]:
+        """Profile of a device if it is recent enough to trust"""
+        profile = self.profiles.get(address)
+        if profile and self.clock() - profile.get('updated', 0) <= self.max_age:
+            return profile
+        return None
+
+    def update(self, address: str, handle: int, mtu: Optional[int]):
+        now = self.clock()
+        old = self.profiles.get(address)
+        if mtu is None or mtu <= ATT_DEFAULT_MTU:
+            mtu = old.get('mtu') if old else None
+        self.profiles[address] = {'handle': handle, 'mtu': mtu, 'updated': now}
+        if (not old or old.get('handle') != handle or old.get('mtu') != mtu
+                or now - old.get('updated', 0) > PROFILE_REFRESH):
+            self._save()
+
+    def forget(self, address: str):
+        if self.profiles.pop(address, None) is not None:
+            self._save()
+
+    def _save(self):
+        if not self.persist:
+            return
+        try:
+            save_device_profiles(self.profiles)
+        except OSError:
+            pass  # The cache is only an optimisation
+
+class Link:
+    """One GATT connection and its send queue"""
+    transport = "ble"
+
+    def __init__(self, address: str, client: BleakClient, characteristic: BleakGATTCharacteristic,
+                 on_lost: Callable[['Link'], None],
+                 on_error: Optional[Callable[[bytes, Exception], None]] = None,
+                 cached_mtu: Optional[int] = None):
+        self.address = address
+        self.cached_mtu = cached_mtu
+        self.client = client
+        self.characteristic = characteristic
+        self.on_lost = on_lost
+        self.scheduler = SendScheduler(self.write, on_error=on_error)
+        self.connected_at = time.time()
+        self.received = 0
+
+    @property
+    def is_connected(self) -> bool:
+        return self.client.is_connected
+
+    @property
+    def mtu(self) -> Optional[int]:
+        """Negotiated ATT MTU, from the backend or else from the device's cached profile"""
+        try:
+            mtu = self.client.mtu_size
+        except Exception:
+            mtu = None
+        if (mtu is None or mtu <= ATT_DEFAULT_MTU) and self.cached_mtu:
+            return self.cached_mtu
+        return mtu
+
+    async def write(self, packet: bytes):
+        """Write one packet to the characteristic, called only by the link's scheduler"""
+        if not self.client.is_connected:
+            self.on_lost(self)
+            raise LinkClosed(f"{self.address} is not connected")
+
+        write_with_response = len(packet) > 512
+        try:
+            await self.client.write_gatt_char(self.characteristic, packet, response=write_with_response)
+        except Exception as e:
+            if "not connected" in str(e).lower():
+                self.on_lost(self)
+                raise LinkClosed(str(e))
+
+            # Let the scheduler slow down and retry
+            if "could not complete without blocking" in str(e):
+                raise WriteBlocked(str(e))
+
+            if not write_with_response:
+                raise
+
+            # Retry without response
+            await self.client.write_gatt_char(self.characteristic, packet, response=False)
+
+    async def disconnect(self):
+        await self.client.disconnect()
+
+class LinkManager:
+    """Set of concurrent links with fan-out sending.
+
+    ``on_data`` is awaited with every notification and the address of the link
+    it came in on. ``on_link_lost`` is called once per link that drops, after it
+    has been removed, so ``len(manager)`` tells whether any link is left.
+
+    GATT links are opened with ``connect`` and capped at ``max_links``. Links
+    over other transports, such as IP bridges, are opened elsewhere and
+    registered with ``add``; they don't count against the cap.
+    """
+
+    def __init__(self, characteristic_uuid: str, on_data: Callable[[bytes, str], Awaitable[None]],
+                 on_link_lost: Optional[Callable[[Link], None]] = None,
+                 on_send_error: Optional[Callable[[bytes, Exception], None]] = None,
+                 max_links: int = MAX_LINKS, client_factory: Callable[..., BleakClient] = BleakClient,
+                 service_uuid: Optional[str] = None, profiles: Optional[DeviceProfileCache] = None):
+        self.characteristic_uuid = characteristic_uuid.lower()
+        self.service_uuid = service_uuid
+        self.profiles = profiles
+        self.on_data = on_data
+        self.on_link_lost = on_link_lost
+        self.on_send_error = on_send_error
+        self.max_links = max_links
+        self.client_factory = client_factory
+        self.links: Dict[str, Link] = {}
+        self._stopping: Set[asyncio.Future] = set()
+        self.stats = {'connected': 0, 'lost': 0, 'fanout_writes': 0, 'echo_avoided': 0}
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def __contains__(self, address: str) -> bool:
+        return address in self.links
+
+    @property
+    def connected(self) -> bool:
+        return any(link.is_connected for link in self.links.values())
+
+    @property
+    def ble_links(self) -> int:
+        return sum(1 for link in self.links.values() if link.transport == "ble")
+
+    @property
+    def free_slots(self) -> int:
+        """How many more GATT links may be opened"""
+        return max(0, self.max_links - self.ble_links)
+
+    @property
+    def full(self) -> bool:
+        return not self.free_slots
+
+    def add(self, link):
+        """Register a link opened elsewhere.
+
+        The link needs ``address``, ``transport``, ``scheduler``, ``mtu`` and
+        ``is_connected`` like ``Link``. It should pass received packets to
+        ``receive`` and call its ``on_lost`` (set here) when it closes.
+        """
+        link.on_lost = self._lost
+        self.links[link.address] = link
+        self.stats['connected'] += 1
+
+    async def connect(self, address: str) -> Link:
+        """Open a link to a device and subscribe to its notifications"""
+        if address in self.links:
+            return self.links[address]
+        if self.full:
+            raise RuntimeError(f"Already at the limit of {self.max_links} links")
+
+        profile = self.profiles.get(address) if self.profiles else None
+        options = {}
+        if self.service_uuid:
+            # Only discover the BitChat service, not the whole GATT table
+            options['services'] = [self.service_uuid]
+        if profile:
+            options['winrt'] = {'use_cached_services': True}
+
+        client = self.client_factory(address, disconnected_callback=self._handle_disconnect, **options)
+        await client.connect()
+        try:
+            characteristic = self._cached_characteristic(client, profile)
+            if characteristic is None:
+                characteristic = self._find_characteristic(client)
+            if not characteristic:
+                raise Exception("Characteristic not found")
+
+            link = Link(address, client, characteristic, self._lost, self.on_send_error,
+                        cached_mtu=profile.get('mtu') if profile else None)
+            self.links[address] = link
+            await client.start_notify(characteristic, partial(self._notify, link))
+        except Exception:
+            self.links.pop(address, None)
+            if self.profiles:
+                # Don't trust cached services on the next attempt
+                self.profiles.forget(address)
+            await client.disconnect()
+            raise
+
+        if self.profiles:
+            self.profiles.update(address, characteristic.handle, link.mtu)
+        self.stats['connected'] += 1
+        return link
+
+    def _cached_characteristic(self, client: BleakClient, profile) -> Optional[BleakGATTCharacteristic]:
+        """The characteristic at the cached handle, if it is still the BitChat one"""
+        if not self.profiles:
+            return None
+        if not profile:
+            self.profiles.stats['misses'] += 1
+            return None
+        characteristic = client.services.get_characteristic(int(profile['handle']))
+        if characteristic is not None and characteristic.uuid.lower() == self.characteristic_uuid:
+            self.profiles.stats['hits'] += 1
+            return characteristic
+        self.profiles.stats['stale'] += 1
+        return None
+
+    def _find_characteristic(self, client: BleakClient) -> Optional[BleakGATTCharacteristic]:
+        for service in client.services or ():
+            for char in service.characteristics:
+                if char.uuid.lower() == self.characteristic_uuid:
+                    return char
+        return None
+
+    async def _notify(self, link: Link, sender: BleakGATTCharacteristic, data: bytes):
+        await self.receive(link, data)
+
+    async def receive(self, link, data: bytes):
+        """Pass a packet that arrived on a link to ``on_data``"""
+        link.received += 1
+        await self.on_data(data, link.address)
+
+    def _handle_disconnect(self, client: BleakClient):
+        for link in list(self.links.values()):
+            if link.client is client:
+                self._lost(link)
+
+    def _lost(self, link: Link):
+        # Both the write path and bleak's callback may report the same link
+        if self.links.get(link.address) is not link:
+            return
+        del self.links[link.address]
+        link.scheduler.clear()
+        task = asyncio.ensure_future(link.scheduler.stop())
+        self._stopping.add(task)
+        task.add_done_callback(self._stopping.discard)
+        self.stats['lost'] += 1
+        if self.on_link_lost:
+            self.on_link_lost(link)
+
+    def _targets(self, exclude: Optional[str]) -> Iterable[Link]:
+        for link in list(self.links.values()):
+            if link.address == exclude:
+                self.stats['echo_avoided'] += 1
+            elif link.is_connected:
+                yield link
+
+    def enqueue(self, packet: bytes, lane: Lane, exclude: Optional[str] = None) -> int:
+        """Queue a packet on every link but ``exclude``, returns how many took it"""
+        return self.enqueue_group((packet,), lane, exclude)
+
+    def enqueue_group(self, packets: Iterable[bytes], lane: Lane, exclude: Optional[str] = None) -> int:
+        """Queue packets that must go out in order on every link but ``exclude``"""
+        packets = tuple(packets)
+        queued = 0
+        for link in self._targets(exclude):
+            if link.scheduler.enqueue_group(packets, lane):
+                queued += 1
+        self.stats['fanout_writes'] += queued * len(packets)
+        return queued
+
+    def mtu(self, exclude: Optional[str] = None) -> Optional[int]:
+        """Smallest MTU among the links a packet would go out on"""
+        mtus = [link.mtu for link in self.links.values() if link.address != exclude]
+        known = [mtu for mtu in mtus if mtu]
+        return min(known) if known else None
+
+    def pending(self) -> int:
+        return sum(link.scheduler.pending() for link in self.links.values())
+
+    async def flush(self, timeout: float):
+        """Wait until every link's queue is empty or the timeout passes"""
+        await asyncio.gather(*(link.scheduler.flush(timeout) for link in list(self.links.values())))
+
+    async def close(self):
+        """Stop sending and disconnect every link"""
+        for link in list(self.links.values()):
+            await link.scheduler.stop()
+            # Not a failure, so on_link_lost isn't called
+            self.links.pop(link.address, None)
+            if link.is_connected:
+                try:
+                    await link.disconnect()
+                except Exception:
+                    pass
+
+# Export classes and functions
+__all__ = ['LinkManager', 'Link', 'DeviceProfileCache', 'MAX_LINKS']
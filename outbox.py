@@ -0,0 +1,152 @@
+"""
+Store-and-forward outbox for BitChat
+Keeps messages written while there is no link, and private messages waiting
+for a Noise handshake, in a small SQLite database next to the state file.
+Message text is encrypted with the identity-derived key. Entries expire after
+OUTBOX_TTL so a stale backlog isn't sprayed into the mesh days later.
+"""
+
+import os
+import time
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from persistence import derive_encryption_key
+
+OUTBOX_TTL = 24 * 3600.0  # Seconds a queued message stays deliverable
+OUTBOX_LIMIT = 1000       # Oldest entries are dropped beyond this
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id TEXT NOT NULL,
+    channel TEXT,
+    peer_id TEXT,
+    nickname TEXT,
+    content BLOB NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+)
+"""
+
+@dataclass
+class OutboxEntry:
+    id: int
+    message_id: str
+    content: str
+    channel: Optional[str]   # Public message to this channel, None for the main chat
+    peer_id: Optional[str]   # Private message to this peer
+    nickname: Optional[str]
+    created: float
+    expires: float
+
+    @property
+    def is_private(self) -> bool:
+        return self.peer_id is not None
+
+class Outbox:
+    """Durable FIFO of outbound user messages.
+
+    Use ``":memory:"`` as the path for a throwaway outbox. Without an identity
+    key the text is stored as is, which only makes sense for tests.
+    """
+
+    def __init__(self, path: Union[str, Path], identity_key: Optional[List[int]] = None,
+                 ttl: float = OUTBOX_TTL, limit: int = OUTBOX_LIMIT, clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.limit = limit
+        self.clock = clock
+        self._aead = AESGCM(derive_encryption_key(bytes(identity_key))) if identity_key else None
+        self.db = sqlite3.connect(str(path))
+        if path != ":memory:":
+            os.chmod(path, 0o600)
+        self.db.execute(_SCHEMA)
+        self.db.commit()
+        self.stats = {'queued': 0, 'sent': 0, 'expired': 0, 'dropped': 0}
+
+    def _seal(self, text: str) -> bytes:
+        if self._aead is None:
+            return text.encode('utf-8')
+        nonce = os.urandom(12)
+        return nonce + self._aead.encrypt(nonce, text.encode('utf-8'), b"outbox")
+
+    def _open(self, blob: bytes) -> Optional[str]:
+        if self._aead is None:
+            return blob.decode('utf-8')
+        try:
+            return self._aead.decrypt(blob[:12], blob[12:], b"outbox").decode('utf-8')
+        except Exception:
+            return None  # Written under another identity
+
+    def add(self, message_id: str, content: str, channel: Optional[str] = None,
+            peer_id: Optional[str] = None, nickname: Optional[str] = None) -> int:
+        """Queue a message, returns its entry ID"""
+        now = self.clock()
+        cursor = self.db.execute(
+            "INSERT INTO outbox (message_id, channel, peer_id, nickname, content, created, expires) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (message_id, channel, peer_id, nickname, self._seal(content), now, now + self.ttl)
+        )
+        overflow = self.depth() - self.limit
+        if overflow > 0:
+            self.db.execute("DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id LIMIT ?)", (overflow,))
+            self.stats['dropped'] += overflow
+        self.db.commit()
+        self.stats['queued'] += 1
+        return cursor.lastrowid
+
+    def entries(self, private: Optional[bool] = None, limit: int = -1) -> List[OutboxEntry]:
+        """Unexpired entries, oldest first; ``private`` picks one kind"""
+        self.expire()
+        query = "SELECT id, message_id, content, channel, peer_id, nickname, created, expires FROM outbox"
+        if private is True:
+            query += " WHERE peer_id IS NOT NULL"
+        elif private is False:
+            query += " WHERE peer_id IS NULL"
+        rows = self.db.execute(query + " ORDER BY id LIMIT ?", (limit,)).fetchall()
+        entries = []
+        for row in rows:
+            content = self._open(row[2])
+            if content is not None:
+                entries.append(OutboxEntry(row[0], row[1], content, *row[3:]))
+        return entries
+
+    def remove(self, entry_id: int):
+        """Drop an entry once it has been handed to the send path"""
+        if self.db.execute("DELETE FROM outbox WHERE id = ?", (entry_id,)).rowcount:
+            self.stats['sent'] += 1
+        self.db.commit()
+
+    def remove_message(self, message_id: str):
+        self.stats['sent'] += self.db.execute("DELETE FROM outbox WHERE message_id = ?", (message_id,)).rowcount
+        self.db.commit()
+
+    def discard_peer(self, peer_id: str):
+        """Forget private messages to a peer that has left"""
+        self.stats['dropped'] += self.db.execute("DELETE FROM outbox WHERE peer_id = ?", (peer_id,)).rowcount
+        self.db.commit()
+
+    def expire(self) -> int:
+        removed = self.db.execute("DELETE FROM outbox WHERE expires <= ?", (self.clock(),)).rowcount
+        if removed:
+            self.db.commit()
+            self.stats['expired'] += removed
+        return removed
+
+    def depth(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def oldest_age(self) -> Optional[float]:
+        """Seconds the oldest entry has been waiting, None when empty"""
+        created = self.db.execute("SELECT MIN(created) FROM outbox").fetchone()[0]
+        return None if created is None else self.clock() - created
+
+    def close(self):
+        self.db.close()
+
+# Export classes and functions
+__all__ = ['Outbox', 'OutboxEntry', 'OUTBOX_TTL', 'OUTBOX_LIMIT']
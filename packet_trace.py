@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Packet tracing for BitChat
+Keeps the most recent raw packets in a fixed-size ring and writes them to a
+compact binary dump that can be pretty-printed offline.
+
+Dump format: MAGIC, then one record per packet of
+    timestamp (float64) | direction (uint8) | length (uint32) | raw bytes
+all big-endian.
+"""
+
+import sys
+import time
+import struct
+from collections import deque
+from datetime import datetime
+from typing import Deque, Iterator, Tuple
+
+TRACE_MAGIC = b"BCTRACE1"
+TRACE_RECORD_HEADER = struct.Struct('>dBI')
+DEFAULT_TRACE_CAPACITY = 1024
+
+# Directions
+TRACE_IN = 0
+TRACE_OUT = 1
+
+DIRECTION_NAMES = {TRACE_IN: "RECV", TRACE_OUT: "SEND"}
+
+TraceRecord = Tuple[float, int, bytes]
+
+class PacketTrace:
+    """Fixed-size in-memory ring of raw packets.
+
+    Callers check ``enabled`` before calling ``record`` so that the hot path
+    costs a single attribute lookup while tracing is off.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_TRACE_CAPACITY):
+        self.enabled = False
+        self.records: Deque[TraceRecord] = deque(maxlen=capacity)
+
+    def record(self, direction: int, data: bytes):
+        """Store a copy of a packet seen in the given direction"""
+        self.records.append((time.time(), direction, bytes(data)))
+
+    def clear(self):
+        self.records.clear()
+
+    def dump(self, path: str) -> int:
+        """Write the ring to a binary trace file, returns the number of records"""
+        records = list(self.records)
+        with open(path, 'wb') as f:
+            f.write(TRACE_MAGIC)
+            for timestamp, direction, data in records:
+                f.write(TRACE_RECORD_HEADER.pack(timestamp, direction, len(data)))
+                f.write(data)
+        return len(records)
+
+def read_trace(path: str) -> Iterator[TraceRecord]:
+    """Read records from a binary trace file"""
+    with open(path, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a BitChat packet trace")
+        while True:
+            header = f.read(TRACE_RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < TRACE_RECORD_HEADER.size:
+                raise ValueError("Truncated trace record header")
+            timestamp, direction, length = TRACE_RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                raise ValueError("Truncated trace record")
+            yield timestamp, direction, data
+
+def format_record(record: TraceRecord) -> str:
+    """Format a trace record as a header summary plus an iOS-style hex dump"""
+    # Imported here so the trace module stays importable from bitchat itself
+    from bitchat import parse_bitchat_packet
+
+    timestamp, direction, data = record
+    time_str = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+    lines = [f"[{time_str}] {DIRECTION_NAMES.get(direction, '????')} {len(data)} bytes"]
+
+    try:
+        packet = parse_bitchat_packet(data)
+        recipient = packet.recipient_id_str or "-"
+        lines.append(f"  type={packet.msg_type.name} ttl={packet.ttl} flags=0x{packet.flags:02x} "
+                     f"sender={packet.sender_id_str} recipient={recipient} payload_len={len(packet.payload_view)}")
+    except Exception as e:
+        lines.append(f"  (unparseable: {e})")
+
+    for offset in range(0, len(data), 32):
+        lines.append("  " + ' '.join(f'{b:02X}' for b in data[offset:offset + 32]))
+
+    return '\n'.join(lines)
+
+def main():
+    """Pretty-print a binary packet trace"""
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <trace file>")
+        sys.exit(1)
+
+    count = 0
+    for record in read_trace(sys.argv[1]):
+        print(format_record(record))
+        count += 1
+    print(f"\n{count} packet(s)")
+
+# Export classes and functions
+__all__ = ['PacketTrace', 'read_trace', 'format_record', 'TRACE_IN', 'TRACE_OUT', 'DEFAULT_TRACE_CAPACITY']
+
+if __name__ == "__main__":
+    main()
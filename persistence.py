@@ -9,6 +9,7 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import ed25519
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
 
 @dataclass
 class EncryptedPassword:
@@ -26,6 +27,7 @@ class AppState:
     favorites: Set[str] = field(default_factory=set)
     identity_key: Optional[List[int]] = None
     encrypted_channel_passwords: Dict[str, EncryptedPassword] = field(default_factory=dict)
+    noise_static_key: Optional[List[int]] = None
 
 def get_state_file_path() -> Path:
     """Get the state file path"""
@@ -34,6 +36,26 @@ def get_state_file_path() -> Path:
     bitchat_dir.mkdir(exist_ok=True)
     return bitchat_dir / "state.json"
 
+def get_dedup_file_path() -> Path:
+    """Get the path of the saved message dedup cache, next to the state file"""
+    return get_state_file_path().parent / "dedup.bin"
+
+def get_session_snapshot_path() -> Path:
+    """Get the path of the Noise session snapshot, next to the state file"""
+    return get_state_file_path().parent / "sessions.bin"
+
+def get_channel_key_cache_path() -> Path:
+    """Get the path of the derived channel key cache, next to the state file"""
+    return get_state_file_path().parent / "channel_keys.bin"
+
+def get_outbox_path() -> Path:
+    """Get the path of the store-and-forward outbox database, next to the state file"""
+    return get_state_file_path().parent / "outbox.db"
+
+def get_device_profiles_path() -> Path:
+    """Get the path of the GATT handle and MTU cache, next to the state file"""
+    return get_state_file_path().parent / "device_profiles.json"
+
 class AppStateEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, set):
@@ -86,6 +108,16 @@ def load_state() -> AppState:
         ))
         save_state(state)
     
+    # Generate the Noise static key if not present, it is our fingerprint
+    if state.noise_static_key is None:
+        noise_key = X25519PrivateKey.generate()
+        state.noise_static_key = list(noise_key.private_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PrivateFormat.Raw,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+        save_state(state)
+    
     return state
 
 def save_state(state: AppState) -> None:
@@ -102,6 +134,7 @@ def save_state(state: AppState) -> None:
         'channel_key_commitments': state.channel_key_commitments,
         'favorites': list(state.favorites),
         'identity_key': state.identity_key,
+        'noise_static_key': state.noise_static_key,
         'encrypted_channel_passwords': {
             channel: {'nonce': ep.nonce, 'ciphertext': ep.ciphertext}
             for channel, ep in state.encrypted_channel_passwords.items()
@@ -110,6 +143,8 @@ def save_state(state: AppState) -> None:
     
     with open(path, 'w') as f:
         json.dump(data, f, indent=2)
+    # The state file holds private keys
+    os.chmod(path, 0o600)
 
 def derive_encryption_key(identity_key: bytes) -> bytes:
     """Derive AES key from identity key"""
@@ -144,6 +179,70 @@ def decrypt_password(encrypted: EncryptedPassword, identity_key: List[int]) -> s
     plaintext = aesgcm.decrypt(nonce, ciphertext, None)
     return plaintext.decode()
 
+def _save_encrypted_json(path: Path, data, identity_key: List[int], label: bytes) -> None:
+    """Write JSON encrypted with the identity-derived key, replacing the file atomically"""
+    key = derive_encryption_key(bytes(identity_key))
+    nonce = os.urandom(12)
+    ciphertext = AESGCM(key).encrypt(nonce, json.dumps(data).encode(), label)
+    
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(nonce + ciphertext)
+    os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, path)
+
+def _load_encrypted_json(path: Path, identity_key: List[int], label: bytes):
+    """Read a file written by _save_encrypted_json, None if missing or unreadable"""
+    try:
+        data = path.read_bytes()
+        key = derive_encryption_key(bytes(identity_key))
+        return json.loads(AESGCM(key).decrypt(data[:12], data[12:], label))
+    except Exception:
+        return None
+
+def save_channel_key_cache(entries: Dict[str, Dict[str, str]], identity_key: List[int]) -> None:
+    """Save derived channel keys, encrypted with the identity-derived key"""
+    _save_encrypted_json(get_channel_key_cache_path(), entries, identity_key, b"channel-keys")
+
+def load_channel_key_cache(identity_key: List[int]) -> Dict[str, Dict[str, str]]:
+    """Load derived channel keys, a missing or unreadable cache is empty"""
+    return _load_encrypted_json(get_channel_key_cache_path(), identity_key, b"channel-keys") or {}
+
+def save_session_snapshot(snapshot: dict, identity_key: List[int]) -> None:
+    """Save Noise session keys and nonces, encrypted with the identity-derived key"""
+    _save_encrypted_json(get_session_snapshot_path(), snapshot, identity_key, b"noise-sessions")
+
+def load_session_snapshot(identity_key: List[int]) -> Optional[dict]:
+    """Load the Noise session snapshot, None if missing or unreadable"""
+    return _load_encrypted_json(get_session_snapshot_path(), identity_key, b"noise-sessions")
+
+def clear_session_snapshot() -> None:
+    """Delete the Noise session snapshot"""
+    try:
+        get_session_snapshot_path().unlink()
+    except FileNotFoundError:
+        pass
+
+def save_device_profiles(profiles: Dict[str, Dict[str, float]]) -> None:
+    """Save cached device profiles, replacing the file atomically"""
+    path = get_device_profiles_path()
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(profiles, f)
+    os.replace(tmp_path, path)
+
+def load_device_profiles() -> Dict[str, Dict[str, float]]:
+    """Load cached device profiles, a missing or unreadable cache is empty"""
+    try:
+        with open(get_device_profiles_path()) as f:
+            profiles = json.load(f)
+        return profiles if isinstance(profiles, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
 # Export classes and functions
 __all__ = ['EncryptedPassword', 'AppState', 'get_state_file_path', 'load_state', 'save_state', 
-           'encrypt_password', 'decrypt_password']
\ No newline at end of file
+           'encrypt_password', 'decrypt_password', 'get_dedup_file_path', 'get_channel_key_cache_path',
+           'save_channel_key_cache', 'load_channel_key_cache', 'derive_encryption_key', 'get_session_snapshot_path',
+           'save_session_snapshot', 'load_session_snapshot', 'clear_session_snapshot',
+           'get_device_profiles_path', 'save_device_profiles', 'load_device_profiles', 'get_outbox_path']
\ No newline at end of file
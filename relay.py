@@ -0,0 +1,149 @@
+"""
+Relay engine for BitChat
+Decides which packets this node re-broadcasts. Every packet is identified by a
+hash of its sender, timestamp, type and payload (TTL excluded, since it changes
+per hop). Relays wait out a random jitter window and are cancelled if the same
+packet was heard often enough in the meantime, and broadcasts are relayed with
+a probability that shrinks as the mesh gets denser.
+"""
+
+import asyncio
+import random
+import hashlib
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+# Seen-cache: SEEN_BUCKETS buckets of SEEN_BUCKET_SECONDS each
+SEEN_BUCKET_SECONDS = 30.0
+SEEN_BUCKETS = 4
+
+# Cancel a pending relay after hearing the packet this many times (including the first)
+SUPPRESS_THRESHOLD = 3
+RELAY_JITTER = (0.02, 0.2)  # Seconds, wide enough for neighbours' copies to arrive
+
+# Broadcasts are always relayed with up to this many peers around, then with
+# probability DENSE_PEER_COUNT / peers, never below MIN_RELAY_PROBABILITY
+DENSE_PEER_COUNT = 6
+MIN_RELAY_PROBABILITY = 0.25
+
+# Packet header offsets
+_TTL_OFFSET = 2
+_TIMESTAMP_SLICE = slice(3, 11)
+
+def packet_key(packet) -> bytes:
+    """16-byte identity of a packet across hops"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(packet.raw[_TIMESTAMP_SLICE])
+    digest.update(bytes((packet.msg_type,)))
+    digest.update(packet.sender_id)
+    digest.update(packet.payload_view)
+    return digest.digest()
+
+class SeenCache:
+    """Time-bucketed map of packet key to the number of times it was heard"""
+
+    def __init__(self, bucket_seconds: float = SEEN_BUCKET_SECONDS, buckets: int = SEEN_BUCKETS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bucket_seconds = bucket_seconds
+        self.clock = clock
+        self.buckets: Deque[Dict[bytes, int]] = deque([{}], maxlen=buckets)
+        self._bucket_start = clock()
+
+    def hear(self, key: bytes) -> int:
+        """Record a sighting, returns how many times the key has now been heard"""
+        self._rotate()
+        for bucket in self.buckets:
+            count = bucket.get(key)
+            if count is not None:
+                bucket[key] = count + 1
+                return count + 1
+        self.buckets[-1][key] = 1
+        return 1
+
+    def count(self, key: bytes) -> int:
+        for bucket in self.buckets:
+            count = bucket.get(key)
+            if count is not None:
+                return count
+        return 0
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def _rotate(self):
+        now = self.clock()
+        if now - self._bucket_start >= self.bucket_seconds:
+            # The deque's maxlen drops the oldest bucket
+            self.buckets.append({})
+            self._bucket_start = now
+
+class RelayEngine:
+    """Packet dedup plus jittered, suppressible, density-aware relaying.
+
+    ``send`` is awaited with the TTL-decremented packet and the ``source`` of
+    the original (the link it arrived on), so it isn't echoed back there.
+    ``peer_count`` returns the number of peers currently known, used to scale
+    broadcast relaying.
+    """
+
+    def __init__(self, send: Callable[[bytes, Optional[str]], Awaitable[None]], peer_count: Callable[[], int],
+                 suppress_threshold: int = SUPPRESS_THRESHOLD, jitter: Tuple[float, float] = RELAY_JITTER,
+                 seen: Optional[SeenCache] = None, rng: Callable[[], float] = random.random):
+        self.send = send
+        self.peer_count = peer_count
+        self.suppress_threshold = suppress_threshold
+        self.jitter = jitter
+        self.seen = seen or SeenCache()
+        self.rng = rng
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {'relayed': 0, 'suppressed': 0, 'skipped': 0, 'duplicates': 0}
+
+    def observe(self, packet) -> bool:
+        """Record an incoming packet, returns False if it was already seen"""
+        if self.seen.hear(packet_key(packet)) > 1:
+            self.stats['duplicates'] += 1
+            return False
+        return True
+
+    def relay_probability(self, probabilistic: bool = True) -> float:
+        peers = self.peer_count()
+        if not probabilistic or peers <= DENSE_PEER_COUNT:
+            return 1.0
+        return max(MIN_RELAY_PROBABILITY, DENSE_PEER_COUNT / peers)
+
+    def schedule(self, packet, probabilistic: bool = True):
+        """Relay a packet after a random delay unless it is suppressed in the meantime.
+
+        Pass ``probabilistic=False`` for directed packets and fragments, which
+        are always relayed (subject to suppression) since losing them can't be
+        made up for by other copies of the flood.
+        """
+        if packet.ttl <= 1:
+            return
+        if self.rng() >= self.relay_probability(probabilistic):
+            self.stats['skipped'] += 1
+            return
+        task = asyncio.create_task(self._relay_later(packet_key(packet), packet.raw, packet.ttl,
+                                                     packet.source))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _relay_later(self, key: bytes, raw: bytes, ttl: int, source: Optional[str]):
+        await asyncio.sleep(random.uniform(*self.jitter))
+        if self.seen.count(key) >= self.suppress_threshold:
+            self.stats['suppressed'] += 1
+            return
+        relay_data = bytearray(raw)
+        relay_data[_TTL_OFFSET] = ttl - 1
+        self.stats['relayed'] += 1
+        await self.send(bytes(relay_data), source)
+
+    async def stop(self):
+        """Cancel relays that are still waiting out their jitter"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+# Export classes and functions
+__all__ = ['RelayEngine', 'SeenCache', 'packet_key', 'SUPPRESS_THRESHOLD', 'RELAY_JITTER']
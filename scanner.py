@@ -0,0 +1,147 @@
+"""
+Continuous BLE scanner for BitChat
+One long-lived scanner reports every advertisement of the BitChat service into
+a candidate table instead of running blocking discovery rounds. The table
+keeps a smoothed RSSI, when each device was last heard and how connection
+attempts to it went, so reconnecting can go straight to the best device heard
+recently. Devices that keep failing are backed off exponentially.
+"""
+
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Collection, Dict, List, Optional
+
+from bleak import BleakScanner
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+CANDIDATE_TTL = 30.0      # Forget devices not heard for this long
+RSSI_SMOOTHING = 0.3      # Weight of the newest reading in the smoothed RSSI
+SUCCESS_BONUS = 10.0      # dB added to devices we have connected to before
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 120.0
+
+@dataclass
+class Candidate:
+    address: str
+    name: Optional[str] = None
+    rssi: float = -100.0
+    last_seen: float = 0.0
+    successes: int = 0
+    failures: int = 0             # Consecutive, reset by a success
+    retry_at: float = 0.0         # No attempts before this time
+
+    @property
+    def score(self) -> float:
+        return self.rssi + (SUCCESS_BONUS if self.successes else 0.0)
+
+class CandidateTable:
+    """Devices heard advertising, ranked for connection attempts"""
+
+    def __init__(self, ttl: float = CANDIDATE_TTL, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.candidates: Dict[str, Candidate] = {}
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def seen(self, address: str, rssi: Optional[int], name: Optional[str] = None) -> Candidate:
+        """Record an advertisement"""
+        candidate = self.candidates.get(address)
+        if candidate is None:
+            candidate = self.candidates[address] = Candidate(address, rssi=float(rssi if rssi is not None else -100))
+        elif rssi is not None:
+            candidate.rssi += RSSI_SMOOTHING * (rssi - candidate.rssi)
+        candidate.name = name or candidate.name
+        candidate.last_seen = self.clock()
+        return candidate
+
+    def succeeded(self, address: str):
+        candidate = self.candidates.get(address)
+        if candidate:
+            candidate.successes += 1
+            candidate.failures = 0
+            candidate.retry_at = 0.0
+
+    def failed(self, address: str):
+        """Back the device off for twice as long as last time"""
+        candidate = self.candidates.get(address)
+        if candidate:
+            candidate.failures += 1
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (candidate.failures - 1))
+            candidate.retry_at = self.clock() + delay
+
+    def expire(self):
+        now = self.clock()
+        for address in [address for address, candidate in self.candidates.items()
+                        if now - candidate.last_seen > self.ttl]:
+            del self.candidates[address]
+
+    def ranked(self, exclude: Collection[str] = ()) -> List[Candidate]:
+        """Candidates that may be tried now, best first"""
+        self.expire()
+        now = self.clock()
+        ready = [candidate for candidate in self.candidates.values()
+                 if candidate.address not in exclude and candidate.retry_at <= now]
+        ready.sort(key=lambda candidate: candidate.score, reverse=True)
+        return ready
+
+    def next_retry(self, exclude: Collection[str] = ()) -> Optional[float]:
+        """Seconds until a backed-off candidate may be tried again, if any is waiting"""
+        now = self.clock()
+        waits = [candidate.retry_at - now for candidate in self.candidates.values()
+                 if candidate.address not in exclude and candidate.retry_at > now]
+        return min(waits) if waits else None
+
+class ContinuousScanner:
+    """Long-lived scanner for one service, feeding a CandidateTable"""
+
+    def __init__(self, service_uuid: str, candidates: CandidateTable,
+                 scanner_factory: Callable[..., BleakScanner] = BleakScanner):
+        self.service_uuid = service_uuid
+        self.candidates = candidates
+        self.scanner_factory = scanner_factory
+        self._scanner: Optional[BleakScanner] = None
+        self._wakeup = asyncio.Event()
+        self.stats = {'advertisements': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._scanner is not None
+
+    def _detected(self, device: BLEDevice, advertisement: AdvertisementData):
+        self.stats['advertisements'] += 1
+        known = device.address in self.candidates.candidates
+        self.candidates.seen(device.address, advertisement.rssi, advertisement.local_name or device.name)
+        if not known:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._scanner is None:
+            self._scanner = self.scanner_factory(detection_callback=self._detected,
+                                                 service_uuids=[self.service_uuid])
+            await self._scanner.start()
+
+    async def stop(self):
+        if self._scanner is not None:
+            scanner, self._scanner = self._scanner, None
+            await scanner.stop()
+
+    def wake(self):
+        """Wake a ``wait`` early, e.g. because a link dropped"""
+        self._wakeup.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for a newly heard device or ``wake``, returns False on timeout"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._wakeup.clear()
+
+# Export classes and functions
+__all__ = ['ContinuousScanner', 'CandidateTable', 'Candidate', 'CANDIDATE_TTL']
@@ -0,0 +1,195 @@
+"""
+Outbound send scheduler for BitChat
+A single task owns the BLE characteristic and drains three priority lanes.
+Writes are paced with credits that refill at an adaptive rate: the rate is
+halved whenever the link reports it is full and creeps back up on success.
+"""
+
+import asyncio
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Awaitable, Callable, Deque, Dict, Iterable, Optional
+
+class Lane(IntEnum):
+    CONTROL = 0  # Handshakes, ACKs, announces
+    USER = 1     # Messages from the local user
+    BULK = 2     # Relays and fragments
+
+class DropPolicy(IntEnum):
+    DROP_OLDEST = 0
+    DROP_NEWEST = 1
+
+LANE_LIMITS = {Lane.CONTROL: 64, Lane.USER: 128, Lane.BULK: 256}
+LANE_POLICIES = {
+    Lane.CONTROL: DropPolicy.DROP_OLDEST,  # A stale handshake is worth less than a fresh one
+    Lane.USER: DropPolicy.DROP_NEWEST,     # Keep conversation order, refuse new input
+    Lane.BULK: DropPolicy.DROP_OLDEST,     # Old relays have most likely reached the mesh already
+}
+
+# Pacing, in writes per second
+INITIAL_RATE = 50.0
+MIN_RATE = 5.0
+MAX_RATE = 100.0
+RATE_INCREASE = 1.0  # Added after each successful write
+MAX_CREDITS = 4.0    # Burst size
+BLOCKED_RETRIES = 3
+
+class WriteBlocked(Exception):
+    """Raised by the write callable when the link can't take more data right now"""
+
+class LinkClosed(Exception):
+    """Raised by the write callable when the link is gone and the packet wasn't sent"""
+
+class _SendItem:
+    """One queued packet, or a group of packets (fragments) sent back to back"""
+    __slots__ = ('packets', 'retries')
+
+    def __init__(self, packets: Iterable[bytes]):
+        self.packets: Deque[bytes] = deque(packets)
+        self.retries = 0
+
+class SendScheduler:
+    """Priority egress queue with credit-based pacing.
+
+    ``write`` is awaited for every packet. It raises ``WriteBlocked`` when the
+    link is temporarily full, which shrinks the rate and retries the packet, and
+    ``LinkClosed`` when the link is gone, which stops the scheduler with the
+    packet still queued. Any other exception drops the item and is passed to
+    ``on_error``.
+    """
+
+    def __init__(self, write: Callable[[bytes], Awaitable[None]],
+                 on_error: Optional[Callable[[bytes, Exception], None]] = None,
+                 limits: Optional[Dict[Lane, int]] = None,
+                 rate: float = INITIAL_RATE, max_rate: float = MAX_RATE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.write = write
+        self.on_error = on_error
+        self.limits = {**LANE_LIMITS, **(limits or {})}
+        self.lanes: Dict[Lane, Deque[_SendItem]] = {lane: deque() for lane in Lane}
+        self.rate = rate
+        self.max_rate = max_rate
+        self.credits = MAX_CREDITS
+        self.clock = clock
+        self._last_refill = clock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped: Dict[Lane, int] = {lane: 0 for lane in Lane}
+        self.stats = {'sent': 0, 'blocked': 0, 'failed': 0, 'closed': 0}
+
+    def start(self):
+        """Start the scheduler task if it isn't running"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def enqueue(self, packet: bytes, lane: Lane) -> bool:
+        """Queue a packet, returns False if the lane's drop policy refused it"""
+        return self.enqueue_group((packet,), lane)
+
+    def enqueue_group(self, packets: Iterable[bytes], lane: Lane) -> bool:
+        """Queue packets that must go out in order, such as the fragments of one packet"""
+        queue = self.lanes[lane]
+        if len(queue) >= self.limits[lane]:
+            self.dropped[lane] += 1
+            if LANE_POLICIES[lane] == DropPolicy.DROP_NEWEST:
+                return False
+            queue.popleft()
+        queue.append(_SendItem(packets))
+        self._wakeup.set()
+        self.start()
+        return True
+
+    def clear(self):
+        """Drop everything queued, e.g. after the link went away"""
+        for lane, queue in self.lanes.items():
+            self.dropped[lane] += len(queue)
+            queue.clear()
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self.lanes.values())
+
+    async def flush(self, timeout: float):
+        """Wait until all lanes are empty or the timeout passes"""
+        deadline = self.clock() + timeout
+        while self.pending() and self.clock() < deadline:
+            await asyncio.sleep(0.01)
+
+    def _next(self):
+        for lane, queue in self.lanes.items():
+            if queue:
+                return lane, queue[0]
+        return None, None
+
+    def _finish(self, lane: Lane, item: _SendItem):
+        # The item may already have been dropped or cleared while it was being written
+        queue = self.lanes[lane]
+        if queue and queue[0] is item:
+            queue.popleft()
+
+    async def _wait_for_credit(self):
+        while True:
+            now = self.clock()
+            self.credits = min(MAX_CREDITS, self.credits + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self.credits >= 1:
+                self.credits -= 1
+                return
+            await asyncio.sleep((1 - self.credits) / self.rate)
+
+    async def _run(self):
+        while True:
+            lane, item = self._next()
+            if item is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            await self._wait_for_credit()
+            # Something more urgent may have arrived while we waited
+            if self._next()[1] is not item:
+                self.credits += 1
+                continue
+
+            packet = item.packets[0]
+            try:
+                await self.write(packet)
+            except WriteBlocked:
+                self.stats['blocked'] += 1
+                self.rate = max(MIN_RATE, self.rate / 2)
+                self.credits = 0
+                item.retries += 1
+                if item.retries > BLOCKED_RETRIES:
+                    self.dropped[lane] += 1
+                    self._finish(lane, item)
+                continue
+            except LinkClosed:
+                # Not sent and nothing more will be, leave it queued for the owner of the link
+                self.stats['closed'] += 1
+                self.credits += 1
+                return
+            except Exception as e:
+                self.stats['failed'] += 1
+                self._finish(lane, item)
+                if self.on_error:
+                    self.on_error(packet, e)
+                continue
+
+            self.stats['sent'] += 1
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+            item.retries = 0
+            item.packets.popleft()
+            if not item.packets:
+                self._finish(lane, item)
+
+# Export classes and functions
+__all__ = ['SendScheduler', 'Lane', 'DropPolicy', 'WriteBlocked', 'LinkClosed', 'LANE_LIMITS']
@@ -0,0 +1,155 @@
+"""
+Noise session lifecycle for BitChat
+Owns the session and handshake tables of an EncryptionService. The session
+table is an LRU capped at MAX_SESSIONS; sessions are evicted after sitting
+idle, not after a fixed age, and half-finished handshakes time out. Sessions
+that have used many nonces or are old are reported for a rekey once they have
+been quiet for a moment, so the new handshake doesn't land mid-conversation.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+MAX_SESSIONS = 256
+SESSION_IDLE_TIMEOUT = 1800.0  # Seconds without traffic before a session is dropped
+HANDSHAKE_TIMEOUT = 30.0       # Seconds a handshake may take before its state is dropped
+
+# Rekey once either direction has used this many nonces, or the session is this
+# old, but only after REKEY_IDLE seconds without traffic
+REKEY_NONCE_THRESHOLD = 1 << 20
+REKEY_AGE = 3600.0
+REKEY_IDLE = 10.0
+
+class SessionManager:
+    """LRU session table with idle eviction, handshake timeouts and rekey scheduling.
+
+    ``sessions`` and ``handshake_states`` are plain mappings that callers may
+    look single entries up in. Handshakes run on worker threads, so every change
+    goes through the methods here, under a lock, and code that walks the tables
+    takes a copy with ``session_items`` or ``handshake_peers``.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 handshake_timeout: float = HANDSHAKE_TIMEOUT, rekey_nonces: int = REKEY_NONCE_THRESHOLD,
+                 rekey_age: float = REKEY_AGE, rekey_idle: float = REKEY_IDLE,
+                 clock: Callable[[], float] = time.time):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.handshake_timeout = handshake_timeout
+        self.rekey_nonces = rekey_nonces
+        self.rekey_age = rekey_age
+        self.rekey_idle = rekey_idle
+        self.clock = clock
+        self.sessions: 'OrderedDict[str, object]' = OrderedDict()
+        self.handshake_states: 'OrderedDict[str, object]' = OrderedDict()
+        self._handshake_started: Dict[str, float] = {}
+        self._rekeying: Dict[str, float] = {}  # peer_id -> when the rekey handshake was started
+        self._lock = threading.RLock()
+        self.stats = {'created': 0, 'evicted_idle': 0, 'evicted_lru': 0, 'rekeyed': 0, 'handshakes_expired': 0}
+
+    def add_session(self, peer_id: str, session):
+        """Store a newly established session, evicting the least recently used if full"""
+        with self._lock:
+            now = self.clock()
+            session.last_used = now
+            if peer_id in self.sessions:
+                self.stats['rekeyed'] += 1
+            self._rekeying.pop(peer_id, None)
+            self.sessions[peer_id] = session
+            self.sessions.move_to_end(peer_id)
+            self.stats['created'] += 1
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.stats['evicted_lru'] += 1
+
+    def finish_handshake(self, peer_id: str, session):
+        """Replace a completed handshake with its session"""
+        with self._lock:
+            self.drop_handshake(peer_id)
+            self.add_session(peer_id, session)
+
+    def drop_session(self, peer_id: str) -> bool:
+        with self._lock:
+            return self.sessions.pop(peer_id, None) is not None
+
+    def drop_handshake(self, peer_id: str) -> bool:
+        with self._lock:
+            self._handshake_started.pop(peer_id, None)
+            return self.handshake_states.pop(peer_id, None) is not None
+
+    def clear(self):
+        """Forget every session and handshake"""
+        with self._lock:
+            self.sessions.clear()
+            self.handshake_states.clear()
+            self._handshake_started.clear()
+            self._rekeying.clear()
+
+    def session_items(self) -> List[Tuple[str, object]]:
+        """Copy of the session table, safe to iterate while handshakes run"""
+        with self._lock:
+            return list(self.sessions.items())
+
+    def handshake_peers(self) -> List[str]:
+        with self._lock:
+            return list(self.handshake_states)
+
+    def touch(self, peer_id: str):
+        """Mark a session as used, keeping it away from eviction"""
+        with self._lock:
+            session = self.sessions.get(peer_id)
+            if session is not None:
+                session.last_used = self.clock()
+                self.sessions.move_to_end(peer_id)
+
+    def start_handshake(self, peer_id: str, state):
+        with self._lock:
+            self.handshake_states[peer_id] = state
+            self._handshake_started[peer_id] = self.clock()
+
+    def start_rekey(self, peer_id: str):
+        """Note that a rekey handshake is under way so it isn't scheduled again"""
+        with self._lock:
+            self._rekeying[peer_id] = self.clock()
+
+    def expire(self) -> List[str]:
+        """Drop idle sessions and stale handshakes, returns the peers whose session went"""
+        with self._lock:
+            now = self.clock()
+            evicted = [peer_id for peer_id, session in self.sessions.items()
+                       if now - session.last_used > self.idle_timeout]
+            for peer_id in evicted:
+                del self.sessions[peer_id]
+                self.stats['evicted_idle'] += 1
+
+            for peer_id, started in list(self._handshake_started.items()):
+                if now - started > self.handshake_timeout:
+                    del self.handshake_states[peer_id]
+                    del self._handshake_started[peer_id]
+                    self.stats['handshakes_expired'] += 1
+
+            for peer_id, started in list(self._rekeying.items()):
+                if now - started > self.handshake_timeout:
+                    del self._rekeying[peer_id]  # Allow another attempt
+            return evicted
+
+    def due_for_rekey(self) -> List[str]:
+        """Idle sessions that have used too many nonces or lived too long"""
+        with self._lock:
+            now = self.clock()
+            due = []
+            for peer_id, session in self.sessions.items():
+                if peer_id in self._rekeying or peer_id in self.handshake_states:
+                    continue
+                if now - session.last_used < self.rekey_idle:
+                    continue
+                nonces = max(session.send_cipher.nonce, session.receive_cipher.nonce)
+                if nonces >= self.rekey_nonces or now - session.established_time >= self.rekey_age:
+                    due.append(peer_id)
+            return due
+
+# Export classes and functions
+__all__ = ['SessionManager', 'MAX_SESSIONS', 'SESSION_IDLE_TIMEOUT', 'HANDSHAKE_TIMEOUT',
+           'REKEY_NONCE_THRESHOLD', 'REKEY_AGE']
@@ -257,6 +257,13 @@ def print_help():
     print("  \033[36m/block\033[0m        List blocked users")
     print("  \033[36m/unblock\033[0m \033[90m@user\033[0m Unblock a user\n")
     
+    # Diagnostics
+    print("\033[38;5;40m▶ Diagnostics\033[0m")
+    print("  \033[36m/trace\033[0m \033[90mon|off\033[0m Toggle packet tracing")
+    print("  \033[36m/trace dump\033[0m \033[90m<file>\033[0m Write traced packets to a file")
+    print("  \033[36m/pending\033[0m Show messages waiting for delivery")
+    print("  \033[36m/relay\033[0m Show relay and suppression counters\n")
+    
     print("\033[38;5;40m━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\033[0m")
 
 def clear_screen():
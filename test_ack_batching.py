@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""
+Test script for coalesced delivery ACKs
+"""
+
+import asyncio
+import json
+
+from bitchat import BitchatClient, Peer, ACK_COALESCE_WINDOW, parse_bitchat_packet, get_packet_encoder
+
+# Fixed IDs: recipient IDs lose trailing zero bytes on parse, so a random ID
+# ending in 00 would never match
+ALICE_ID = "7e24c1f633915d33"
+BOB_ID = "abcd1234567890ef"
+
+def make_client(peer_id: str) -> BitchatClient:
+    client = BitchatClient()
+    client.my_peer_id = peer_id
+    client.encoder = get_packet_encoder(peer_id)
+    return client
+
+def make_pair():
+    """Two clients that know each other, with outgoing packets captured"""
+    alice, bob = make_client(ALICE_ID), make_client(BOB_ID)
+    alice.peers[bob.my_peer_id] = Peer("bob")
+    bob.peers[alice.my_peer_id] = Peer("alice")
+    
+    sent = []
+    async def capture(packet, lane=None):
+        sent.append(packet)
+    bob.send_packet = capture
+    return alice, bob, sent
+
+def test_single_ack_until_batch_advertised():
+    """Peers that haven't advertised batching get one ACK per message"""
+    alice, bob, sent = make_pair()
+    
+    async def scenario():
+        for message_id in ("m1", "m2"):
+            await bob.send_delivery_ack(message_id, alice.my_peer_id, False)
+    asyncio.run(scenario())
+    
+    assert len(sent) == 2
+    ack_data = json.loads(parse_bitchat_packet(sent[0]).payload)
+    assert ack_data['originalMessageID'] == "m1"
+    assert 'originalMessageIDs' not in ack_data
+    assert ack_data['supportsBatch']
+
+def test_batched_acks_are_consumed():
+    """A burst becomes one packet, and the receiver marks every message delivered"""
+    alice, bob, sent = make_pair()
+    bob.peers[alice.my_peer_id].supports_ack_batch = True
+    message_ids = ["m1", "m2", "m3"]
+    for message_id in message_ids:
+        alice.delivery_tracker.track_message(message_id, "hi", False)
+    
+    async def scenario():
+        for message_id in message_ids:
+            await bob.send_delivery_ack(message_id, alice.my_peer_id, False)
+        await asyncio.sleep(ACK_COALESCE_WINDOW + 0.05)
+        packet = parse_bitchat_packet(sent[0])
+        await alice.handle_delivery_ack(packet, sent[0])
+    asyncio.run(scenario())
+    
+    assert len(sent) == 1
+    assert json.loads(parse_bitchat_packet(sent[0]).payload)['originalMessageIDs'] == message_ids
+    assert not alice.delivery_tracker.pending_messages
+    assert alice.peers[bob.my_peer_id].supports_ack_batch
+
+def test_plaintext_ack_leaves_session_intact():
+    """A public ACK from a peer with a session isn't decrypted, so later DMs still decrypt"""
+    alice, bob, sent = make_pair()
+    alice_noise, bob_noise = alice.encryption_service, bob.encryption_service
+    message = alice_noise.initiate_handshake(bob.my_peer_id)
+    message = alice_noise.process_handshake_message(bob.my_peer_id, bob_noise.process_handshake_message(alice.my_peer_id, message))
+    bob_noise.process_handshake_message(alice.my_peer_id, message)
+    for message_id in ("public", "private"):
+        alice.delivery_tracker.track_message(message_id, "hi", message_id == "private")
+    
+    async def scenario():
+        await bob.send_delivery_ack("public", alice.my_peer_id, False)
+        await bob.send_delivery_ack("private", alice.my_peer_id, True)
+        for raw in sent:
+            await alice.handle_delivery_ack(parse_bitchat_packet(raw), raw)
+    asyncio.run(scenario())
+    
+    assert not alice.delivery_tracker.pending_messages
+    ciphertext = bob_noise.encrypt_for_peer(alice.my_peer_id, b"still in sync")
+    assert alice_noise.decrypt_from_peer(bob.my_peer_id, ciphertext) == b"still in sync"
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat ACK Batching Test")
+    print("=" * 60)
+    
+    for test in (test_single_ack_until_batch_advertised, test_batched_acks_are_consumed,
+                 test_plaintext_ack_leaves_session_intact):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+Test script for the TCP bridge transport, run entirely on localhost
+"""
+
+import asyncio
+
+from bitchat import MessageType, PacketEncoder, parse_bitchat_packet
+from bridge import Bridge, BridgeLink, parse_endpoint, FRAME_HEADER
+from link_manager import LinkManager
+from relay import RelayEngine
+from send_scheduler import Lane
+
+SENDER_ID = "7e24c1f633915d33"
+CHARACTERISTIC_UUID = "a1b2c3d4-e5f6-4a5b-8c9d-0e1f2a3b4c5d"
+
+class Node:
+    """A LinkManager whose received packets go through the relay engine"""
+
+    def __init__(self):
+        self.received = []
+        self.links = LinkManager(CHARACTERISTIC_UUID, self.on_data)
+        self.relay = RelayEngine(self.send, lambda: 2, jitter=(0.0, 0.01))
+
+    async def on_data(self, data, source):
+        packet = parse_bitchat_packet(data)
+        packet.source = source
+        self.received.append((packet.ttl, source))
+        if self.relay.observe(packet):
+            self.relay.schedule(packet)
+
+    async def send(self, data, source):
+        self.links.enqueue(data, Lane.BULK, exclude=source)
+
+async def wait_for(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+def test_parse_endpoint():
+    """Bridge addresses accept a bare port, host:port and bracketed IPv6"""
+    assert parse_endpoint("7500") == ("127.0.0.1", 7500)
+    assert parse_endpoint("0.0.0.0:7500") == ("0.0.0.0", 7500)
+    assert parse_endpoint("10.0.0.2:7500") == ("10.0.0.2", 7500)
+    assert parse_endpoint("[::1]:7500") == ("::1", 7500)
+    assert parse_endpoint("gateway")[0] == "gateway"
+
+def test_relay_across_bridges():
+    """A packet crosses A -> B -> C with one TTL step per hop and no echo to A"""
+    async def scenario():
+        a, b, c = Node(), Node(), Node()
+        bridge_b = Bridge(b.links, listen=("127.0.0.1", 0))
+        await bridge_b.start()
+        bridge_a = Bridge(a.links, peers=[("127.0.0.1", bridge_b.port)])
+        bridge_c = Bridge(c.links, peers=[("127.0.0.1", bridge_b.port)])
+        await bridge_a.start()
+        await bridge_c.start()
+        await wait_for(lambda: len(a.links) == 1 and len(b.links) == 2 and len(c.links) == 1)
+
+        packet = PacketEncoder(SENDER_ID).encode(MessageType.MESSAGE, b"across the building")
+        assert a.links.enqueue(packet, Lane.USER) == 1
+        await wait_for(lambda: c.received)
+        await asyncio.sleep(0.1)
+
+        for bridge in (bridge_a, bridge_c, bridge_b):
+            await bridge.stop()
+        await wait_for(lambda: not len(b.links))
+        return a, b, c
+
+    a, b, c = asyncio.run(scenario())
+    ttl = parse_bitchat_packet(PacketEncoder(SENDER_ID).encode(MessageType.MESSAGE, b"x")).ttl
+    assert len(b.received) == 1 and b.received[0][0] == ttl
+    assert [hop_ttl for hop_ttl, _ in c.received] == [ttl - 1]
+    assert a.received == []  # Not echoed back over the link it came from
+    assert b.links.stats['echo_avoided'] == 1
+
+def test_rejects_non_bridge_peer():
+    """Connections that don't open with the bridge greeting are dropped"""
+    async def scenario():
+        node = Node()
+        bridge = Bridge(node.links, listen=("127.0.0.1", 0))
+        await bridge.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", bridge.port)
+        writer.write(b"GET / HTTP/1.1\r\n\r\n")
+        await writer.drain()
+        await reader.read()  # Closed by the bridge
+        writer.close()
+        await bridge.stop()
+        return bridge, node
+
+    bridge, node = asyncio.run(scenario())
+    assert bridge.stats['rejected'] == 1 and not len(node.links)
+
+def test_shared_secret():
+    """Only dialers with the listener's secret become links"""
+    async def scenario():
+        node = Node()
+        bridge = Bridge(node.links, listen=("127.0.0.1", 0), secret=b"north wing")
+        await bridge.start()
+        dialers = []
+        for secret in (b"south wing", None, b"north wing"):
+            dialer = Bridge(Node().links, peers=[("127.0.0.1", bridge.port)], secret=secret)
+            await dialer.start()
+            dialers.append(dialer)
+        await wait_for(lambda: len(node.links) == 1 and bridge.stats['rejected'] == 2)
+        for dialer in dialers:
+            await dialer.stop()
+        await bridge.stop()
+        return bridge, dialers
+
+    bridge, dialers = asyncio.run(scenario())
+    assert bridge.stats['accepted'] == 1
+    assert [dialer.stats['dialed'] for dialer in dialers] == [0, 0, 1]
+
+def test_inbound_rate_limit():
+    """Frames beyond the burst are dropped until tokens refill"""
+    async def scenario():
+        reader = asyncio.StreamReader()
+        for i in range(5):
+            reader.feed_data(FRAME_HEADER.pack(1) + bytes([i]))
+        reader.feed_eof()
+
+        class Writer:
+            def is_closing(self):
+                return False
+
+            def close(self):
+                pass
+
+        delivered = []
+
+        async def deliver(link, data):
+            delivered.append(data)
+
+        link = BridgeLink("test", reader, Writer(), receive_rate=1.0, receive_burst=3.0, clock=lambda: 0.0)
+        await link.read_frames(deliver)
+        return link, delivered
+
+    link, delivered = asyncio.run(scenario())
+    assert delivered == [b"\x00", b"\x01", b"\x02"]
+    assert link.stats['rate_limited'] == 2
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Bridge Test")
+    print("=" * 60)
+
+    for test in (test_parse_endpoint, test_relay_across_bridges, test_rejects_non_bridge_peer,
+                 test_shared_secret, test_inbound_rate_limit):
+        test()
+        print(f"✓ {test.__name__}")
+
+    print("=" * 60)
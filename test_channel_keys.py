@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""
+Test script for lazy, cached channel key derivation
+"""
+
+import os
+import asyncio
+import tempfile
+
+from encryption import EncryptionService
+from channel_keys import ChannelKeyStore
+from persistence import get_channel_key_cache_path
+
+IDENTITY_KEY = list(range(32))
+
+def with_temp_home(test):
+    """Run a test with the state directory in a scratch home"""
+    def wrapper():
+        old_home = os.environ.get("HOME")
+        with tempfile.TemporaryDirectory() as home:
+            os.environ["HOME"] = home
+            try:
+                test()
+            finally:
+                if old_home is None:
+                    del os.environ["HOME"]
+                else:
+                    os.environ["HOME"] = old_home
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+@with_temp_home
+def test_saved_passwords_derive_lazily_once():
+    """Saved passwords are derived on first use, once, off the event loop"""
+    async def main():
+        store = ChannelKeyStore()
+        store.load_cache(IDENTITY_KEY)
+        assert not store.add_password("#secret", "hunter22")
+        assert "#secret" in store and store.get("#secret") is None and store.stats['derived'] == 0
+        
+        keys = await asyncio.gather(*(store.ensure("#secret") for _ in range(3)))
+        store.shutdown()
+        return store, keys
+    
+    store, keys = asyncio.run(main())
+    expected = EncryptionService.derive_channel_key("hunter22", "#secret")
+    assert keys == [expected] * 3
+    assert store["#secret"] == expected and store.stats['derived'] == 1
+
+@with_temp_home
+def test_cache_survives_restart():
+    """A restart gets keys from the encrypted cache unless the password changed"""
+    async def main():
+        store = ChannelKeyStore()
+        store.load_cache(IDENTITY_KEY)
+        key = await store.derive("#secret", "hunter22")
+        store.set("#secret", key, "hunter22")
+        store.shutdown()
+        return key
+    
+    key = asyncio.run(main())
+    assert key.hex().encode() not in get_channel_key_cache_path().read_bytes()
+    
+    restarted = ChannelKeyStore()
+    restarted.load_cache(IDENTITY_KEY)
+    assert restarted.add_password("#secret", "hunter22") and restarted["#secret"] == key
+    
+    changed = ChannelKeyStore()
+    changed.load_cache(IDENTITY_KEY)
+    assert not changed.add_password("#secret", "new-password")
+    
+    # Another identity can't read the cache at all
+    stranger = ChannelKeyStore()
+    stranger.load_cache(list(range(1, 33)))
+    assert not stranger.add_password("#secret", "hunter22")
+    
+    restarted.pop("#secret")
+    again = ChannelKeyStore()
+    again.load_cache(IDENTITY_KEY)
+    assert not again.add_password("#secret", "hunter22")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Channel Key Store Test")
+    print("=" * 60)
+    
+    for test in (test_saved_passwords_derive_lazily_once, test_cache_survives_restart):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+Test script for payload compression formats and dictionary training
+"""
+
+import random
+
+import lz4.block
+import lz4.frame
+import pytest
+
+from compression import (
+    compress_if_beneficial, decompress, compress_with_dictionary, register_dictionary, decompression_stats,
+    DecompressionLimitExceeded, DEFAULT_DICTIONARY_ID, DICTIONARY_MAGIC, DICTIONARIES, LZ4_FRAME_MAGIC
+)
+from train_dictionary import train_dictionary
+
+WORDS = "hey where are you meeting at the park see you soon on my way anyone going to the market tonight".split()
+
+def make_corpus(count: int, seed: int):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 20))).encode() for _ in range(count)]
+
+@pytest.fixture(autouse=True)
+def restore_dictionaries():
+    """Undo dictionaries registered by a test"""
+    saved = dict(DICTIONARIES)
+    yield
+    DICTIONARIES.clear()
+    DICTIONARIES.update(saved)
+
+def test_default_is_frame_format():
+    """Without compact formats only lz4.frame is sent, and only for longer payloads"""
+    message = b"anyone here? on my way, see you soon"
+    assert compress_if_beneficial(message) == (message, False)
+    
+    data = b"anyone here? on my way, see you soon. " * 10
+    compressed, is_compressed = compress_if_beneficial(data)
+    assert is_compressed and compressed.startswith(LZ4_FRAME_MAGIC)
+    assert lz4.frame.decompress(compressed) == data
+
+def test_short_messages_use_dictionary():
+    """Short chat messages shrink with the shared dictionary and round trip"""
+    message = b"anyone here? on my way, see you soon"
+    compressed, is_compressed = compress_if_beneficial(message, compact=True)
+    assert is_compressed
+    assert compressed.startswith(DICTIONARY_MAGIC)
+    assert compressed[2] == DEFAULT_DICTIONARY_ID
+    assert decompress(compressed) == message
+    
+    # Without a dictionary the same message is too short to bother
+    assert compress_if_beneficial(message, compact=True, dictionary_id=None) == (message, False)
+
+def test_block_and_frame_formats_still_decode():
+    """Plain blocks are used when they beat the dictionary and both decode"""
+    data = bytes(range(64)) * 20
+    compressed, is_compressed = compress_if_beneficial(data, compact=True)
+    assert is_compressed
+    assert decompress(compressed) == data
+    assert decompress(lz4.block.compress(data, store_size=True)) == data
+
+def test_unknown_dictionary_is_rejected():
+    """Payloads referencing a dictionary we don't have fail cleanly"""
+    register_dictionary(200, b"see you soon at the park")
+    compressed = compress_with_dictionary(b"see you soon at the park tonight", 200)
+    assert decompress(compressed) == b"see you soon at the park tonight"
+    
+    unknown = compressed[:2] + bytes((201,)) + compressed[3:]
+    try:
+        decompress(unknown)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+def test_trained_dictionary_beats_no_dictionary():
+    """A dictionary trained on one half of a corpus compresses the other half"""
+    dictionary = train_dictionary(make_corpus(500, seed=1), size=1024)
+    assert 0 < len(dictionary) <= 1024
+    register_dictionary(201, dictionary)
+    
+    test = make_corpus(100, seed=2)
+    plain = sum(len(lz4.block.compress(sample, store_size=True)) for sample in test)
+    trained = sum(len(compress_with_dictionary(sample, 201)) for sample in test)
+    assert trained < plain * 0.8
+
+def test_decompression_is_bounded():
+    """Payloads inflating past the cap are rejected in every format"""
+    bombs = (
+        lz4.frame.compress(bytes(1 << 20)),
+        lz4.block.compress(bytes(1 << 20), store_size=True),
+        compress_with_dictionary(bytes(60000)),
+    )
+    for bomb in bombs:
+        rejected = decompression_stats['rejected_oversize']
+        try:
+            decompress(bomb, max_size=4096)
+            assert False, "expected DecompressionLimitExceeded"
+        except DecompressionLimitExceeded:
+            pass
+        assert decompression_stats['rejected_oversize'] == rejected + 1
+    
+    # Truncated frames are corrupt, not oversize
+    rejected = decompression_stats['rejected_corrupt']
+    try:
+        decompress(lz4.frame.compress(bytes(1000))[:-6])
+        assert False, "expected ValueError"
+    except DecompressionLimitExceeded:
+        assert False, "truncated frame counted as oversize"
+    except ValueError:
+        pass
+    assert decompression_stats['rejected_corrupt'] == rejected + 1
+    assert decompress(bombs[0], max_size=1 << 20) == bytes(1 << 20)
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Compression Test")
+    print("=" * 60)
+    
+    for test in (test_default_is_frame_format, test_short_messages_use_dictionary, test_block_and_frame_formats_still_decode,
+                 test_unknown_dictionary_is_rejected, test_trained_dictionary_beats_no_dictionary,
+                 test_decompression_is_bounded):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Test script for delivery tracking, resend backoff and bounded ACK memory
+"""
+
+from bitchat import (
+    DeliveryTracker, DELIVERY_TIMEOUT, DELIVERY_BACKOFF, PUBLIC_DELIVERY_TIMEOUT, SENT_ACKS_LIMIT,
+    create_bitchat_message_payload_full, parse_bitchat_message_payload
+)
+
+PEER_ID = "abcd1234567890ef"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+def test_deadlines_pop_in_order():
+    """Only messages past their deadline are returned, ACKed ones never are"""
+    clock = FakeClock()
+    tracker = DeliveryTracker(clock)
+    tracker.track_message("dm", "hi", True, PEER_ID, "bob")
+    tracker.track_message("acked", "hi again", True, PEER_ID, "bob")
+    tracker.track_message("public", "hello all", False)
+    assert tracker.mark_delivered("acked")
+    assert not tracker.mark_delivered("acked")
+    
+    assert tracker.pop_due() == []
+    clock.now += DELIVERY_TIMEOUT
+    assert [entry.message_id for entry in tracker.pop_due()] == ["dm"]
+    clock.now += PUBLIC_DELIVERY_TIMEOUT
+    assert [entry.message_id for entry in tracker.pop_due()] == ["public"]
+    assert not tracker.pending_messages
+
+def test_reschedule_backs_off():
+    """Each resend waits twice as long and stale heap entries are skipped"""
+    clock = FakeClock()
+    tracker = DeliveryTracker(clock)
+    tracker.track_message("dm", "hi", True, PEER_ID, "bob")
+    
+    clock.now += DELIVERY_TIMEOUT
+    entry, = tracker.pop_due()
+    tracker.reschedule(entry)
+    assert entry.attempts == 2
+    assert entry.deadline == clock.now + DELIVERY_TIMEOUT * DELIVERY_BACKOFF
+    
+    clock.now += DELIVERY_TIMEOUT
+    assert tracker.pop_due() == []
+    clock.now += DELIVERY_TIMEOUT
+    assert tracker.pop_due() == [entry]
+
+def test_postpone_keeps_attempts():
+    """A message that couldn't be sent comes back later without using up an attempt"""
+    clock = FakeClock()
+    tracker = DeliveryTracker(clock)
+    tracker.track_message("dm", "hi", True, PEER_ID, "bob")
+    
+    for _ in range(10):
+        clock.now += DELIVERY_TIMEOUT
+        entry, = tracker.pop_due()
+        tracker.postpone(entry)
+    assert entry.attempts == 1
+    assert entry.deadline == clock.now + DELIVERY_TIMEOUT
+
+def test_sent_acks_are_bounded():
+    """ACK memory is capped and keeps the most recently used IDs"""
+    tracker = DeliveryTracker()
+    assert tracker.should_send_ack("first")
+    for i in range(SENT_ACKS_LIMIT - 1):
+        tracker.should_send_ack(f"ack{i}")
+    assert not tracker.should_send_ack("first")
+    tracker.should_send_ack("one more")
+    assert len(tracker.sent_acks) == SENT_ACKS_LIMIT
+    assert "first" in tracker.sent_acks
+    assert "ack0" not in tracker.sent_acks
+
+def test_resend_keeps_message_id():
+    """Resent payloads reuse the original message ID"""
+    payload, message_id = create_bitchat_message_payload_full("alice", "hi", None, True, PEER_ID, False, None)
+    resent, resent_id = create_bitchat_message_payload_full("alice", "hi", None, True, PEER_ID, False, None, message_id)
+    assert resent_id == message_id
+    assert parse_bitchat_message_payload(resent).id == message_id
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Delivery Tracker Test")
+    print("=" * 60)
+    
+    for test in (test_deadlines_pop_in_order, test_reschedule_backs_off, test_postpone_keeps_attempts,
+                 test_sent_acks_are_bounded, test_resend_keeps_message_id):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
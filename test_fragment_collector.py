@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+Test script for bounded fragment reassembly
+"""
+
+import asyncio
+import os
+
+from bitchat import BitchatClient, MessageType, PacketEncoder, parse_bitchat_packet, unpad_packet
+from fragmentation import (
+    FragmentCollector, FRAGMENT_HEADER, FRAGMENT_PACKET_OVERHEAD, fragment_payload, fragment_block_size,
+    fragment_chunk_size
+)
+
+SENDER_ID = "7e24c1f633915d33"
+FRAGMENT_ID = bytes(range(8))
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+def test_out_of_order_reassembly():
+    """Chunks land at their offsets regardless of arrival order"""
+    data = bytes(range(256)) * 3 + b"tail"
+    chunks = split(data, 100)
+    collector = FragmentCollector()
+    
+    order = [len(chunks) - 1] + list(range(len(chunks) - 1))[::-1]
+    results = [collector.add_fragment(FRAGMENT_ID, i, len(chunks), 4, chunks[i], SENDER_ID) for i in order]
+    
+    assert results[:-1] == [None] * (len(chunks) - 1)
+    assert results[-1] == (data, SENDER_ID)
+    assert not collector.partials
+    assert collector.total_bytes == 0
+    assert collector.stats['completed'] == 1
+
+def test_rejects_inconsistent_sets():
+    """Mismatched total, type, index or chunk size drops the set"""
+    collector = FragmentCollector()
+    collector.add_fragment(FRAGMENT_ID, 0, 3, 4, b"a" * 10, SENDER_ID)
+    assert collector.add_fragment(FRAGMENT_ID, 1, 4, 4, b"b" * 10, SENDER_ID) is None
+    assert not collector.partials
+    
+    collector.add_fragment(FRAGMENT_ID, 0, 3, 4, b"a" * 10, SENDER_ID)
+    assert collector.add_fragment(FRAGMENT_ID, 1, 3, 5, b"b" * 10, SENDER_ID) is None
+    assert not collector.partials
+    
+    collector.add_fragment(FRAGMENT_ID, 0, 3, 4, b"a" * 10, SENDER_ID)
+    assert collector.add_fragment(FRAGMENT_ID, 1, 3, 4, b"b" * 9, SENDER_ID) is None
+    assert not collector.partials
+    
+    assert collector.add_fragment(FRAGMENT_ID, 3, 3, 4, b"x", SENDER_ID) is None
+    assert collector.add_fragment(FRAGMENT_ID, 0, 0, 4, b"x", SENDER_ID) is None
+    assert collector.stats['rejected'] == 5
+    assert collector.total_bytes == 0
+
+def test_expires_incomplete_sets():
+    """A set missing a fragment is dropped after the timeout"""
+    clock = FakeClock()
+    collector = FragmentCollector(timeout=30, clock=clock)
+    collector.add_fragment(FRAGMENT_ID, 0, 2, 4, b"a" * 10, SENDER_ID)
+    
+    clock.now = 31
+    collector.expire()
+    assert not collector.partials
+    assert collector.total_bytes == 0
+    assert collector.stats['expired'] == 1
+
+def test_memory_caps_evict_oldest():
+    """Per-sender and global caps evict the least recently updated sets"""
+    collector = FragmentCollector(max_bytes_per_sender=250, max_bytes_total=350)
+    for n in range(3):
+        collector.add_fragment(bytes([n]) * 8, 0, 2, 4, b"a" * 50, SENDER_ID)
+    assert len(collector.partials) == 2
+    assert (SENDER_ID, bytes([0]) * 8) not in collector.partials
+    assert collector.bytes_by_sender[SENDER_ID] == 2 * (100 + 2)  # Buffer and received bitmap
+    
+    other = "abcd1234567890ef"
+    collector.add_fragment(FRAGMENT_ID, 0, 2, 4, b"b" * 100, other)
+    assert collector.total_bytes == 102 + 202
+    assert collector.bytes_by_sender[other] == 202
+    assert collector.stats['evicted'] == 2
+    
+    # A single set bigger than the cap is refused outright
+    assert collector.add_fragment(FRAGMENT_ID, 0, 10, 4, b"c" * 100, SENDER_ID) is None
+    assert (SENDER_ID, FRAGMENT_ID) not in collector.partials
+
+def test_empty_and_numerous_sets_are_bounded():
+    """Empty chunks never leave a set behind, and the number of sets is capped"""
+    collector = FragmentCollector(max_partials=4)
+    for n in range(100):
+        assert collector.add_fragment(n.to_bytes(8, 'big'), 0, 65535, 4, b"", SENDER_ID) is None
+    assert not collector.partials and collector.total_bytes == 0
+    assert collector.stats['rejected'] == 100
+    
+    for n in range(10):
+        collector.add_fragment(n.to_bytes(8, 'big'), 1, 1000, 4, b"x" * 10, SENDER_ID)
+    assert len(collector.partials) == 4 and collector.stats['evicted'] == 6
+    assert collector.total_bytes == sum(partial.size for partial in collector.partials.values())
+    
+    # A bitmap alone can exceed the caps
+    small = FragmentCollector(max_bytes_per_sender=1000)
+    assert small.add_fragment(FRAGMENT_ID, 0, 5000, 4, b"x", SENDER_ID) is None
+    assert not small.partials and small.total_bytes == 0
+
+def test_fragments_fill_padding_blocks():
+    """Fragment packets fill one padding block, stay validly padded and reassemble to the original"""
+    assert fragment_block_size(None) == 256
+    assert fragment_block_size(185) == 256
+    assert fragment_block_size(517) == 512
+    assert FRAGMENT_PACKET_OVERHEAD + fragment_chunk_size(185) <= 185 - 3
+    
+    encoder = PacketEncoder(SENDER_ID)
+    for size in (1500, 1563):  # 1563 leaves a last chunk the encoder would not pad
+        original = encoder.encode(MessageType.MESSAGE, os.urandom(size))
+        for mtu in (None, 185, 517):
+            fragments = fragment_payload(original, original[1], fragment_chunk_size(mtu))
+            collector = FragmentCollector()
+            result = None
+            for fragment in fragments:
+                raw = encoder.encode(MessageType(fragment.fragment_type), fragment.to_payload())
+                if fragment.index < fragment.total - 1:
+                    assert len(raw) == fragment_block_size(mtu)
+                
+                # A receiver stripping PKCS#7 padding must only remove padding
+                unpadded = unpad_packet(raw)
+                assert len(unpadded) == FRAGMENT_PACKET_OVERHEAD + len(fragment.data)
+                packet = parse_bitchat_packet(unpadded)
+                fragment_id, index, total, original_type = FRAGMENT_HEADER.unpack_from(packet.payload)
+                result = collector.add_fragment(fragment_id, index, total, original_type,
+                                                packet.payload[FRAGMENT_HEADER.size:], packet.sender_id_str)
+            assert result == (original, SENDER_ID)
+
+def test_packet_within_one_chunk_goes_out_whole():
+    """A packet over the fragmentation threshold that fits one chunk at a large MTU isn't split"""
+    class Links:
+        connected = True
+        
+        def __init__(self):
+            self.sent = []
+        
+        def mtu(self, exclude=None):
+            return 1100
+        
+        def enqueue(self, packet, lane, exclude=None):
+            self.sent.append(packet)
+            return 1
+        
+        def enqueue_group(self, packets, lane, exclude=None):
+            raise AssertionError("packet was fragmented")
+    
+    client = BitchatClient()
+    client.links = Links()
+    packet = PacketEncoder(SENDER_ID).encode(MessageType.MESSAGE, os.urandom(600))
+    assert 500 < len(packet) <= fragment_chunk_size(1100)
+    asyncio.run(client.send_packet(packet))
+    assert client.links.sent == [packet]
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Fragment Collector Test")
+    print("=" * 60)
+    
+    for test in (test_out_of_order_reassembly, test_rejects_inconsistent_sets,
+                 test_expires_incomplete_sets, test_memory_caps_evict_oldest, test_empty_and_numerous_sets_are_bounded,
+                 test_fragments_fill_padding_blocks, test_packet_within_one_chunk_goes_out_whole):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
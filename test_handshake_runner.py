@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Test script for running Noise handshakes off the event loop
+"""
+
+import asyncio
+import threading
+import time
+
+from encryption import EncryptionService
+from handshake_runner import HandshakeRunner
+
+class SlowService:
+    """Stand-in service whose handshake steps take a while and record their order"""
+
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _step(self, peer_id, label):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+            self.calls.append((peer_id, label))
+        return label
+
+    def initiate_handshake(self, peer_id, keep_session=False):
+        return self._step(peer_id, b"init")
+
+    def process_handshake_message(self, peer_id, message):
+        return self._step(peer_id, message)
+
+def test_full_handshake_through_runner():
+    """Two services complete an XX handshake with every step on a worker thread"""
+    async def main():
+        alice, bob = EncryptionService(), EncryptionService()
+        alice_runner, bob_runner = HandshakeRunner(alice), HandshakeRunner(bob)
+        message1 = await alice_runner.initiate("b")
+        message2 = await bob_runner.process("a", message1)
+        message3 = await alice_runner.process("b", message2)
+        assert await bob_runner.process("a", message3) is None
+        for runner in (alice_runner, bob_runner):
+            runner.shutdown()
+        return alice, bob, alice_runner
+    
+    alice, bob, runner = asyncio.run(main())
+    assert alice.is_session_established("b") and bob.is_session_established("a")
+    assert runner.stats['steps'] == 2 and runner.stats['worker_seconds'] > 0
+
+def test_concurrency_budget_and_peer_order():
+    """Steps never exceed the budget and run in submission order per peer"""
+    async def main():
+        service = SlowService()
+        runner = HandshakeRunner(service, max_concurrent=2)
+        tasks = []
+        for peer in ("p1", "p2", "p3", "p4"):
+            tasks.append(runner.initiate(peer))
+            for i in range(3):
+                tasks.append(runner.process(peer, f"m{i}".encode()))
+        await asyncio.gather(*tasks)
+        runner.shutdown()
+        return service, runner
+    
+    service, runner = asyncio.run(main())
+    assert service.peak <= 2
+    assert runner.stats['peak_concurrent'] == 2 and runner.stats['queued'] > 0
+    for peer in ("p1", "p2", "p3", "p4"):
+        assert [label for p, label in service.calls if p == peer] == [b"init", b"m0", b"m1", b"m2"]
+    assert not runner._peers
+
+def test_failures_propagate():
+    """A failing step raises in the caller and is counted"""
+    async def main():
+        runner = HandshakeRunner(EncryptionService())
+        try:
+            await runner.process("a", b"\x00" * 8)
+            assert False, "expected NoiseError"
+        except Exception as e:
+            assert type(e).__name__ == "NoiseError"
+        runner.shutdown()
+        return runner
+    
+    assert asyncio.run(main()).stats['failed'] == 1
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Handshake Runner Test")
+    print("=" * 60)
+    
+    for test in (test_full_handshake_through_runner, test_concurrency_budget_and_peer_order,
+                 test_failures_propagate):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
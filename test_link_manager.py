@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""
+Test script for multi-link fan-out and failover
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from link_manager import LinkManager, DeviceProfileCache
+from send_scheduler import Lane, LinkClosed
+
+CHARACTERISTIC_UUID = "a1b2c3d4-e5f6-4a5b-8c9d-0e1f2a3b4c5d"
+
+class FakeServices(list):
+    """Service collection with bleak's lookup by handle"""
+
+    def get_characteristic(self, handle):
+        for service in self:
+            for char in service.characteristics:
+                if char.handle == handle:
+                    return char
+        return None
+
+class FakeClient:
+    """Stands in for BleakClient, recording writes"""
+    handle = 42
+
+    def __init__(self, address, disconnected_callback=None, **options):
+        self.address = address
+        self.disconnected_callback = disconnected_callback
+        self.options = options
+        self.is_connected = False
+        self.mtu_size = 185 if address == "small" else 512
+        self.written = []
+        self.notify = None
+        other = SimpleNamespace(uuid="00002a00-0000-1000-8000-00805f9b34fb", handle=3)
+        characteristic = SimpleNamespace(uuid=CHARACTERISTIC_UUID.upper(), handle=self.handle)
+        self.services = FakeServices([SimpleNamespace(characteristics=[other, characteristic])])
+
+    async def connect(self):
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def start_notify(self, characteristic, callback):
+        self.notify = callback
+
+    async def write_gatt_char(self, characteristic, data, response=False):
+        if not self.is_connected:
+            raise Exception("Not connected")
+        self.written.append(data)
+
+    def drop(self):
+        self.is_connected = False
+        self.disconnected_callback(self)
+
+def make_manager(received, lost, max_links=4):
+    async def on_data(data, source):
+        received.append((data, source))
+
+    return LinkManager(CHARACTERISTIC_UUID, on_data, lambda link: lost.append(link.address),
+                       max_links=max_links, client_factory=FakeClient)
+
+def test_fan_out_skips_source():
+    """Packets go out on every link except the one they arrived on"""
+    received, lost = [], []
+
+    async def scenario():
+        manager = make_manager(received, lost)
+        links = [await manager.connect(address) for address in ("a", "b", "c")]
+        await links[1].client.notify(None, b"from b")
+        assert manager.enqueue(b"relay", Lane.BULK, exclude="b") == 2
+        assert manager.enqueue(b"own", Lane.USER) == 3
+        await manager.flush(1.0)
+        await manager.close()
+        return manager, links
+
+    manager, links = asyncio.run(scenario())
+    assert received == [(b"from b", "b")]
+    # Each link drains its own priority lanes, so the user packet overtakes the relay
+    assert links[0].client.written == [b"own", b"relay"]
+    assert links[1].client.written == [b"own"]
+    assert links[2].client.written == [b"own", b"relay"]
+    assert manager.stats['echo_avoided'] == 1
+    assert manager.stats['fanout_writes'] == 5
+    assert lost == []
+
+def test_failover_keeps_other_links():
+    """Losing one link drops only that link and reports it once"""
+    received, lost = [], []
+
+    async def scenario():
+        manager = make_manager(received, lost)
+        a = await manager.connect("a")
+        b = await manager.connect("b")
+        a.client.drop()
+        a.client.drop()  # bleak may report the same disconnect again
+        assert manager.connected and len(manager) == 1
+        assert manager.enqueue(b"after", Lane.USER) == 1
+        await manager.flush(1.0)
+
+        # A write that finds the link gone is handled the same way, and isn't taken for a send
+        b.client.is_connected = False
+        try:
+            await b.write(b"lost")
+        except LinkClosed:
+            pass
+        else:
+            raise AssertionError("write to a lost link succeeded")
+        assert not manager.connected and len(manager) == 0
+        await manager.close()
+        return a, b
+
+    a, b = asyncio.run(scenario())
+    assert lost == ["a", "b"]
+    assert a.client.written == []
+    assert b.client.written == [b"after"]
+
+def test_link_limit_and_mtu():
+    """No more than max_links links, and fragments fit the smallest MTU"""
+    async def scenario():
+        manager = make_manager([], [], max_links=2)
+        await manager.connect("big")
+        await manager.connect("small")
+        assert manager.full
+        try:
+            await manager.connect("third")
+            assert False, "expected the link limit to apply"
+        except RuntimeError:
+            pass
+        assert await manager.connect("big") is manager.links["big"]
+        mtus = manager.mtu(), manager.mtu(exclude="small")
+        await manager.close()
+        return mtus
+
+    assert asyncio.run(scenario()) == (185, 512)
+
+def test_profile_cache_skips_discovery():
+    """Reconnects use the cached handle and MTU, and a stale handle falls back to discovery"""
+    class UnnegotiatedClient(FakeClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.mtu_size = 23  # What BlueZ reports before the MTU is read
+
+    async def scenario(factory, profiles):
+        manager = LinkManager(CHARACTERISTIC_UUID, None, max_links=1, client_factory=factory,
+                              service_uuid="f47b5e2d-4a9e-4c5a-9b3f-8e1d2c3a4b5c", profiles=profiles)
+        link = await manager.connect("a")
+        result = link.client.options, link.mtu, link.characteristic.handle
+        await manager.close()
+        return result
+
+    profiles = DeviceProfileCache(persist=False)
+    options, mtu, handle = asyncio.run(scenario(FakeClient, profiles))
+    assert options == {'services': ["f47b5e2d-4a9e-4c5a-9b3f-8e1d2c3a4b5c"]}
+    assert profiles.get("a") == {'handle': 42, 'mtu': 512, 'updated': profiles.get("a")['updated']}
+    assert profiles.stats['misses'] == 1
+
+    # The backend doesn't know the MTU yet, the profile does
+    options, mtu, handle = asyncio.run(scenario(UnnegotiatedClient, profiles))
+    assert options['winrt'] == {'use_cached_services': True}
+    assert (mtu, handle) == (512, 42) and profiles.stats['hits'] == 1
+
+    # Firmware update moved the characteristic
+    class MovedClient(FakeClient):
+        handle = 57
+
+    options, mtu, handle = asyncio.run(scenario(MovedClient, profiles))
+    assert handle == 57 and profiles.stats['stale'] == 1
+    assert profiles.get("a")['handle'] == 57
+
+    profiles.max_age = -1
+    assert profiles.get("a") is None
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Link Manager Test")
+    print("=" * 60)
+
+    for test in (test_fan_out_skips_source, test_failover_keeps_other_links, test_link_limit_and_mtu,
+                 test_profile_cache_skips_discovery):
+        test()
+        print(f"✓ {test.__name__}")
+
+    print("=" * 60)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Test script for the windowed message dedup cache
+"""
+
+import os
+import tempfile
+import uuid
+
+from dedup import MessageDedup, MAX_CAPACITY
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+    
+    def __call__(self):
+        return self.now
+
+def new_id() -> bytes:
+    return str(uuid.uuid4()).upper().encode()
+
+def test_detects_duplicates():
+    """The first sighting is new, later ones are duplicates"""
+    dedup = MessageDedup()
+    message_id = new_id()
+    assert dedup.add(message_id)
+    assert not dedup.add(message_id)
+    assert not dedup.add(memoryview(message_id))
+    assert message_id in dedup
+    
+    false_positives = sum(not dedup.add(new_id()) for _ in range(1000))
+    assert false_positives <= 5
+
+def test_forgets_after_two_windows():
+    """IDs survive one rotation and are gone after the second"""
+    clock = FakeClock()
+    dedup = MessageDedup(window=60, clock=clock)
+    message_id = new_id()
+    dedup.add(message_id)
+    
+    clock.now += 61
+    assert not dedup.add(message_id)
+    clock.now += 61
+    dedup.add(new_id())
+    clock.now += 61
+    assert dedup.add(message_id)
+
+def test_memory_is_bounded():
+    """Generation size is capped however high the message rate"""
+    clock = FakeClock()
+    dedup = MessageDedup(window=60, clock=clock)
+    for _ in range(3):
+        for _ in range(5000):
+            dedup.add(new_id())
+        clock.now += 1
+    assert dedup.current.capacity <= MAX_CAPACITY
+    assert dedup.current.capacity > 5000
+
+def test_save_and_restore():
+    """Saved IDs are still duplicates after a restart, unless they are too old"""
+    clock = FakeClock()
+    dedup = MessageDedup(window=60, clock=clock)
+    message_id = new_id()
+    dedup.add(message_id)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dedup.bin")
+        dedup.save(path)
+        
+        restored = MessageDedup.load(path, window=60, clock=clock)
+        assert not restored.add(message_id)
+        
+        clock.now += 121
+        assert MessageDedup.load(path, window=60, clock=clock).add(message_id)
+        
+        assert MessageDedup.load(os.path.join(tmp, "missing.bin")).add(message_id)
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Message Dedup Test")
+    print("=" * 60)
+    
+    for test in (test_detects_duplicates, test_forgets_after_two_windows,
+                 test_memory_is_bounded, test_save_and_restore):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
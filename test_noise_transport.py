@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Test script for Noise transport encryption after the XX handshake
+"""
+
+import hashlib
+
+from encryption import EncryptionService
+
+ALICE_ID = "7e24c1f633915d33"
+BOB_ID = "abcd1234567890ef"
+
+def establish():
+    """Run a full XX handshake between two services"""
+    alice, bob = EncryptionService(), EncryptionService()
+    message1 = alice.initiate_handshake(BOB_ID)
+    message2 = bob.process_handshake_message(ALICE_ID, message1)
+    message3 = alice.process_handshake_message(BOB_ID, message2)
+    assert bob.process_handshake_message(ALICE_ID, message3) is None
+    assert alice.is_session_established(BOB_ID) and bob.is_session_established(ALICE_ID)
+    return alice, bob
+
+def test_fingerprint_computed_at_establishment():
+    """Session fingerprints match the hash of the peer's static key"""
+    alice, bob = establish()
+    assert alice.get_peer_fingerprint(BOB_ID) == hashlib.sha256(bob.get_public_key_bytes()).hexdigest()
+    assert bob.get_peer_fingerprint(ALICE_ID) == alice.get_identity_fingerprint()
+    assert alice.get_peer_fingerprint("unknown") is None
+
+def test_batch_matches_single_messages():
+    """Batches use consecutive nonces and interleave with single messages"""
+    alice, bob = establish()
+    messages = [f"message {i}".encode() for i in range(5)]
+    
+    ciphertexts = alice.encrypt_many_for_peer(BOB_ID, messages[:3])
+    ciphertexts.append(alice.encrypt_for_peer(BOB_ID, messages[3]))
+    ciphertexts += alice.encrypt_many_for_peer(BOB_ID, messages[4:])
+    
+    assert bob.decrypt_from_peer(ALICE_ID, ciphertexts[0]) == messages[0]
+    assert bob.decrypt_many_from_peer(ALICE_ID, ciphertexts[1:]) == messages[1:]
+
+def test_batch_decrypt_survives_bad_message():
+    """A tampered message decrypts to None without desyncing the rest"""
+    alice, bob = establish()
+    messages = [b"first", b"second", b"third"]
+    ciphertexts = alice.encrypt_many_for_peer(BOB_ID, messages)
+    ciphertexts[1] = bytes([ciphertexts[1][0] ^ 1]) + ciphertexts[1][1:]
+    
+    assert bob.decrypt_many_from_peer(ALICE_ID, ciphertexts) == [b"first", None, b"third"]
+    assert bob.decrypt_from_peer(ALICE_ID, alice.encrypt_for_peer(BOB_ID, b"fourth")) == b"fourth"
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Noise Transport Test")
+    print("=" * 60)
+    
+    for test in (test_fingerprint_computed_at_establishment, test_batch_matches_single_messages,
+                 test_batch_decrypt_survives_bad_message):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
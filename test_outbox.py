@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Test script for the store-and-forward outbox
+"""
+
+import os
+import tempfile
+
+from outbox import Outbox
+
+IDENTITY_KEY = list(range(32))
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_fifo_and_kinds():
+    """Entries come back oldest first and can be split into public and private"""
+    outbox = Outbox(":memory:", clock=FakeClock())
+    outbox.add("m1", "hello")
+    outbox.add("m2", "psst", peer_id="7e24c1f633915d33", nickname="alice")
+    outbox.add("m3", "in a channel", channel="#team")
+
+    assert [e.message_id for e in outbox.entries()] == ["m1", "m2", "m3"]
+    assert [e.message_id for e in outbox.entries(private=False)] == ["m1", "m3"]
+    private = outbox.entries(private=True)
+    assert len(private) == 1 and private[0].is_private and private[0].nickname == "alice"
+    assert outbox.entries(private=False)[1].channel == "#team"
+    assert len(outbox.entries(limit=2)) == 2
+
+    outbox.remove(outbox.entries()[0].id)
+    outbox.remove_message("m2")
+    assert [e.message_id for e in outbox.entries()] == ["m3"]
+    assert outbox.stats['sent'] == 2
+
+def test_expiry_limit_and_metrics():
+    """Old entries expire, overflow drops the oldest and depth/age track the queue"""
+    clock = FakeClock()
+    outbox = Outbox(":memory:", ttl=60, limit=3, clock=clock)
+    assert outbox.depth() == 0 and outbox.oldest_age() is None
+
+    outbox.add("old", "first")
+    clock.now += 30
+    for i in range(3):
+        outbox.add(f"new{i}", "later")
+    assert outbox.stats['dropped'] == 1
+    assert [e.message_id for e in outbox.entries()] == ["new0", "new1", "new2"]
+    assert outbox.depth() == 3 and outbox.oldest_age() == 0
+
+    clock.now += 45
+    assert outbox.oldest_age() == 45
+    clock.now += 15
+    assert outbox.entries() == [] and outbox.stats['expired'] == 3
+
+    outbox.add("dm", "hi", peer_id="aa")
+    outbox.discard_peer("aa")
+    assert outbox.depth() == 0 and outbox.stats['dropped'] == 2
+
+def test_durable_and_encrypted():
+    """Entries survive reopening, are encrypted on disk and unreadable under another identity"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "outbox.db")
+        outbox = Outbox(path, IDENTITY_KEY)
+        outbox.add("m1", "meet at the north door", peer_id="7e24c1f633915d33", nickname="bob")
+        outbox.close()
+
+        with open(path, "rb") as f:
+            assert b"north door" not in f.read()
+        assert os.stat(path).st_mode & 0o077 == 0
+
+        reopened = Outbox(path, IDENTITY_KEY)
+        entries = reopened.entries()
+        assert len(entries) == 1 and entries[0].content == "meet at the north door"
+        reopened.close()
+
+        other = Outbox(path, list(range(1, 33)))
+        assert other.entries() == [] and other.depth() == 1
+        other.close()
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Outbox Test")
+    print("=" * 60)
+
+    for test in (test_fifo_and_kinds, test_expiry_limit_and_metrics, test_durable_and_encrypted):
+        test()
+        print(f"✓ {test.__name__}")
+
+    print("=" * 60)
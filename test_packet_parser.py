@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+Test script for the lazy BitChat packet parser
+"""
+
+import lz4.frame
+
+from bitchat import (
+    MessageType, PacketEncoder, FLAG_IS_COMPRESSED, BROADCAST_RECIPIENT, parse_bitchat_packet, parse_bitchat_message_payload,
+    create_bitchat_packet, create_bitchat_packet_with_recipient, create_bitchat_message_payload_full
+)
+from compression import LZ4_FRAME_MAGIC
+
+SENDER_ID = "7e24c1f633915d33"
+RECIPIENT_ID = "abcd1234567890ef"
+
+def test_broadcast_round_trip():
+    """Broadcast packets carry the broadcast recipient and the original payload"""
+    raw = create_bitchat_packet(SENDER_ID, MessageType.ANNOUNCE, b"alice")
+    packet = parse_bitchat_packet(raw)
+    
+    assert packet.msg_type == MessageType.ANNOUNCE
+    assert packet.ttl == 7
+    assert packet.sender_id_str == SENDER_ID
+    assert packet.recipient_id == BROADCAST_RECIPIENT
+    assert packet.payload == b"alice"
+    assert packet.signature is None
+
+def test_recipient_and_signature():
+    """Targeted packets expose recipient and signature lazily"""
+    signature = bytes(range(64))
+    raw = create_bitchat_packet_with_recipient(
+        SENDER_ID, RECIPIENT_ID, MessageType.NOISE_IDENTITY_ANNOUNCE, b"\x01" * 40, signature
+    )
+    packet = parse_bitchat_packet(raw)
+    
+    assert packet.recipient_id_str == RECIPIENT_ID
+    assert bytes(packet.payload_view) == b"\x01" * 40
+    assert packet.signature == signature
+
+def test_memoryview_input():
+    """The parser accepts memoryviews without copying the buffer first"""
+    raw = create_bitchat_packet(SENDER_ID, MessageType.MESSAGE, b"hello")
+    packet = parse_bitchat_packet(memoryview(raw))
+    
+    assert packet.sender_id_str == SENDER_ID
+    assert packet.payload == b"hello"
+
+def test_rejects_invalid_packets():
+    """Short packets, unknown versions and unknown types are rejected"""
+    raw = bytearray(create_bitchat_packet(SENDER_ID, MessageType.MESSAGE, b"hello"))
+    
+    for bad in (bytes(raw[:10]), bytes([2]) + bytes(raw[1:]), bytes(raw[:1]) + b"\xee" + bytes(raw[2:])):
+        try:
+            parse_bitchat_packet(bad)
+        except ValueError:
+            continue
+        raise AssertionError("invalid packet was accepted")
+
+def test_message_two_stage_decode():
+    """The message ID is usable for dedup before the body is decoded"""
+    payload, message_id = create_bitchat_message_payload_full(
+        "alice", "hello wörld", "#general", False, SENDER_ID, False, None
+    )
+    message = parse_bitchat_message_payload(payload)
+    seen = {message_id.encode()}
+    
+    assert message.id_view in seen
+    assert not message._decoded
+    assert message.id == message_id
+    assert message.content == "hello wörld"
+    assert message.channel == "#general"
+    assert message.sender == "alice"
+    assert not message.is_encrypted
+
+def test_compression_policy():
+    """Long messages are compressed on encode, Noise payloads never are"""
+    encoder = PacketEncoder(SENDER_ID)
+    text = ("the quick brown fox jumps over the lazy dog " * 10).encode()
+    
+    raw = encoder.encode(MessageType.MESSAGE, text)
+    packet = parse_bitchat_packet(raw)
+    assert packet.flags & FLAG_IS_COMPRESSED
+    assert len(packet.payload_view) < len(text)
+    assert packet.payload == text
+    assert encoder.compression_stats['bytes_saved'] == len(text) - len(packet.payload_view)
+    assert bytes(packet.payload_view[:4]) == LZ4_FRAME_MAGIC  # What other clients decode
+    
+    noise = parse_bitchat_packet(encoder.encode(MessageType.NOISE_ENCRYPTED, text, RECIPIENT_ID))
+    assert not noise.flags & FLAG_IS_COMPRESSED
+    assert not parse_bitchat_packet(encoder.encode(MessageType.MESSAGE, b"short")).is_compressed
+
+def test_decompresses_frame_format():
+    """Payloads compressed with lz4.frame by older clients still decode"""
+    text = ("hello mesh " * 40).encode()
+    raw = bytearray(create_bitchat_packet(SENDER_ID, MessageType.ANNOUNCE, lz4.frame.compress(text)))
+    raw[11] |= FLAG_IS_COMPRESSED
+    assert parse_bitchat_packet(bytes(raw)).payload == text
+
+def test_decompression_cap_by_type():
+    """Compressed payloads are capped by packet type before they are inflated"""
+    bomb = lz4.frame.compress(bytes(32768))
+    raw = bytearray(create_bitchat_packet(SENDER_ID, MessageType.ANNOUNCE, bomb))
+    raw[11] |= FLAG_IS_COMPRESSED
+    try:
+        parse_bitchat_packet(bytes(raw)).payload
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    
+    # Noise-wrapped messages are allowed to be much larger
+    raw = bytearray(create_bitchat_packet(SENDER_ID, MessageType.NOISE_ENCRYPTED, bomb))
+    raw[11] |= FLAG_IS_COMPRESSED
+    assert len(parse_bitchat_packet(bytes(raw)).payload) == 32768
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Packet Parser Test")
+    print("=" * 60)
+    
+    for test in (test_broadcast_round_trip, test_recipient_and_signature,
+                 test_memoryview_input, test_rejects_invalid_packets,
+                 test_message_two_stage_decode, test_compression_policy,
+                 test_decompresses_frame_format, test_decompression_cap_by_type):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+"""
+Test script for packet tracing and the binary trace dump
+"""
+
+import os
+import tempfile
+
+from bitchat import MessageType, create_bitchat_packet, create_bitchat_packet_with_recipient
+from packet_trace import PacketTrace, read_trace, format_record, TRACE_IN, TRACE_OUT, TRACE_MAGIC
+
+SENDER_ID = "7e24c1f633915d33"
+RECIPIENT_ID = "abcd1234567890ef"
+
+def test_dump_round_trip():
+    """Recorded packets come back from a dump unchanged and in order, and format with their header"""
+    trace = PacketTrace()
+    announce = create_bitchat_packet(SENDER_ID, MessageType.ANNOUNCE, b"alice")
+    message = create_bitchat_packet_with_recipient(SENDER_ID, RECIPIENT_ID, MessageType.MESSAGE, b"x" * 40, None)
+    trace.record(TRACE_OUT, announce)
+    trace.record(TRACE_IN, bytearray(message))  # Copied, later changes to the buffer don't leak in
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.bin")
+        assert trace.dump(path) == 2
+        records = list(read_trace(path))
+
+    assert [(direction, data) for _, direction, data in records] == [(TRACE_OUT, announce), (TRACE_IN, message)]
+    assert [timestamp for timestamp, _, _ in records] == [timestamp for timestamp, _, _ in trace.records]
+
+    sent = format_record(records[0]).splitlines()
+    assert f"SEND {len(announce)} bytes" in sent[0]
+    assert "type=ANNOUNCE ttl=7" in sent[1] and f"sender={SENDER_ID} recipient=ffffffffffffffff" in sent[1]
+    received = format_record(records[1])
+    assert "RECV" in received and f"recipient={RECIPIENT_ID}" in received and "payload_len=40" in received
+    hex_lines = sent[2:]
+    assert bytes.fromhex(''.join(hex_lines)) == announce and all(len(line.split()) <= 32 for line in hex_lines)
+
+def test_ring_and_bad_dumps():
+    """The ring keeps only the newest packets, and foreign or truncated dumps are rejected"""
+    trace = PacketTrace(capacity=2)
+    for i in range(3):
+        trace.record(TRACE_IN, bytes([i]))
+    assert [data for _, _, data in trace.records] == [b"\x01", b"\x02"]
+    assert "unparseable" in format_record(trace.records[0])
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trace.bin")
+        trace.dump(path)
+        with open(path, "rb") as f:
+            dump = f.read()
+
+        for bad, error in ((b"NOTATRACE", "not a BitChat packet trace"),
+                           (dump[:len(TRACE_MAGIC) + 5], "Truncated trace record header"),
+                           (dump[:-1], "Truncated trace record")):
+            with open(path, "wb") as f:
+                f.write(bad)
+            try:
+                list(read_trace(path))
+            except ValueError as e:
+                assert error in str(e)
+            else:
+                raise AssertionError(f"{bad!r} was accepted")
+
+        trace.clear()
+        assert trace.dump(path) == 0 and list(read_trace(path)) == []
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Packet Trace Test")
+    print("=" * 60)
+
+    for test in (test_dump_round_trip, test_ring_and_bad_dumps):
+        test()
+        print(f"✓ {test.__name__}")
+
+    print("=" * 60)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Test script for relay dedup and broadcast suppression
+"""
+
+import asyncio
+
+from bitchat import MessageType, PacketEncoder, parse_bitchat_packet
+from relay import RelayEngine, SeenCache, packet_key
+
+SENDER_ID = "7e24c1f633915d33"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def make_packet(payload: bytes = b"hello mesh"):
+    return parse_bitchat_packet(PacketEncoder(SENDER_ID).encode(MessageType.MESSAGE, payload))
+
+def test_key_ignores_ttl():
+    """The same packet one hop later has the same key"""
+    packet = make_packet()
+    relayed = bytearray(packet.raw)
+    relayed[2] -= 1
+    assert packet_key(parse_bitchat_packet(bytes(relayed))) == packet_key(packet)
+    assert packet_key(make_packet(b"other")) != packet_key(packet)
+
+def test_seen_cache_expires_by_bucket():
+    """Keys are forgotten once their bucket rotates out"""
+    clock = FakeClock()
+    seen = SeenCache(bucket_seconds=10, buckets=2, clock=clock)
+    assert seen.hear(b"k") == 1
+    assert seen.hear(b"k") == 2
+    clock.now = 10
+    assert seen.hear(b"other") == 1
+    assert seen.count(b"k") == 2
+    clock.now = 20
+    seen.hear(b"other")
+    assert seen.count(b"k") == 0
+
+def test_relay_and_suppression():
+    """A packet is relayed once with TTL-1, or suppressed if heard K times"""
+    sent = []
+    
+    async def send(data, source):
+        sent.append((data, source))
+    
+    async def scenario(copies):
+        engine = RelayEngine(send, lambda: 2, suppress_threshold=3, jitter=(0.01, 0.01))
+        packet = make_packet()
+        packet.source = "link-a"
+        assert engine.observe(packet)
+        engine.schedule(packet)
+        for _ in range(copies):
+            assert not engine.observe(packet)
+        await asyncio.sleep(0.05)
+        return engine, packet
+    
+    engine, packet = asyncio.run(scenario(copies=0))
+    assert engine.stats['relayed'] == 1
+    assert len(sent) == 1 and sent[0][0][2] == packet.ttl - 1
+    assert sent[0][1] == "link-a"  # So it isn't echoed back on the link it came from
+    
+    sent.clear()
+    engine, _ = asyncio.run(scenario(copies=2))
+    assert sent == []
+    assert engine.stats['suppressed'] == 1
+    assert engine.stats['duplicates'] == 2
+
+def test_probability_scales_with_peers():
+    """Broadcast relaying thins out in dense meshes but directed relays don't"""
+    engine = RelayEngine(None, lambda: 24, rng=lambda: 0.5)
+    assert engine.relay_probability() == 0.25
+    assert engine.relay_probability(probabilistic=False) == 1.0
+    engine.schedule(make_packet())
+    assert engine.stats['skipped'] == 1
+    assert RelayEngine(None, lambda: 3).relay_probability() == 1.0
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Relay Engine Test")
+    print("=" * 60)
+    
+    for test in (test_key_ignores_ttl, test_seen_cache_expires_by_bucket,
+                 test_relay_and_suppression, test_probability_scales_with_peers):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+Test script for the continuous scanner and its candidate table
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from scanner import CandidateTable, ContinuousScanner
+
+SERVICE_UUID = "f47b5e2d-4a9e-4c5a-9b3f-8e1d2c3a4b5c"
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_ranking_by_rssi_and_history():
+    """Stronger devices come first, and a past success counts for something"""
+    table = CandidateTable(clock=FakeClock())
+    table.seen("far", -85)
+    table.seen("near", -50)
+    table.seen("known", -58)
+    assert [c.address for c in table.ranked()] == ["near", "known", "far"]
+
+    table.succeeded("known")
+    assert [c.address for c in table.ranked()] == ["known", "near", "far"]
+    assert [c.address for c in table.ranked(exclude={"known"})] == ["near", "far"]
+
+    # One weak reading only nudges the smoothed RSSI
+    table.seen("near", -90)
+    assert -70 < table.candidates["near"].rssi < -50
+
+def test_backoff_and_expiry():
+    """Failing devices wait 1, 2, 4... seconds; silent ones are forgotten"""
+    clock = FakeClock()
+    table = CandidateTable(ttl=30, clock=clock)
+    table.seen("flaky", -40)
+    table.seen("steady", -70)
+
+    table.failed("flaky")
+    assert [c.address for c in table.ranked()] == ["steady"]
+    assert table.next_retry() == 1.0
+    clock.now = 1.0
+    assert table.ranked()[0].address == "flaky"
+
+    table.failed("flaky")
+    table.failed("flaky")
+    assert table.next_retry() == 4.0
+    table.succeeded("flaky")
+    assert table.next_retry() is None and table.ranked()[0].address == "flaky"
+
+    clock.now = 20.0
+    table.seen("steady", -70)
+    clock.now = 40.0
+    assert [c.address for c in table.ranked()] == ["steady"]
+
+def test_detection_wakes_waiter():
+    """A newly heard device wakes the scanner loop, repeat adverts don't"""
+    class FakeScanner:
+        def __init__(self, detection_callback, service_uuids):
+            self.callback = detection_callback
+            self.service_uuids = service_uuids
+            self.running = False
+
+        async def start(self):
+            self.running = True
+
+        async def stop(self):
+            self.running = False
+
+    async def scenario():
+        table = CandidateTable()
+        scanner = ContinuousScanner(SERVICE_UUID, table, scanner_factory=FakeScanner)
+        await scanner.start()
+        fake = scanner._scanner
+        assert fake.running and fake.service_uuids == [SERVICE_UUID]
+
+        device = SimpleNamespace(address="AA:BB", name=None)
+        advert = SimpleNamespace(rssi=-60, local_name="phone")
+        asyncio.get_running_loop().call_later(0.01, fake.callback, device, advert)
+        woke = await scanner.wait(1.0)
+
+        fake.callback(device, advert)
+        repeat_woke = await scanner.wait(0.05)
+
+        scanner.wake()
+        manual_woke = await scanner.wait(1.0)
+        await scanner.stop()
+        return table, scanner, fake, woke, repeat_woke, manual_woke
+
+    table, scanner, fake, woke, repeat_woke, manual_woke = asyncio.run(scenario())
+    assert woke and not repeat_woke and manual_woke
+    assert table.candidates["AA:BB"].name == "phone"
+    assert scanner.stats['advertisements'] == 2
+    assert not fake.running and not scanner.running
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Scanner Test")
+    print("=" * 60)
+
+    for test in (test_ranking_by_rssi_and_history, test_backoff_and_expiry, test_detection_wakes_waiter):
+        test()
+        print(f"✓ {test.__name__}")
+
+    print("=" * 60)
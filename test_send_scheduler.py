@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+Test script for the outbound send scheduler
+"""
+
+import asyncio
+
+from send_scheduler import SendScheduler, Lane, WriteBlocked, LinkClosed
+
+def test_control_lane_goes_first():
+    """Control traffic overtakes queued user and relay traffic"""
+    written = []
+    
+    async def write(packet):
+        written.append(packet)
+    
+    async def scenario():
+        scheduler = SendScheduler(write, rate=1000)
+        scheduler.enqueue_group([b"frag1", b"frag2"], Lane.BULK)
+        scheduler.enqueue(b"hello", Lane.USER)
+        scheduler.enqueue(b"handshake", Lane.CONTROL)
+        await scheduler.flush(5.0)
+        await scheduler.stop()
+        return scheduler
+    
+    scheduler = asyncio.run(scenario())
+    assert written == [b"handshake", b"hello", b"frag1", b"frag2"]
+    assert scheduler.stats['sent'] == 4
+
+def test_drop_policies():
+    """Full lanes drop the oldest relay but refuse new user messages"""
+    async def write(packet):
+        pass
+    
+    async def scenario():
+        scheduler = SendScheduler(write, limits={Lane.USER: 2, Lane.BULK: 2})
+        assert scheduler.enqueue(b"u1", Lane.USER)
+        assert scheduler.enqueue(b"u2", Lane.USER)
+        assert not scheduler.enqueue(b"u3", Lane.USER)
+        for packet in (b"r1", b"r2", b"r3"):
+            assert scheduler.enqueue(packet, Lane.BULK)
+        queued = [item.packets[0] for item in scheduler.lanes[Lane.BULK]]
+        await scheduler.stop()
+        return scheduler, queued
+    
+    scheduler, queued = asyncio.run(scenario())
+    assert queued == [b"r2", b"r3"]
+    assert scheduler.dropped[Lane.USER] == 1
+    assert scheduler.dropped[Lane.BULK] == 1
+
+def test_blocked_write_backs_off_and_retries():
+    """A blocked write halves the rate and the packet is retried"""
+    written = []
+    attempts = []
+    
+    async def write(packet):
+        attempts.append(packet)
+        if len(attempts) == 1:
+            raise WriteBlocked("could not complete without blocking")
+        written.append(packet)
+    
+    async def scenario():
+        scheduler = SendScheduler(write, rate=400)
+        scheduler.enqueue(b"ack", Lane.CONTROL)
+        await scheduler.flush(5.0)
+        await scheduler.stop()
+        return scheduler
+    
+    scheduler = asyncio.run(scenario())
+    assert attempts == [b"ack", b"ack"]
+    assert written == [b"ack"]
+    assert scheduler.stats['blocked'] == 1
+    assert scheduler.rate < 400
+
+def test_closed_link_keeps_packet_queued():
+    """A write to a closed link isn't counted as sent, and the packet stays queued"""
+    async def write(packet):
+        raise LinkClosed("not connected")
+    
+    async def scenario():
+        scheduler = SendScheduler(write)
+        scheduler.enqueue(b"dm", Lane.USER)
+        await scheduler.flush(0.2)
+        return scheduler
+    
+    scheduler = asyncio.run(scenario())
+    assert scheduler.stats['sent'] == 0 and scheduler.stats['closed'] == 1
+    assert scheduler.pending() == 1 and scheduler.credits >= 1
+    scheduler.clear()
+    assert scheduler.dropped[Lane.USER] == 1
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Send Scheduler Test")
+    print("=" * 60)
+    
+    for test in (test_control_lane_goes_first, test_drop_policies, test_blocked_write_backs_off_and_retries,
+                 test_closed_link_keeps_packet_queued):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Test script for Noise session lifecycle management
+"""
+
+import threading
+
+from encryption import EncryptionService, NoiseCipherState, NoiseSession
+from session_manager import SessionManager
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def make_session(peer_id: str, established: float = 1000.0) -> NoiseSession:
+    cipher = NoiseCipherState()
+    cipher.initialize_key(bytes(32))
+    return NoiseSession(peer_id, cipher, NoiseCipherState.restore(bytes(32), 0),
+                        EncryptionService().static_identity_key.public_key(), established)
+
+def test_lru_cap_and_idle_eviction():
+    """The table is capped by recency and idle sessions expire, busy ones don't"""
+    clock = FakeClock()
+    manager = SessionManager(max_sessions=2, idle_timeout=60, clock=clock)
+    manager.add_session("a", make_session("a"))
+    manager.add_session("b", make_session("b"))
+    manager.touch("a")
+    manager.add_session("c", make_session("c"))
+    assert list(manager.sessions) == ["a", "c"] and manager.stats['evicted_lru'] == 1
+    
+    # "a" keeps talking, "c" goes quiet
+    for _ in range(3):
+        clock.now += 30
+        manager.touch("a")
+    assert manager.expire() == ["c"]
+    assert list(manager.sessions) == ["a"] and manager.stats['evicted_idle'] == 1
+
+def test_stale_handshakes_time_out():
+    """Half-finished handshakes are dropped after the timeout"""
+    clock = FakeClock()
+    manager = SessionManager(handshake_timeout=30, clock=clock)
+    manager.start_handshake("a", object())
+    clock.now += 20
+    manager.start_handshake("b", object())
+    clock.now += 15
+    manager.expire()
+    assert list(manager.handshake_states) == ["b"] and manager.stats['handshakes_expired'] == 1
+
+def test_rekey_waits_for_idle_session():
+    """Worn-out sessions are reported for rekey once quiet, and only once"""
+    clock = FakeClock()
+    manager = SessionManager(rekey_nonces=100, rekey_age=3600, rekey_idle=10, clock=clock)
+    worn = make_session("worn")
+    manager.add_session("worn", worn)
+    manager.add_session("old", make_session("old", established=clock.now - 4000))
+    manager.add_session("fresh", make_session("fresh"))
+    worn.send_cipher.encrypt_many([b"x"] * 100)
+    
+    clock.now += 15
+    manager.touch("worn")
+    assert manager.due_for_rekey() == ["old"]
+    clock.now += 10
+    assert sorted(manager.due_for_rekey()) == ["old", "worn"]
+    
+    manager.start_rekey("worn")
+    assert manager.due_for_rekey() == ["old"]
+    manager.add_session("worn", make_session("worn", established=clock.now))
+    assert manager.stats['rekeyed'] == 1
+
+def test_rekey_keeps_session_until_replaced():
+    """A rekey handshake leaves the old session usable until it completes"""
+    alice, bob = EncryptionService(), EncryptionService()
+    message = alice.initiate_handshake("bob")
+    message = alice.process_handshake_message("bob", bob.process_handshake_message("alice", message))
+    bob.process_handshake_message("alice", message)
+    old_fingerprint = alice.get_peer_fingerprint("bob")
+    
+    message = alice.initiate_handshake("bob", keep_session=True)
+    assert bob.decrypt_from_peer("alice", alice.encrypt_for_peer("bob", b"still here")) == b"still here"
+    message = alice.process_handshake_message("bob", bob.process_handshake_message("alice", message))
+    bob.process_handshake_message("alice", message)
+    
+    assert alice.session_manager.stats['rekeyed'] == 1 and alice.get_peer_fingerprint("bob") == old_fingerprint
+    assert alice.sessions["bob"].send_cipher.nonce == 0
+    assert bob.decrypt_from_peer("alice", alice.encrypt_for_peer("bob", b"new keys")) == b"new keys"
+
+def test_tables_change_only_under_lock():
+    """Handshakes on worker threads don't break expiry and rekey passes on the loop"""
+    alice, bob = EncryptionService(), EncryptionService()
+    stop = threading.Event()
+    errors = []
+    
+    def churn(worker: int):
+        try:
+            n = 0
+            while not stop.is_set():
+                peer_id = f"peer-{worker}-{n % 8}"
+                message = alice.initiate_handshake(peer_id)
+                message = alice.process_handshake_message(peer_id, bob.process_handshake_message(f"alice-{worker}", message))
+                bob.process_handshake_message(f"alice-{worker}", message)
+                if n % 3 == 0:
+                    alice.remove_session(peer_id)
+                n += 1
+        except Exception as e:
+            errors.append(e)
+    
+    workers = [threading.Thread(target=churn, args=(worker,)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    try:
+        for _ in range(2000):
+            alice.cleanup_old_sessions()
+            alice.sessions_due_for_rekey()
+            alice.session_manager.session_items()
+            alice.get_active_peers()
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+    
+    assert not errors
+    assert not alice.handshake_states  # Every finished handshake was moved to the session table
+    assert set(alice.get_active_peers()) <= {f"peer-{w}-{n}" for w in range(4) for n in range(8)}
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Session Manager Test")
+    print("=" * 60)
+    
+    for test in (test_lru_cap_and_idle_eviction, test_stale_handshakes_time_out,
+                 test_rekey_waits_for_idle_session, test_rekey_keeps_session_until_replaced,
+                 test_tables_change_only_under_lock):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+Test script for persisting the Noise identity and resuming sessions
+"""
+
+import asyncio
+import os
+import tempfile
+
+import bitchat
+from bitchat import BitchatClient, SESSION_SNAPSHOT_NONCE_RESERVE
+from encryption import EncryptionService
+from persistence import load_state, save_session_snapshot, load_session_snapshot
+
+ALICE_ID = "7e24c1f633915d33"
+BOB_ID = "abcd1234567890ef"
+
+def with_temp_home(test):
+    """Run a test with the state directory in a scratch home"""
+    def wrapper():
+        old_home = os.environ.get("HOME")
+        with tempfile.TemporaryDirectory() as home:
+            os.environ["HOME"] = home
+            try:
+                test()
+            finally:
+                if old_home is None:
+                    del os.environ["HOME"]
+                else:
+                    os.environ["HOME"] = old_home
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+def establish(alice, bob):
+    message1 = alice.initiate_handshake(BOB_ID)
+    message2 = bob.process_handshake_message(ALICE_ID, message1)
+    message3 = alice.process_handshake_message(BOB_ID, message2)
+    bob.process_handshake_message(ALICE_ID, message3)
+
+@with_temp_home
+def test_identity_survives_restart():
+    """The Noise static key is generated once and reloaded from state"""
+    state = load_state()
+    assert state.noise_static_key is not None
+    first = EncryptionService(static_key=bytes(state.noise_static_key))
+    second = EncryptionService(static_key=bytes(load_state().noise_static_key))
+    assert first.get_identity_fingerprint() == second.get_identity_fingerprint()
+
+@with_temp_home
+def test_sessions_resume_from_snapshot():
+    """A restored session continues with the same keys and nonces"""
+    identity_key = load_state().identity_key
+    alice, bob = EncryptionService(), EncryptionService()
+    establish(alice, bob)
+    assert bob.decrypt_from_peer(ALICE_ID, alice.encrypt_for_peer(BOB_ID, b"before")) == b"before"
+    
+    # Alice snapshots every time her nonces move, then "crashes"
+    alice.on_nonces_advanced = lambda: save_session_snapshot({'sessions': alice.export_sessions()}, identity_key)
+    ciphertext = alice.encrypt_for_peer(BOB_ID, b"last words")
+    
+    restarted = EncryptionService(static_key=alice.static_identity_key.private_bytes_raw())
+    assert restarted.import_sessions(load_session_snapshot(identity_key)['sessions']) == 1
+    assert restarted.get_peer_fingerprint(BOB_ID) == alice.get_peer_fingerprint(BOB_ID)
+    
+    assert bob.decrypt_from_peer(ALICE_ID, ciphertext) == b"last words"
+    assert bob.decrypt_from_peer(ALICE_ID, restarted.encrypt_for_peer(BOB_ID, b"after")) == b"after"
+    assert restarted.decrypt_from_peer(BOB_ID, bob.encrypt_for_peer(ALICE_ID, b"reply")) == b"reply"
+
+@with_temp_home
+def test_stale_sessions_are_skipped():
+    """Sessions older than the age limit aren't restored, nor is a snapshot for another identity"""
+    identity_key = load_state().identity_key
+    alice, bob = EncryptionService(), EncryptionService()
+    establish(alice, bob)
+    sessions = alice.export_sessions()
+    sessions[BOB_ID]['established_time'] -= 7200
+    assert EncryptionService().import_sessions(sessions, max_age=3600) == 0
+    
+    save_session_snapshot({'sessions': sessions}, identity_key)
+    assert load_session_snapshot(list(range(32))) is None
+
+def resuming_client():
+    """A client with --resume-sessions whose Noise service knows Bob"""
+    client = BitchatClient()
+    client.app_state = load_state()
+    client.resume_sessions = True
+    bob = EncryptionService()
+    establish(client.encryption_service, bob)
+    return client, bob
+
+@with_temp_home
+def test_snapshot_stays_ahead_of_send_nonces():
+    """Send nonces are reserved in blocks, so the file is rewritten once per block, not per packet"""
+    client, bob = resuming_client()
+    writes = []
+    original = bitchat.save_session_snapshot
+    bitchat.save_session_snapshot = lambda snapshot, key: (writes.append(snapshot), original(snapshot, key))
+    
+    async def chat():
+        # Replies move only receive nonces, their writes wait for the debounce timer
+        for n in range(2 * SESSION_SNAPSHOT_NONCE_RESERVE):
+            ciphertext = client.encryption_service.encrypt_for_peer(BOB_ID, b"hello")
+            saved = load_session_snapshot(client.app_state.identity_key)['sessions'][BOB_ID]
+            assert saved['send_nonce'] > n  # Never behind a nonce that went out
+            assert bob.decrypt_from_peer(ALICE_ID, ciphertext) == b"hello"
+            reply = bob.encrypt_for_peer(ALICE_ID, b"hi")
+            assert client.encryption_service.decrypt_from_peer(BOB_ID, reply) == b"hi"
+    try:
+        asyncio.run(chat())
+    finally:
+        bitchat.save_session_snapshot = original
+    assert len(writes) <= 3
+    
+    # On a clean shutdown the live nonces are written, so the session resumes
+    client.save_session_snapshot(exact=True)
+    restarted = EncryptionService(static_key=client.encryption_service.static_identity_key.private_bytes_raw())
+    restarted.import_sessions(load_session_snapshot(client.app_state.identity_key)['sessions'])
+    assert bob.decrypt_from_peer(ALICE_ID, restarted.encrypt_for_peer(BOB_ID, b"after")) == b"after"
+
+@with_temp_home
+def test_failed_snapshot_does_not_break_encryption():
+    """A failing write drops the snapshot instead of raising out of encrypt"""
+    client, bob = resuming_client()
+    client.save_session_snapshot()
+    original = bitchat.save_session_snapshot
+    def fail(snapshot, key):
+        raise RuntimeError("OrderedDict mutated during iteration")
+    bitchat.save_session_snapshot = fail
+    try:
+        for _ in range(SESSION_SNAPSHOT_NONCE_RESERVE + 1):
+            ciphertext = client.encryption_service.encrypt_for_peer(BOB_ID, b"still sent")
+            assert bob.decrypt_from_peer(ALICE_ID, ciphertext) == b"still sent"
+    finally:
+        bitchat.save_session_snapshot = original
+    assert load_session_snapshot(client.app_state.identity_key) is None
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("BitChat Session Snapshot Test")
+    print("=" * 60)
+    
+    for test in (test_identity_survives_restart, test_sessions_resume_from_snapshot,
+                 test_stale_sessions_are_skipped, test_snapshot_stays_ahead_of_send_nonces,
+                 test_failed_snapshot_does_not_break_encryption):
+        test()
+        print(f"✓ {test.__name__}")
+    
+    print("=" * 60)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compression dictionary trainer for BitChat
+Builds a preset LZ4 dictionary from a corpus of message payloads so that short
+chat messages compress well. Corpus files are either packet traces written by
+/trace dump (MESSAGE payloads are used as-is) or text files with one chat
+message per line (wrapped in a real message payload before training).
+
+Segments are picked COVER-style: the corpus is split into one epoch per
+dictionary segment, and from each epoch the window whose d-mers appear in the
+most samples is kept, after which those d-mers stop counting.
+
+Usage: python3 train_dictionary.py [--id N] [--size BYTES] [-o FILE] <corpus>...
+"""
+
+import sys
+import argparse
+from collections import Counter
+from typing import Iterable, List
+
+from compression import save_dictionary_file, DICTIONARY_DIR
+from packet_trace import TRACE_MAGIC, read_trace
+
+DEFAULT_DICTIONARY_SIZE = 2048
+SEGMENT_SIZE = 32
+DMER_SIZE = 6
+
+def load_samples(paths: Iterable[str]) -> List[bytes]:
+    """Read message payloads from packet traces and text files"""
+    # Imported here so the tool doesn't pull in the client unless it needs it
+    from bitchat import MessageType, parse_bitchat_packet, create_bitchat_message_payload_full
+
+    samples = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            is_trace = f.read(len(TRACE_MAGIC)) == TRACE_MAGIC
+        if is_trace:
+            for _, _, data in read_trace(path):
+                try:
+                    packet = parse_bitchat_packet(data)
+                    if packet.msg_type == MessageType.MESSAGE:
+                        samples.append(packet.payload)
+                except ValueError:
+                    continue
+        else:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        payload, _ = create_bitchat_message_payload_full(
+                            "my-python-client", line, None, False, "7e24c1f633915d33", False, None
+                        )
+                        samples.append(payload)
+    return samples
+
+def train_dictionary(samples: List[bytes], size: int = DEFAULT_DICTIONARY_SIZE,
+                     segment_size: int = SEGMENT_SIZE, dmer_size: int = DMER_SIZE) -> bytes:
+    """Pick the most widely shared segments of the corpus, up to size bytes"""
+    samples = [sample for sample in samples if len(sample) >= dmer_size]
+    if not samples:
+        raise ValueError("Corpus has no usable samples")
+
+    # Document frequency: how many samples contain each d-mer
+    frequency: Counter = Counter()
+    for sample in samples:
+        frequency.update({sample[i:i + dmer_size] for i in range(len(sample) - dmer_size + 1)})
+
+    corpus = b"".join(samples)
+    epochs = max(1, min(size // segment_size, len(corpus) // segment_size))
+    epoch_size = len(corpus) // epochs
+    window = segment_size - dmer_size + 1
+
+    segments = []
+    for epoch in range(epochs):
+        start = epoch * epoch_size
+        end = min(len(corpus), start + epoch_size + segment_size)
+        scores = [frequency[corpus[i:i + dmer_size]] for i in range(start, end - dmer_size + 1)]
+        if len(scores) < window:
+            continue
+
+        # Sliding window sum, d-mers seen only once are worth nothing
+        best_score, best_start = 0, None
+        score = sum(s for s in scores[:window] if s > 1)
+        for i in range(len(scores) - window + 1):
+            if i:
+                if scores[i - 1] > 1:
+                    score -= scores[i - 1]
+                if scores[i + window - 1] > 1:
+                    score += scores[i + window - 1]
+            if score > best_score:
+                best_score, best_start = score, i
+        if best_start is None:
+            continue
+
+        segment = corpus[start + best_start:start + best_start + segment_size]
+        segments.append((best_score, segment))
+        for i in range(len(segment) - dmer_size + 1):
+            frequency[segment[i:i + dmer_size]] = 0
+
+    # Most valuable segments last, nearest to the data being compressed
+    segments.sort(key=lambda item: item[0])
+    return b"".join(segment for _, segment in segments)[-size:]
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a BitChat compression dictionary")
+    parser.add_argument("corpus", nargs="+", help="packet trace or text file (one message per line)")
+    parser.add_argument("--id", type=int, default=2, help="dictionary ID carried in payloads (2-255)")
+    parser.add_argument("--size", type=int, default=DEFAULT_DICTIONARY_SIZE, help="dictionary size in bytes")
+    parser.add_argument("-o", "--output", help=f"output file (default: {DICTIONARY_DIR}/chat-<id>.dict)")
+    args = parser.parse_args()
+
+    if not 1 < args.id < 256:
+        print("Dictionary ID must be between 2 and 255 (1 is the built-in seed dictionary)")
+        sys.exit(1)
+
+    samples = load_samples(args.corpus)
+    dictionary = train_dictionary(samples, args.size)
+
+    output = args.output
+    if output is None:
+        DICTIONARY_DIR.mkdir(exist_ok=True)
+        output = DICTIONARY_DIR / f"chat-{args.id}.dict"
+    save_dictionary_file(output, args.id, dictionary)
+    print(f"Trained {len(dictionary)} byte dictionary {args.id} from {len(samples)} payloads -> {output}")
+    print(f"Measure it with: python3 bench_compression.py --dictionary {output} {' '.join(args.corpus)}")
+
+# Export classes and functions
+__all__ = ['train_dictionary', 'load_samples', 'DEFAULT_DICTIONARY_SIZE']
+
+if __name__ == "__main__":
+    main()
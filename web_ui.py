@@ -21,12 +21,14 @@ import sys
 # Import BitChat components
 from bitchat import BitchatClient, Peer, ChatContext, ChatMode, Public, Channel, PrivateDM
 from terminal_ux import format_message_display
+from persistence import get_dedup_file_path
+from dedup import MessageDedup
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class WebMessage:
     """Message format for web interface"""
     id: str
@@ -41,7 +43,7 @@ class WebMessage:
     is_encrypted: bool = False
     is_own: bool = False
 
-@dataclass
+@dataclass(slots=True)
 class WebPeer:
     """Peer format for web interface"""
     id: str
@@ -50,7 +52,7 @@ class WebPeer:
     last_seen: Optional[str] = None
     fingerprint: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class WebChannel:
     """Channel format for web interface"""
     name: str
@@ -368,7 +370,11 @@ class WebBitchatClient:
     
     async def run_bitchat(self):
         """Run BitChat client in async thread"""
+        tasks = []
         try:
+            # Restore recently seen message IDs so a restart doesn't re-show or re-relay them
+            self.bitchat.dedup = MessageDedup.load(get_dedup_file_path())
+            
             # Connect to BLE
             connected = await self.bitchat.connect()
             if connected:
@@ -378,9 +384,17 @@ class WebBitchatClient:
             # Perform handshake
             await self.bitchat.handshake()
             
-            # Start background scanner if not connected
-            if not connected or not self.bitchat.client:
-                self.bitchat.background_scanner_task = asyncio.create_task(self.bitchat.background_scanner())
+            # Background scanner reconnects when offline and adds links up to the limit
+            self.bitchat.background_scanner_task = asyncio.create_task(self.bitchat.background_scanner())
+            
+            # Send messages queued in the outbox once a link is up
+            tasks.append(asyncio.create_task(self.bitchat.outbox_flush_loop()))
+            
+            # Expire idle sessions and stalled handshakes, and rekey quiet sessions
+            tasks.append(asyncio.create_task(self.bitchat.session_maintenance_loop()))
+            
+            # Resend private messages whose delivery ACK hasn't arrived
+            tasks.append(asyncio.create_task(self.bitchat.delivery_retry_loop()))
             
             # Process message queue
             await self.process_message_queue()
@@ -389,6 +403,15 @@ class WebBitchatClient:
             logger.error(f"BitChat error: {e}")
         finally:
             self.running = False
+            self.bitchat.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            
+            try:
+                self.bitchat.dedup.save(get_dedup_file_path())
+            except OSError as e:
+                logger.error(f"Failed to save dedup cache: {e}")
     
     def run_bitchat_thread(self):
         """Thread wrapper for running BitChat"""